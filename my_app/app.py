@@ -13,6 +13,19 @@ from my_app.config import Config
 from my_app.extensions import db, migrate
 from my_app.models import User, School, Student, Classroom, Violation  # Import models agar terdeteksi
 from my_app.routes import main
+from my_app.images import process_photos_command
+from my_app.cleanup import cleanup_uploads_command, start_cleanup_scheduler
+from my_app.search import reindex_names_command
+from my_app.schema import upgrade_schema_command
+from my_app.profiler import init_profiler
+from my_app.metrics import init_metrics
+from my_app.seed import seed_command
+from my_app.benchmark import benchmark_command
+from my_app.queryplan import check_plans_command
+from my_app.importer import import_students_command
+from my_app.identity import load_identity
+from my_app.jobs import init_jobs
+from my_app.stats import reconcile_stats_command, check_points_command, rebuild_rollup_command
 from flask_login import LoginManager
 
 app = Flask(__name__)
@@ -29,9 +42,25 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Snapshot user dari cache identitas (tanpa query di request biasa); lihat my_app/identity.py
+    return load_identity(int(user_id))
 
 app.register_blueprint(main)
+init_profiler(app)
+init_metrics(app)
+init_jobs(app)
+app.cli.add_command(process_photos_command)
+app.cli.add_command(cleanup_uploads_command)
+app.cli.add_command(reconcile_stats_command)
+app.cli.add_command(check_points_command)
+app.cli.add_command(rebuild_rollup_command)
+app.cli.add_command(reindex_names_command)
+app.cli.add_command(upgrade_schema_command)
+app.cli.add_command(seed_command)
+app.cli.add_command(benchmark_command)
+app.cli.add_command(check_plans_command)
+app.cli.add_command(import_students_command)
+start_cleanup_scheduler(app)
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
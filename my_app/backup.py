@@ -0,0 +1,409 @@
+import os
+import json
+import time
+import zipfile
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from my_app.extensions import db
+from my_app.models import User, Student, Violation, Classroom, School, ViolationRule, ViolationCategory, ViolationPhoto, PhotoBlob, SchoolStats, ViolationDailyRollup, StudentNameGram
+from my_app.storage import store_blob_from_stream, upload_path
+from my_app.utils import normalize_name
+
+# Ukuran potongan saat menyalin file foto ke dalam ZIP
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStream:
+    """
+    Tujuan tulis ZipFile yang tidak bisa di-seek.
+    Byte yang ditulis zipfile ditampung sebentar lalu diambil (drain) oleh generator
+    sehingga bisa langsung dikirim ke client tanpa menyimpan seluruh arsip di RAM.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_student_batches(school_id, batch_size):
+    """Ambil siswa per batch (keyset pada Student.id) beserta pelanggaran dan nama fotonya."""
+    last_id = 0
+    while True:
+        students = db.session.query(
+            Student.id, Student.name, Student.nis, Classroom.name
+        ).outerjoin(Classroom, Student.classroom_id == Classroom.id).filter(
+            Student.school_id == school_id,
+            Student.id > last_id
+        ).order_by(Student.id).limit(batch_size).all()
+        if not students:
+            return
+        student_ids = [s[0] for s in students]
+        last_id = student_ids[-1]
+
+        photos_by_violation = {}
+        photo_rows = db.session.query(
+            ViolationPhoto.violation_id, ViolationPhoto.filename
+        ).join(Violation, ViolationPhoto.violation_id == Violation.id).filter(
+            Violation.student_id.in_(student_ids)
+        ).order_by(ViolationPhoto.id).all()
+        for violation_id, filename in photo_rows:
+            photos_by_violation.setdefault(violation_id, []).append(filename)
+
+        violations_by_student = {}
+        violation_rows = db.session.query(
+            Violation.id, Violation.student_id, Violation.date_posted, Violation.description,
+            Violation.points, Violation.pasal, Violation.kategori_pelanggaran, Violation.di_input_oleh,
+            Violation.is_remitted, Violation.remission_reason
+        ).filter(Violation.student_id.in_(student_ids)).order_by(Violation.id).all()
+        for v in violation_rows:
+            violations_by_student.setdefault(v.student_id, []).append({
+                "date": v.date_posted.isoformat(),
+                "description": v.description,
+                "points": v.points,
+                "pasal": v.pasal,
+                "kategori": v.kategori_pelanggaran,
+                "reporter": v.di_input_oleh,
+                "is_remitted": v.is_remitted,
+                "remission_reason": v.remission_reason,
+                "photos": photos_by_violation.get(v.id, [])
+            })
+
+        yield [{
+            "name": name,
+            "nis": nis,
+            "classroom": classroom_name,
+            "violations": violations_by_student.get(student_id, [])
+        } for student_id, name, nis, classroom_name in students]
+
+
+def iter_backup_json(school_id, batch_size=500, progress=None):
+    """
+    Hasilkan isi data.json sepotong demi sepotong.
+    Struktur sama persis dengan format backup lama sehingga tetap bisa di-restore.
+
+    :param progress: callback opsional progress(jumlah_siswa_selesai, total_siswa)
+    """
+    school = db.session.get(School, school_id)
+    members = db.session.query(User.username, User.full_name).filter(
+        User.school_id == school_id, User.role != 'super_admin'
+    ).order_by(User.id).all()
+    rules = db.session.query(ViolationRule.code, ViolationRule.description).filter_by(school_id=school_id).order_by(ViolationRule.id).all()
+    categories = db.session.query(ViolationCategory.name, ViolationCategory.points).filter_by(school_id=school_id).order_by(ViolationCategory.id).all()
+    classrooms = db.session.query(Classroom.name).filter_by(school_id=school_id).order_by(Classroom.id).all()
+
+    header = {
+        "school": {
+            "name": school.name,
+            "address": school.address,
+            "logo": school.logo
+        },
+        "backup_date": datetime.now().isoformat(),
+        "settings": {
+            "members": [{"username": u, "full_name": f} for u, f in members],
+            "rules": [{"code": c, "description": d} for c, d in rules],
+            "categories": [{"name": n, "points": p} for n, p in categories],
+            "classrooms": [{"name": n} for (n,) in classrooms]
+        }
+    }
+    total_students = Student.query.filter_by(school_id=school_id).count() if progress else 0
+    done_students = 0
+
+    # Buka objek header lalu sisipkan array "students" secara bertahap
+    yield json.dumps(header)[:-1] + ', "students": ['
+    first = True
+    for batch in _iter_student_batches(school_id, batch_size):
+        chunk = ', '.join(json.dumps(s) for s in batch)
+        yield chunk if first else ', ' + chunk
+        first = False
+        if progress:
+            done_students += len(batch)
+            progress(done_students, total_students)
+    yield ']}'
+
+
+def _iter_photo_filenames(school_id, batch_size):
+    """
+    Nama file foto bukti milik sekolah, masing-masing sekali saja (blob yang dipakai beberapa
+    pelanggaran cukup disalin satu kali). Diambil per batch dengan keyset pada nama file.
+    """
+    last_name = ''
+    while True:
+        rows = db.session.query(ViolationPhoto.filename).join(
+            Violation, ViolationPhoto.violation_id == Violation.id
+        ).filter(
+            Violation.school_id == school_id,
+            ViolationPhoto.filename > last_name
+        ).distinct().order_by(ViolationPhoto.filename).limit(batch_size).all()
+        if not rows:
+            return
+        last_name = rows[-1][0]
+        for (filename,) in rows:
+            yield filename
+
+
+def iter_backup_zip(school_id, upload_folder, batch_size=500, progress=None):
+    """
+    Generator arsip ZIP backup sekolah yang di-stream ke response.
+    Memori puncak hanya sebesar satu batch siswa + satu potongan file, tidak tergantung besar sekolah.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as zf:
+        # 1. data.json ditulis bertahap
+        with zf.open('data.json', 'w', force_zip64=True) as dest:
+            for piece in iter_backup_json(school_id, batch_size, progress):
+                dest.write(piece.encode('utf-8'))
+                data = stream.drain()
+                if data:
+                    yield data
+
+        # 2. Foto bukti & logo. JPEG sudah terkompresi, jadi cukup disimpan (STORED).
+        def add_file(filename):
+            if not filename:
+                return
+            file_path = upload_path(upload_folder, filename)
+            if not os.path.exists(file_path):
+                return
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname=filename)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            with open(file_path, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                while True:
+                    buf = src.read(COPY_CHUNK_SIZE)
+                    if not buf:
+                        break
+                    dest.write(buf)
+                    yield stream.drain()
+
+        for filename in _iter_photo_filenames(school_id, batch_size):
+            yield from add_file(filename)
+
+        school = db.session.get(School, school_id)
+        yield from add_file(school.logo)
+
+    # Central directory ditulis saat ZipFile ditutup
+    yield stream.drain()
+
+
+def backup_filename(school_name):
+    # Format Nama File: Backup_NamaSekolah_Tanggal_Waktu_DataPelanggaran.zip
+    date_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    clean_school_name = "".join(c for c in school_name if c.isalnum() or c in (' ', '_')).replace(' ', '_')
+    return f"Backup_{clean_school_name}_{date_str}_DataPelanggaran.zip"
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def restore_backup(zf, school, upload_folder, chunk_size=1000, progress=None):
+    """
+    Pulihkan isi arsip backup ke sekolah dengan semantik merge yang sama seperti sebelumnya
+    (data yang sudah ada tidak ditimpa, hanya data baru yang ditambahkan).
+
+    Semua kunci yang sudah ada dimuat sekali ke memori, deteksi duplikat dilakukan di memori,
+    lalu baris baru ditulis dengan bulk insert per `chunk_size`.
+    Tidak melakukan commit; pemanggil yang menentukan commit/rollback.
+    `progress` (opsional) dipanggil sebagai progress(jumlah_siswa_selesai, total_siswa).
+
+    :return: dict berisi jumlah siswa, pelanggaran, foto yang dipulihkan, total baris dan baris/detik.
+    """
+    started = time.perf_counter()
+    names_in_zip = set(zf.namelist())
+    data = json.loads(zf.read('data.json'))
+    settings_data = data.get('settings', {})
+    students_data = data.get('students', [])
+
+    def extract(name):
+        if name in names_in_zip:
+            with open(os.path.join(upload_folder, name), 'wb') as f:
+                f.write(zf.read(name))
+
+    # Foto disimpan per-hash; setiap entri ZIP dibaca sekali walau dipakai banyak pelanggaran
+    stored_photos = {}
+    def store_photo(name):
+        if name in stored_photos:
+            return
+        row = {'filename': name, 'blob_hash': None, 'width': None, 'thumb_filename': None,
+               'thumb_width': None, 'medium_filename': None, 'medium_width': None}
+        if name in names_in_zip:
+            with zf.open(name) as src:
+                blob = store_blob_from_stream(upload_folder, src)
+            row.update(filename=blob.filename, blob_hash=blob.hash, width=blob.width,
+                       thumb_filename=blob.thumb_filename, thumb_width=blob.thumb_width,
+                       medium_filename=blob.medium_filename, medium_width=blob.medium_width)
+        stored_photos[name] = row
+
+    # 1. Restore profil sekolah
+    if 'school' in data:
+        school.name = data['school'].get('name', school.name)
+        school.address = data['school'].get('address', school.address)
+        logo_name = data['school'].get('logo')
+        if logo_name:
+            school.logo = logo_name
+            extract(logo_name)
+
+    # 2. Restore Settings (Pasal, Kategori, Kelas, Anggota) - datanya kecil, cukup ORM biasa
+    rule_codes = {c for (c,) in db.session.query(ViolationRule.code).filter_by(school_id=school.id)}
+    for r_data in settings_data.get('rules', []):
+        if r_data['code'] not in rule_codes:
+            rule_codes.add(r_data['code'])
+            db.session.add(ViolationRule(code=r_data['code'], description=r_data['description'], school_id=school.id))
+
+    category_names = {n for (n,) in db.session.query(ViolationCategory.name).filter_by(school_id=school.id)}
+    for c_data in settings_data.get('categories', []):
+        if c_data['name'] not in category_names:
+            category_names.add(c_data['name'])
+            db.session.add(ViolationCategory(name=c_data['name'], points=c_data['points'], school_id=school.id))
+
+    classroom_ids = dict(db.session.query(Classroom.name, Classroom.id).filter_by(school_id=school.id))
+    new_classrooms = []
+    for c_data in settings_data.get('classrooms', []):
+        if c_data['name'] not in classroom_ids:
+            classroom_ids[c_data['name']] = None
+            new_classrooms.append(Classroom(name=c_data['name'], school_id=school.id))
+    db.session.add_all(new_classrooms)
+
+    # Username bersifat unik global, jadi cek ke seluruh tabel users
+    member_names = [m['username'] for m in settings_data.get('members', [])]
+    usernames = set()
+    for chunk in _chunks(member_names, chunk_size):
+        usernames.update(u for (u,) in db.session.query(User.username).filter(User.username.in_(chunk)))
+    for m_data in settings_data.get('members', []):
+        if m_data['username'] not in usernames:
+            usernames.add(m_data['username'])
+            new_user = User(username=m_data['username'], full_name=m_data['full_name'], role='school_admin', school_id=school.id)
+            new_user.set_password('guru123') # Default password for restored users
+            db.session.add(new_user)
+
+    db.session.flush()
+    for c in new_classrooms:
+        classroom_ids[c.name] = c.id
+
+    # 3. Restore Siswa (bulk insert, lalu id diambil kembali lewat NIS)
+    student_ids = dict(db.session.query(Student.nis, Student.id).filter_by(school_id=school.id))
+    new_students = []
+    pending_nis = set()
+    for s_data in students_data:
+        nis = s_data['nis']
+        if nis in student_ids or nis in pending_nis:
+            continue
+        pending_nis.add(nis)
+        new_students.append({
+            'name': s_data['name'],
+            'name_search': normalize_name(s_data['name']),
+            'nis': nis,
+            'school_id': school.id,
+            'classroom_id': classroom_ids.get(s_data.get('classroom')) if s_data.get('classroom') else None
+        })
+    # Insert Core melewati event session, jadi penghitung dashboard disesuaikan tepat setelah tiap insert
+    for chunk in _chunks(new_students, chunk_size):
+        db.session.execute(insert(Student), chunk)
+        SchoolStats.adjust(db.session.connection(), school.id, students=len(chunk))
+    for chunk in _chunks([s['nis'] for s in new_students], chunk_size):
+        student_ids.update(db.session.query(Student.nis, Student.id).filter(
+            Student.school_id == school.id, Student.nis.in_(chunk)
+        ))
+    StudentNameGram.index(db.session.connection(),
+                          [(student_ids[s['nis']], school.id, s['name_search']) for s in new_students])
+
+    # 4. Restore Pelanggaran & Foto
+    existing_violations = set(db.session.query(
+        Violation.student_id, Violation.date_posted, Violation.description
+    ).filter(Violation.school_id == school.id))
+
+    plain_rows = []        # pelanggaran tanpa foto -> Core bulk insert
+    with_photos = []       # pelanggaran berfoto -> butuh id, jadi lewat ORM
+    count_violations = 0
+    count_photos = 0
+
+    def flush_violations():
+        nonlocal count_photos
+        if plain_rows:
+            db.session.execute(insert(Violation), plain_rows)
+            SchoolStats.adjust(db.session.connection(), school.id, violations=len(plain_rows))
+            points = Counter()
+            rollup = defaultdict(lambda: [0, 0])
+            for row in plain_rows:
+                if not row['is_remitted']:
+                    points[row['student_id']] += row['points']
+                delta = rollup[ViolationDailyRollup.key(school.id, row['date_posted'], row['kategori_pelanggaran'])]
+                delta[0] += 1
+                delta[1] += row['points']
+            Student.adjust_points(db.session.connection(), points)
+            ViolationDailyRollup.apply(db.session.connection(), rollup)
+            plain_rows.clear()
+        if with_photos:
+            db.session.add_all(v for v, _ in with_photos)
+            db.session.flush()
+            photo_rows = [dict(stored_photos[p_name], violation_id=v.id) for v, photos in with_photos for p_name in photos]
+            db.session.execute(insert(ViolationPhoto), photo_rows)
+            # Insert Core melewati event ORM, jadi refcount blob disesuaikan di sini
+            refs = Counter(row['blob_hash'] for row in photo_rows if row['blob_hash'])
+            for blob_hash, n in refs.items():
+                db.session.execute(update(PhotoBlob).where(PhotoBlob.hash == blob_hash).values(refcount=PhotoBlob.refcount + n))
+            count_photos += len(photo_rows)
+            with_photos.clear()
+
+    for index, s_data in enumerate(students_data, start=1):
+        student_id = student_ids[s_data['nis']]
+        for v_data in s_data.get('violations', []):
+            try: v_date = datetime.fromisoformat(v_data['date'])
+            except ValueError: v_date = datetime.utcnow()
+
+            key = (student_id, v_date, v_data['description'])
+            if key in existing_violations:
+                continue
+            existing_violations.add(key)
+            count_violations += 1
+
+            row = {
+                'student_id': student_id,
+                'school_id': school.id,
+                'date_posted': v_date,
+                'description': v_data['description'],
+                'points': v_data['points'],
+                'pasal': v_data['pasal'],
+                'kategori_pelanggaran': v_data['kategori'],
+                'di_input_oleh': v_data['reporter'],
+                'is_remitted': v_data.get('is_remitted', False),
+                'remission_reason': v_data.get('remission_reason')
+            }
+            photos = list(dict.fromkeys(v_data.get('photos', [])))
+            if photos:
+                for p_name in photos:
+                    store_photo(p_name)
+                with_photos.append((Violation(**row), photos))
+            else:
+                plain_rows.append(row)
+
+            if len(plain_rows) + len(with_photos) >= chunk_size:
+                flush_violations()
+                if progress:
+                    progress(index, len(students_data))
+    flush_violations()
+    if progress:
+        progress(len(students_data), len(students_data))
+
+    elapsed = time.perf_counter() - started
+    total_rows = len(new_students) + count_violations + count_photos
+    return {
+        'students': len(new_students),
+        'violations': count_violations,
+        'photos': count_photos,
+        'rows': total_rows,
+        'seconds': elapsed,
+        'rows_per_second': total_rows / elapsed if elapsed > 0 else float(total_rows)
+    }
@@ -0,0 +1,212 @@
+import io
+import os
+import json
+import time
+import secrets
+import zipfile
+import statistics as pystats
+from datetime import datetime
+
+import click
+from flask.cli import ScriptInfo
+
+from my_app.extensions import db
+from my_app.models import School, User, Classroom, Student
+from my_app.backup import iter_backup_zip, restore_backup
+from my_app.cache import invalidate_statistics
+from my_app.profiler import count_queries
+
+# Selisih di bawah ini (ms) dianggap noise, walaupun persentasenya besar
+NOISE_FLOOR_MS = 5.0
+
+
+def _timed(func, repeat):
+    """Jalankan `func` sebanyak `repeat` kali. Mengembalikan (daftar durasi ms, jumlah query run terakhir)."""
+    durations = []
+    queries = 0
+    for _ in range(repeat):
+        with count_queries() as profile:
+            started = time.perf_counter()
+            func()
+            durations.append((time.perf_counter() - started) * 1000)
+        queries = profile.count
+    return durations, queries
+
+
+def _summary(durations, queries):
+    return {'median_ms': round(pystats.median(durations), 2), 'min_ms': round(min(durations), 2),
+            'max_ms': round(max(durations), 2), 'queries': queries}
+
+
+def _pick_school(app, school_id=None):
+    with app.app_context():
+        if school_id is None:
+            # Sekolah hasil `flask seed` yang terakhir dibuat
+            school = School.query.filter(School.name.like('Sekolah Benchmark %')).order_by(School.id.desc()).first()
+        else:
+            school = db.session.get(School, school_id)
+        if school is None:
+            raise click.ClickException('Sekolah benchmark tidak ditemukan. Jalankan `flask seed` terlebih dahulu.')
+        admin = User.query.filter_by(school_id=school.id).order_by(User.id).first()
+        classroom = Classroom.query.filter_by(school_id=school.id).order_by(Classroom.id).first()
+        student = Student.query.filter_by(school_id=school.id).order_by(Student.poin.desc(), Student.id).first()
+        return {
+            'school_id': school.id,
+            'user_id': admin.id,
+            'class_id': classroom.id if classroom else None,
+            'student_id': student.id if student else None,
+            'search': student.name.split()[0][:4] if student else 'a',
+        }
+
+
+def _retarget_archive(raw, school_name):
+    """Salinan arsip backup dengan nama sekolah diganti (nama sekolah unik, restore menimpanya)."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(raw)) as src, zipfile.ZipFile(out, 'w') as dest:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename == 'data.json':
+                payload = json.loads(data)
+                payload.setdefault('school', {})['name'] = school_name
+                data = json.dumps(payload).encode('utf-8')
+            dest.writestr(info, data)
+    return out.getvalue()
+
+
+def run_benchmarks(app, school_id=None, repeat=5):
+    """
+    Ukur waktu route utama (sebagai admin sekolah) serta backup dan restore penuh satu sekolah.
+    Restore dijalankan ke sekolah sementara lalu di-rollback, jadi database tidak berubah.
+    Mengembalikan dict {nama: {median_ms, min_ms, max_ms, queries}}.
+    """
+    target = _pick_school(app, school_id)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        # Login langsung lewat session (tanpa hash password di setiap run)
+        session['_user_id'] = str(target['user_id'])
+        session['_fresh'] = True
+
+    routes = {
+        'home': '/',
+        'home_search': f"/?search={target['search']}",
+        'classes': '/classes',
+        'class_detail': f"/classes/{target['class_id']}",
+        'student_history': f"/student/{target['student_id']}",
+        'statistics': '/statistics',
+        'statistics_180d': '/statistics?trend_range=180d',
+        'settings': '/settings',
+        'backup_stream': '/settings/backup?mode=stream',
+    }
+    results = {}
+    for name, url in routes.items():
+        def request():
+            if name.startswith('statistics'):
+                # Ukur perhitungan, bukan cache
+                with app.app_context():
+                    invalidate_statistics(target['school_id'])
+            response = client.get(url)
+            response.get_data()
+            if response.status_code != 200:
+                raise click.ClickException(f"{url} mengembalikan status {response.status_code}")
+        client.get(url).get_data()  # pemanasan
+        results[name] = _summary(*_timed(request, repeat))
+
+    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
+    with app.app_context():
+        archive = io.BytesIO()
+        def backup():
+            archive.seek(0)
+            archive.truncate()
+            for chunk in iter_backup_zip(target['school_id'], upload_folder, app.config.get('BACKUP_BATCH_SIZE', 500)):
+                archive.write(chunk)
+            db.session.remove()
+        results['backup_zip'] = _summary(*_timed(backup, repeat))
+
+        restore_name = f"Benchmark Restore {secrets.token_hex(4)}"
+        restore_archive = _retarget_archive(archive.getvalue(), restore_name)
+
+        def restore():
+            try:
+                school = School(name=restore_name)
+                db.session.add(school)
+                db.session.flush()
+                with zipfile.ZipFile(io.BytesIO(restore_archive)) as zf:
+                    restore_backup(zf, school, upload_folder, app.config.get('RESTORE_CHUNK_SIZE', 1000))
+            finally:
+                db.session.rollback()
+                db.session.remove()
+        results['restore_zip'] = _summary(*_timed(restore, repeat))
+    return results
+
+
+def compare_results(results, baseline, threshold=0.25):
+    """
+    Bandingkan hasil dengan baseline. Regresi jika median lebih lambat dari baseline * (1 + threshold)
+    dan selisihnya di atas NOISE_FLOOR_MS, atau jika jumlah query bertambah.
+    Mengembalikan daftar (nama, pesan).
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['median_ms'] * (1 + threshold)
+        if current['median_ms'] > limit and current['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS:
+            regressions.append((name, f"median {base['median_ms']:.1f}ms -> {current['median_ms']:.1f}ms"))
+        if current['queries'] > base['queries']:
+            regressions.append((name, f"query {base['queries']} -> {current['queries']}"))
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def write_baseline(path, results, app):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+@click.command('benchmark')
+@click.option('--school', 'school_id', type=int, default=None, help='Sekolah yang diukur (default: hasil seed terakhir).')
+@click.option('--repeat', default=5, show_default=True, help='Jumlah pengulangan per skenario.')
+@click.option('--baseline', 'baseline_path', default=None, help='File JSON baseline (default: BENCHMARK_BASELINE).')
+@click.option('--threshold', type=float, default=None, help='Batas perlambatan relatif, mis. 0.25 = 25%.')
+@click.option('--save-baseline', is_flag=True, help='Simpan hasil ini sebagai baseline baru.')
+@click.pass_context
+def benchmark_command(ctx, school_id, repeat, baseline_path, threshold, save_baseline):
+    """Ukur waktu route utama serta backup/restore, lalu bandingkan dengan baseline."""
+    # Tanpa with_appcontext: setiap request harus punya app context (dan session DB) sendiri
+    app = ctx.ensure_object(ScriptInfo).load_app()
+    baseline_path = baseline_path or app.config['BENCHMARK_BASELINE']
+    threshold = app.config.get('BENCHMARK_THRESHOLD', 0.25) if threshold is None else threshold
+
+    results = run_benchmarks(app, school_id, repeat)
+    baseline = load_baseline(baseline_path)
+    for name, result in results.items():
+        line = f"  {name:<18} median {result['median_ms']:>9.1f}ms  min {result['min_ms']:>9.1f}ms  {result['queries']:>4} query"
+        if baseline and name in baseline:
+            line += f"  (baseline {baseline[name]['median_ms']:.1f}ms)"
+        click.echo(line)
+
+    if save_baseline:
+        write_baseline(baseline_path, results, app)
+        click.echo(f"Baseline disimpan ke {baseline_path}")
+        return
+    if baseline is None:
+        click.echo('Belum ada baseline. Jalankan dengan --save-baseline untuk membuatnya.')
+        return
+    regressions = compare_results(results, baseline, threshold)
+    for name, message in regressions:
+        click.echo(f"REGRESI {name}: {message}", err=True)
+    if regressions:
+        ctx.exit(1)
+    click.echo(f"Tidak ada regresi di atas {threshold:.0%}.")
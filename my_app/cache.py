@@ -0,0 +1,213 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import select
+
+from my_app.extensions import db
+from my_app.models import CacheVersion
+
+
+class LocalCache:
+    """
+    Cache LRU + TTL di memori proses. Antarmuka get / set sama dengan RedisCache sehingga bisa dipakai
+    sebagai pengganti lokal saat backend bersama tidak tersedia; versinya disimpan di DatabaseVersions.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class DatabaseVersions:
+    """
+    Versi cache di tabel cache_versions, dipakai bersama LocalCache. LRU tiap worker tetap terpisah, tetapi
+    versinya dibaca dari database pada setiap pembacaan cache, jadi invalidasi dari satu worker langsung
+    membuat entri di worker lain usang (bukan baru setelah TTL habis).
+    """
+
+    def incr(self, key):
+        # Dipanggil setelah perubahan datanya di-commit; kenaikan versi di-commit sendiri
+        CacheVersion.bump(db.session.connection(), key)
+        db.session.commit()
+
+    def get_counter(self, key):
+        return db.session.scalar(select(CacheVersion.version).where(CacheVersion.key == key)) or 0
+
+
+class RedisCache:
+    """Backend bersama untuk beberapa worker (butuh paket `redis`)."""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("STATS_CACHE_URL memakai Redis, tetapi paket 'redis' belum terpasang.")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(key, pickle.dumps(value), ex=int(ttl))
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+    def get_counter(self, key):
+        return int(self._client.get(key) or 0)
+
+
+# Namespace dengan LRU lokal sendiri (kunci konfigurasi ukurannya), agar entri autocomplete atau statistik
+# yang banyak tidak menggusur snapshot identitas yang dibaca di setiap request. Namespace lain (stats)
+# memakai STATS_CACHE_MAXSIZE. Dengan Redis semua namespace memakai backend yang sama.
+LOCAL_CACHE_SIZES = {
+    'roster': 'ROSTER_CACHE_MAXSIZE',
+    'user': 'IDENTITY_CACHE_MAXSIZE',
+    'school': 'IDENTITY_CACHE_MAXSIZE',
+    'ref': 'REFERENCE_CACHE_MAXSIZE',
+}
+
+_backend = None
+_local = {}  # kunci konfigurasi ukuran -> LocalCache
+_db_versions = DatabaseVersions()
+_backend_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_backend(app=None, namespace=None):
+    global _backend
+    app = app or current_app
+    with _backend_lock:
+        if _backend is None:
+            url = app.config.get('STATS_CACHE_URL')
+            if url:
+                _backend = RedisCache(url)
+            else:
+                _backend = LocalCache(app.config.get('STATS_CACHE_MAXSIZE', 256))
+        size_key = LOCAL_CACHE_SIZES.get(namespace)
+        if size_key is None or isinstance(_backend, RedisCache):
+            return _backend
+        if size_key not in _local:
+            _local[size_key] = LocalCache(app.config.get(size_key, 256))
+        return _local[size_key]
+
+
+def _versions(backend):
+    """Tempat versi cache: Redis jika dipakai, selain itu tabel cache_versions (bersama semua worker)."""
+    return backend if isinstance(backend, RedisCache) else _db_versions
+
+
+def _version_key(school_id, namespace='stats'):
+    return f"{namespace}:v:{school_id}"
+
+
+def _cached(namespace, school_id, key, ttl, compute):
+    if not current_app.config.get('STATS_CACHE_ENABLED', True):
+        return compute()
+    backend = get_backend(namespace=namespace)
+    full_key = f"{namespace}:{school_id}:{_versions(backend).get_counter(_version_key(school_id, namespace))}:{key}"
+    value = backend.get(full_key)
+    with _stats_lock:
+        _stats['hits' if value is not None else 'misses'] += 1
+    if value is None:
+        value = compute()
+        backend.set(full_key, value, ttl)
+    return value
+
+
+def _invalidate(namespace, school_id):
+    _versions(get_backend(namespace=namespace)).incr(_version_key(school_id, namespace))
+    with _stats_lock:
+        _stats['invalidations'] += 1
+
+
+def cached_statistics(school_id, trend_range, day, compute):
+    """
+    Ambil data halaman statistik dari cache, atau hitung dengan `compute()` lalu simpan.
+    Kunci memuat versi sekolah, jadi invalidasi cukup menaikkan versinya (di Redis atau tabel cache_versions,
+    sehingga berlaku untuk semua worker).
+    """
+    return _cached('stats', school_id, f"{trend_range}:{day.isoformat()}",
+                   current_app.config.get('STATS_CACHE_TTL', 300), compute)
+
+
+def invalidate_statistics(school_id):
+    """Dipanggil setelah data pelanggaran sebuah sekolah berubah."""
+    _invalidate('stats', school_id)
+
+
+def cached_roster(school_id, key, compute):
+    """Hasil autocomplete / daftar siswa per kelas, dengan versi sendiri per sekolah."""
+    return _cached('roster', school_id, key, current_app.config.get('ROSTER_CACHE_TTL', 600), compute)
+
+
+def invalidate_roster(school_id):
+    """Dipanggil setelah siswa ditambah, dihapus, diganti nama, atau dipindah kelas."""
+    _invalidate('roster', school_id)
+
+
+def cached_reference(school_id, compute):
+    """Data referensi sekolah (kelas, pasal, kategori, anggota) yang jarang berubah."""
+    return _cached('ref', school_id, 'all', current_app.config.get('REFERENCE_CACHE_TTL', 3600), compute)
+
+
+def invalidate_reference(school_id):
+    """Dipanggil setelah kelas, pasal, kategori, atau anggota sekolah berubah."""
+    _invalidate('ref', school_id)
+
+
+def cached_user(user_id, compute):
+    """
+    Snapshot identitas user untuk load_user (versi per user). Versinya dibaca dari Redis atau tabel
+    cache_versions di setiap request, jadi user yang dihapus atau diturunkan perannya langsung kehilangan
+    aksesnya di semua worker, bukan setelah IDENTITY_CACHE_TTL.
+    """
+    return _cached('user', user_id, 'identity', current_app.config.get('IDENTITY_CACHE_TTL', 300), compute)
+
+
+def invalidate_user(user_id):
+    """Dipanggil setelah username, password, peran, atau sekolah user berubah, atau user dihapus."""
+    _invalidate('user', user_id)
+
+
+def cached_school(school_id, compute):
+    """Snapshot profil sekolah (nama, alamat, logo) untuk current_user.school."""
+    return _cached('school', school_id, 'profile', current_app.config.get('IDENTITY_CACHE_TTL', 300), compute)
+
+
+def invalidate_school(school_id):
+    """Dipanggil setelah profil sekolah berubah (pengaturan atau restore)."""
+    _invalidate('school', school_id)
+
+
+def cache_stats():
+    """Jumlah hit / miss semua cache (statistik, daftar siswa, referensi, identitas) di proses ini."""
+    with _stats_lock:
+        total = _stats['hits'] + _stats['misses']
+        return dict(_stats, hit_rate=_stats['hits'] / total if total else 0.0,
+                    backend=type(_backend).__name__ if _backend else None)
@@ -0,0 +1,294 @@
+import os
+import time
+import shutil
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import or_, delete
+
+from my_app.extensions import db
+from my_app.models import School, Violation, ViolationPhoto, PhotoBlob
+from my_app.storage import upload_path
+
+SCAN_BATCH_SIZE = 1000
+
+
+def _scan(folder, rel=''):
+    """Telusuri folder upload secara rekursif dengan os.scandir (tanpa stat ulang per file)."""
+    with os.scandir(folder) as it:
+        for entry in it:
+            name = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan(entry.path, name)
+            elif entry.is_file(follow_symlinks=False):
+                st = entry.stat(follow_symlinks=False)
+                yield name, st.st_size, st.st_mtime
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _blob_hash(rel):
+    """Hash blob dari path blobs/ab/cd/<hash>[_ukuran].<ext>, atau None untuk file lama / sementara."""
+    parts = rel.split('/')
+    if len(parts) != 4 or parts[0] != 'blobs' or parts[1] == 'tmp':
+        return None
+    return parts[3].split('.')[0].split('_')[0]
+
+
+def _classify(batch, logos):
+    """
+    Cocokkan satu batch file dengan database.
+    Mengembalikan (dict nama_file -> set school_id, set nama file yang masih dipakai).
+
+    File dianggap terpakai jika dirujuk ViolationPhoto (blob_hash, filename, atau nama file turunannya),
+    atau jika PhotoBlob-nya masih punya refcount > 0. ViolationPhoto selalu diperiksa langsung, jadi foto
+    bukti tetap aman walaupun baris PhotoBlob hilang (foto lama) atau refcount-nya meleset.
+    """
+    owners = {rel: set() for rel, _, _ in batch}
+    referenced = set()
+    hashes = defaultdict(list)
+    files = []
+    for rel in owners:
+        if rel in logos:
+            owners[rel].add(logos[rel])
+            referenced.add(rel)
+            continue
+        files.append(rel)
+        blob_hash = _blob_hash(rel)
+        if blob_hash:
+            hashes[blob_hash].append(rel)
+    if not files:
+        return owners, referenced
+
+    conditions = [
+        ViolationPhoto.filename.in_(files),
+        ViolationPhoto.thumb_filename.in_(files),
+        ViolationPhoto.medium_filename.in_(files),
+    ]
+    if hashes:
+        conditions.append(ViolationPhoto.blob_hash.in_(list(hashes)))
+    rows = db.session.query(
+        ViolationPhoto.blob_hash, ViolationPhoto.filename, ViolationPhoto.thumb_filename, ViolationPhoto.medium_filename,
+        Violation.school_id
+    ).join(Violation, ViolationPhoto.violation_id == Violation.id).filter(or_(*conditions))
+    for blob_hash, full, thumb, medium, school_id in rows:
+        # Blob yang dirujuk: file full dan semua turunannya (blobs/ab/cd/<hash>_*.ext) ikut terpakai
+        for rel in hashes.get(blob_hash, []) + [full, thumb, medium]:
+            if rel in owners:
+                owners[rel].add(school_id)
+                referenced.add(rel)
+
+    if hashes:
+        # Blob dengan refcount > 0 tanpa foto (mis. baru disimpan restore yang belum selesai) juga dibiarkan
+        used = {h for h, in db.session.query(PhotoBlob.hash).filter(PhotoBlob.hash.in_(list(hashes)), PhotoBlob.refcount > 0)}
+        for blob_hash in used:
+            referenced.update(hashes[blob_hash])
+    return owners, referenced
+
+
+def _remove(upload_folder, rel, quarantine_folder):
+    path = upload_path(upload_folder, rel)
+    if quarantine_folder:
+        dest = upload_path(quarantine_folder, rel)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(path, dest)
+    else:
+        os.remove(path)
+    # Bersihkan folder shard yang kosong (blobs/ab/cd), berhenti di folder upload
+    folder = os.path.dirname(path)
+    while folder != upload_folder and os.path.dirname(folder) != folder:
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break
+        folder = os.path.dirname(folder)
+
+
+def _collect_raw_uploads(raw_folder, mode, min_age, quarantine_folder, batch_size):
+    """
+    File mentah (RAW_UPLOAD_FOLDER) yang tidak dirujuk foto pending: upload API yang tidak pernah
+    dipakai batch, atau sisa proses yang terhenti. Mengembalikan {'files', 'bytes'}.
+    """
+    orphans = {'files': 0, 'bytes': 0}
+    if not raw_folder or not os.path.isdir(raw_folder):
+        return orphans
+    cutoff = time.time() - min_age
+    for batch in _batches(_scan(raw_folder), batch_size):
+        old = [(rel, size) for rel, size, mtime in batch if mtime <= cutoff]
+        if not old:
+            continue
+        pending = {name for name, in db.session.query(ViolationPhoto.filename).filter(
+            ViolationPhoto.status == 'pending', ViolationPhoto.filename.in_([rel for rel, _ in old])
+        )}
+        for rel, size in old:
+            if rel in pending:
+                continue
+            if mode != 'report':
+                try:
+                    _remove(raw_folder, rel, os.path.join(quarantine_folder, 'raw_uploads') if quarantine_folder else None)
+                except FileNotFoundError:
+                    continue
+            orphans['files'] += 1
+            orphans['bytes'] += size
+    return orphans
+
+
+def collect_uploads(upload_folder, mode='report', min_age=3600, quarantine_root=None, batch_size=SCAN_BATCH_SIZE,
+                    raw_folder=None, raw_min_age=None):
+    """
+    Bandingkan isi folder upload dengan ViolationPhoto, PhotoBlob, dan School.logo per batch.
+
+    mode: 'report' (hanya hitung), 'quarantine' (pindahkan file yatim ke folder karantina),
+    atau 'delete' (hapus permanen). File yang lebih muda dari `min_age` detik dilewati agar
+    upload yang sedang diproses tidak ikut terhapus. Jika `raw_folder` diisi, file mentah yang lebih tua
+    dari `raw_min_age` detik dan tidak dirujuk foto pending ikut dibersihkan.
+    Mengembalikan ringkasan pemakaian disk per sekolah beserta jumlah file yatim.
+    """
+    if mode not in ('report', 'quarantine', 'delete'):
+        raise ValueError(f"Mode tidak dikenal: {mode}")
+    started = time.perf_counter()
+    quarantine_folder = None
+    if mode == 'quarantine':
+        quarantine_folder = os.path.join(quarantine_root, datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    logos = {logo: school_id for school_id, logo in db.session.query(School.id, School.logo).filter(School.logo.isnot(None))}
+    usage = defaultdict(lambda: {'files': 0, 'bytes': 0})
+    orphans = {'files': 0, 'bytes': 0}
+    scanned = 0
+    cutoff = time.time() - min_age
+
+    raw_orphans = _collect_raw_uploads(raw_folder, mode, min_age if raw_min_age is None else raw_min_age,
+                                       quarantine_folder, batch_size)
+    if not os.path.isdir(upload_folder):
+        return {'schools': {}, 'orphans': orphans, 'raw_orphans': raw_orphans, 'scanned': 0, 'seconds': 0.0,
+                'quarantine_folder': None}
+
+    for batch in _batches(_scan(upload_folder), batch_size):
+        scanned += len(batch)
+        owners, referenced = _classify(batch, logos)
+        candidates = []
+        for rel, size, mtime in batch:
+            if rel in referenced:
+                # Blob yang dipakai beberapa sekolah dihitung di masing-masing sekolah
+                for school_id in owners[rel]:
+                    usage[school_id]['files'] += 1
+                    usage[school_id]['bytes'] += size
+            elif mtime <= cutoff:
+                candidates.append((rel, size))
+
+        kept = set()
+        blob_hashes = {_blob_hash(rel) for rel, _ in candidates} - {None}
+        if mode != 'report' and blob_hashes:
+            # Hapus baris blob lebih dulu; refcount diperiksa ulang di WHERE sehingga blob yang
+            # baru saja dipakai lagi (upload / restore bersamaan) tidak ikut terhapus
+            db.session.execute(delete(PhotoBlob).where(PhotoBlob.hash.in_(blob_hashes), PhotoBlob.refcount <= 0))
+            db.session.commit()
+            kept = {h for h, in db.session.query(PhotoBlob.hash).filter(PhotoBlob.hash.in_(blob_hashes))}
+
+        for rel, size in candidates:
+            if _blob_hash(rel) in kept:
+                continue
+            if mode != 'report':
+                try:
+                    # File yang baru ditulis ulang sejak dipindai (blob yang sama diunggah lagi) dibiarkan
+                    if os.stat(upload_path(upload_folder, rel)).st_mtime > cutoff:
+                        continue
+                    _remove(upload_folder, rel, quarantine_folder)
+                except FileNotFoundError:
+                    continue
+            orphans['files'] += 1
+            orphans['bytes'] += size
+        # Lepaskan objek hasil query batch ini dari session
+        db.session.expire_all()
+
+    names = dict(db.session.query(School.id, School.name).filter(School.id.in_(list(usage)))) if usage else {}
+    return {
+        'schools': {school_id: dict(name=names.get(school_id, '?'), **stats) for school_id, stats in usage.items()},
+        'orphans': orphans,
+        'raw_orphans': raw_orphans,
+        'scanned': scanned,
+        'seconds': time.perf_counter() - started,
+        'quarantine_folder': quarantine_folder,
+    }
+
+
+def _format_size(num):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num < 1024 or unit == 'GB':
+            return f"{num:.1f} {unit}" if unit != 'B' else f"{num} B"
+        num /= 1024
+
+
+def run_cleanup(app, mode=None):
+    """Jalankan pembersihan dengan konfigurasi aplikasi (dipakai oleh command dan penjadwal)."""
+    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
+    min_age = app.config.get('UPLOAD_GC_MIN_AGE', 3600)
+    # File mentah yang belum dipakai masih bisa dilampirkan selama token upload-nya berlaku
+    raw_min_age = max(min_age, app.config.get('UPLOAD_TOKEN_MAX_AGE', 7 * 86400))
+    return collect_uploads(upload_folder, mode or app.config.get('UPLOAD_GC_MODE', 'quarantine'),
+                           min_age=min_age, quarantine_root=app.config['UPLOAD_QUARANTINE_FOLDER'],
+                           raw_folder=app.config.get('RAW_UPLOAD_FOLDER'), raw_min_age=raw_min_age)
+
+
+def start_cleanup_scheduler(app):
+    """
+    Jalankan pembersihan berkala di thread daemon jika UPLOAD_GC_SCHEDULER aktif dan UPLOAD_GC_INTERVAL > 0.
+    Modul app diimpor juga oleh setiap perintah CLI dan test, jadi penjadwal hanya aktif jika diminta
+    secara eksplisit (dan tidak pernah saat TESTING). Untuk server dengan banyak worker lebih baik pakai
+    cron: `flask cleanup-uploads --mode quarantine`.
+    """
+    interval = app.config.get('UPLOAD_GC_INTERVAL', 0)
+    if not app.config.get('UPLOAD_GC_SCHEDULER') or not interval or app.testing:
+        return None
+
+    def tick():
+        try:
+            with app.app_context():
+                result = run_cleanup(app)
+            app.logger.info('Pembersihan upload: %d file dipindai, %d file yatim (%s) dalam %.1f detik',
+                            result['scanned'], result['orphans']['files'], _format_size(result['orphans']['bytes']),
+                            result['seconds'])
+        except Exception:
+            app.logger.exception('Pembersihan upload gagal')
+        schedule()
+
+    def schedule():
+        timer = threading.Timer(interval, tick)
+        timer.daemon = True
+        timer.start()
+
+    schedule()
+    return interval
+
+
+@click.command('cleanup-uploads')
+@click.option('--mode', type=click.Choice(['report', 'quarantine', 'delete']), default='report', show_default=True,
+              help='report: hanya laporan, quarantine: pindahkan file yatim, delete: hapus permanen.')
+@click.option('--min-age', type=int, default=None, help='Lewati file yang lebih muda dari N detik.')
+@with_appcontext
+def cleanup_uploads_command(mode, min_age):
+    """Cari file upload yang tidak lagi dipakai dan tampilkan pemakaian disk per sekolah."""
+    if min_age is not None:
+        current_app.config['UPLOAD_GC_MIN_AGE'] = min_age
+    result = run_cleanup(current_app, mode)
+    click.echo(f"{result['scanned']} file dipindai dalam {result['seconds']:.1f} detik.")
+    for school_id, stats in sorted(result['schools'].items(), key=lambda item: -item[1]['bytes']):
+        click.echo(f"  [{school_id}] {stats['name']}: {stats['files']} file, {_format_size(stats['bytes'])}")
+    orphans = result['orphans']
+    action = {'report': 'ditemukan', 'quarantine': f"dikarantina ke {result['quarantine_folder']}", 'delete': 'dihapus'}[mode]
+    click.echo(f"File yatim {action}: {orphans['files']} file, {_format_size(orphans['bytes'])}")
+    raw = result['raw_orphans']
+    click.echo(f"File mentah tak terpakai {action}: {raw['files']} file, {_format_size(raw['bytes'])}")
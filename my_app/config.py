@@ -28,5 +28,70 @@ class Config:
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    # File mentah sebelum dikompres oleh worker gambar
+    RAW_UPLOAD_FOLDER = os.path.join(BASE_DIR, 'instance', 'raw_uploads')
+    IMAGE_WORKERS = 2
+    # Sisi terpanjang (px) tiap turunan foto bukti; thumbnail & medium bisa disimpan sebagai WebP
+    IMAGE_SIZES = {'thumb': 200, 'medium': 512, 'full': 1024}
+    IMAGE_WEBP = False
+    # Pembersihan file upload yang tidak lagi dipakai (flask cleanup-uploads)
+    UPLOAD_QUARANTINE_FOLDER = os.path.join(BASE_DIR, 'instance', 'quarantine')
+    UPLOAD_GC_MODE = 'quarantine'  # report / quarantine / delete
+    UPLOAD_GC_MIN_AGE = 60 * 60  # detik, file yang lebih baru dilewati
+    UPLOAD_GC_INTERVAL = 0  # detik, 0 = penjadwal bawaan nonaktif (pakai cron)
+    UPLOAD_GC_SCHEDULER = False  # aktifkan hanya di satu proses web; CLI dan test tidak menjalankannya
     
-    PER_PAGE = 20
\ No newline at end of file
+    PER_PAGE = 20
+
+    # Profiler per request (jumlah query, waktu DB & render) lewat header X-Query-* dan log
+    PROFILER_ENABLED = False
+    PROFILER_HEADERS = True
+    PROFILER_LOG = True
+    PROFILER_SLOW_COUNT = 3  # jumlah statement terlambat yang ditulis ke log
+
+    # Endpoint /metrics (format Prometheus)
+    METRICS_ENABLED = True
+    # Jika diisi, scraper harus mengirim 'Authorization: Bearer <token>'. Jika kosong, /metrics hanya
+    # melayani request langsung dari localhost (tidak lewat proxy)
+    METRICS_TOKEN = None
+    # Folder bersama untuk menggabungkan metrik beberapa worker (gunicorn dll.)
+    METRICS_FOLDER = None  # mis. os.path.join(BASE_DIR, 'instance', 'metrics')
+    METRICS_FLUSH_INTERVAL = 5  # detik antar penulisan snapshot per worker
+    METRICS_DEAD_WORKER_TTL = 15 * 60  # detik, snapshot worker yang sudah berhenti dihapus setelah ini
+
+    # Benchmark (flask seed + flask benchmark)
+    BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'instance', 'benchmark_baseline.json')
+    BENCHMARK_THRESHOLD = 0.25  # perlambatan relatif yang dianggap regresi
+
+    # Cache halaman statistik per (sekolah, rentang tren, hari)
+    STATS_CACHE_ENABLED = True
+    STATS_CACHE_TTL = 5 * 60  # detik
+    STATS_CACHE_MAXSIZE = 256  # jumlah entri LRU lokal
+    STATS_CACHE_URL = None  # mis. 'redis://localhost:6379/0' agar cache dipakai bersama antar worker
+    # Autocomplete siswa (/api/students) memakai backend cache yang sama, dengan LRU lokal sendiri
+    ROSTER_CACHE_TTL = 10 * 60  # detik
+    ROSTER_CACHE_MAXSIZE = 1024  # jumlah entri LRU lokal
+    ROSTER_MIN_PREFIX = 2  # huruf minimal kata kunci autocomplete (tanpa class_id)
+    # Kelas, pasal, kategori, dan anggota untuk form (diinvalidasi setiap kali diubah)
+    REFERENCE_CACHE_TTL = 60 * 60  # detik
+    REFERENCE_CACHE_MAXSIZE = 512  # jumlah entri LRU lokal (satu per sekolah)
+    # Snapshot user + sekolah untuk login (load_user dan current_user.school), dengan LRU lokal sendiri.
+    # Versi semua cache disimpan di Redis atau tabel cache_versions, jadi invalidasi berlaku di semua worker.
+    IDENTITY_CACHE_TTL = 5 * 60  # detik
+    IDENTITY_CACHE_MAXSIZE = 2048  # jumlah entri LRU lokal (user + sekolah)
+
+    # Jumlah baris per batch saat backup di-stream
+    BACKUP_BATCH_SIZE = 500
+    # Jumlah baris per bulk insert saat restore
+    RESTORE_CHUNK_SIZE = 1000
+    # Jumlah baris per bulk insert / update saat impor daftar siswa (CSV/XLSX)
+    IMPORT_CHUNK_SIZE = 1000
+
+    # API batch pelanggaran (klien offline): jumlah item per request dan umur token upload foto
+    INGEST_MAX_ITEMS = 200
+    UPLOAD_TOKEN_MAX_AGE = 7 * 24 * 3600  # detik
+
+    # Job latar belakang (backup, restore, laporan)
+    JOB_WORKERS = 2
+    JOB_FOLDER = os.path.join(BASE_DIR, 'instance', 'jobs')
+    JOB_ARTIFACT_TTL = 24 * 60 * 60  # detik, artefak lebih tua dari ini dihapus
\ No newline at end of file
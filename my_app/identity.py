@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+from flask_login import UserMixin
+
+from my_app.extensions import db
+from my_app.models import User, School
+from my_app.cache import cached_user, cached_school
+
+# Snapshot baca-saja; yang perlu mengubah data harus memuat objek ORM sendiri
+UserSnapshot = namedtuple('UserSnapshot', 'id username full_name role school_id')
+SchoolSnapshot = namedtuple('SchoolSnapshot', 'id name address logo')
+
+
+def school_snapshot(school_id):
+    def load():
+        row = db.session.query(School.id, School.name, School.address, School.logo).filter_by(id=school_id).first()
+        return SchoolSnapshot(*row) if row else None
+    return cached_school(school_id, load)
+
+
+class CachedUser(UserMixin):
+    """
+    current_user yang dibangun dari cache identitas, sehingga request biasa tidak menjalankan query login.
+    Atributnya sama dengan User yang dibaca template dan dekorator (id, username, full_name, role, school_id, school).
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._school = None
+
+    def __getattr__(self, name):
+        # Hanya dipanggil untuk atribut yang tidak ada di kelas: id, username, full_name, role, school_id
+        try:
+            return getattr(self.__dict__['_snapshot'], name)
+        except (KeyError, AttributeError):
+            raise AttributeError(name)
+
+    @property
+    def is_super_admin(self):
+        return self.role == 'super_admin'
+
+    @property
+    def school(self):
+        if self._school is None and self.school_id:
+            self._school = school_snapshot(self.school_id)
+        return self._school
+
+
+def load_identity(user_id):
+    """Dipakai sebagai user_loader Flask-Login. None jika user sudah dihapus."""
+    def load():
+        row = db.session.query(User.id, User.username, User.full_name, User.role, User.school_id).filter_by(id=user_id).first()
+        return UserSnapshot(*row) if row else None
+    snapshot = cached_user(user_id, load)
+    return CachedUser(snapshot) if snapshot else None
@@ -0,0 +1,177 @@
+import os
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from PIL import Image
+from flask import current_app
+from flask.cli import with_appcontext
+
+from my_app.extensions import db
+from my_app.models import ViolationPhoto, PhotoBlob
+from my_app.storage import store_blob, temp_folder, upload_path
+from my_app.utils import generate_derivatives
+from my_app.metrics import IMAGE_SECONDS, IMAGE_BYTES_SAVED
+
+# Pool khusus kompresi gambar. Pillow melepas GIL saat resize/encode,
+# jadi thread sudah cukup tanpa perlu process pool.
+_executor = None
+_executor_lock = threading.Lock()
+_futures = set()
+
+_stats_lock = threading.Lock()
+_stats = {
+    'queued': 0,
+    'processed': 0,
+    'failed': 0,
+    'total_seconds': 0.0,
+    'last_seconds': 0.0,
+}
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('IMAGE_WORKERS', 2),
+                                           thread_name_prefix='tanse-image')
+        return _executor
+
+
+def raw_upload_folder(app=None):
+    app = app or current_app
+    folder = app.config['RAW_UPLOAD_FOLDER']
+    if not os.path.exists(folder): os.makedirs(folder)
+    return folder
+
+
+def save_raw_upload(file_storage, filename):
+    """Simpan file upload apa adanya (cepat, tanpa decode gambar). Mengembalikan path file mentah."""
+    raw_path = os.path.join(raw_upload_folder(), filename)
+    file_storage.save(raw_path)
+    return raw_path
+
+
+def submit_photo(photo_id, raw_path, upload_folder):
+    """Antrikan kompresi satu foto. Dipanggil setelah baris ViolationPhoto (status pending) di-commit."""
+    app = current_app._get_current_object()
+    with _stats_lock:
+        _stats['queued'] += 1
+    future = _get_executor(app).submit(_process_photo, app, photo_id, raw_path, upload_folder)
+    _futures.add(future)
+    future.add_done_callback(_futures.discard)
+    return future
+
+
+def apply_derivatives(photo, derivatives):
+    """Catat nama file dan lebar tiap turunan gambar ke baris ViolationPhoto (atau PhotoBlob)."""
+    if 'full' in derivatives:
+        photo.width = derivatives['full'][1]
+    if 'thumb' in derivatives:
+        photo.thumb_filename, photo.thumb_width = derivatives['thumb'][:2]
+    if 'medium' in derivatives:
+        photo.medium_filename, photo.medium_width = derivatives['medium'][:2]
+
+
+def _process_photo(app, photo_id, raw_path, upload_folder):
+    started = time.perf_counter()
+    # Turunan dibuat di folder sementara, lalu dipindah ke penyimpanan per-hash (isi duplikat hanya disimpan sekali)
+    work_dir = temp_folder(upload_folder)
+    derivatives = generate_derivatives(raw_path, work_dir, 'full.jpg',
+                                       sizes=app.config.get('IMAGE_SIZES'), webp=app.config.get('IMAGE_WEBP', False))
+    success = derivatives is not None
+    elapsed = time.perf_counter() - started
+    IMAGE_SECONDS.observe(elapsed, status='ready' if success else 'failed')
+    if success and os.path.exists(raw_path):
+        IMAGE_BYTES_SAVED.inc(max(os.path.getsize(raw_path) - os.path.getsize(os.path.join(work_dir, 'full.jpg')), 0))
+    try:
+        with app.app_context():
+            photo = db.session.get(ViolationPhoto, photo_id)
+            if photo is not None:
+                photo.status = 'ready' if success else 'failed'
+                if success:
+                    store_blob(upload_folder, os.path.join(work_dir, 'full.jpg'), derivatives).apply_to(photo)
+                db.session.commit()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    # File yang gagal dikompres bukan gambar yang valid dan tidak akan dicoba lagi (status failed),
+    # jadi file mentahnya ikut dihapus. Jika commit di atas gagal, foto tetap pending dan file dibiarkan.
+    if os.path.exists(raw_path):
+        os.remove(raw_path)
+    with _stats_lock:
+        _stats['queued'] -= 1
+        _stats['processed' if success else 'failed'] += 1
+        _stats['total_seconds'] += elapsed
+        _stats['last_seconds'] = elapsed
+    app.logger.info('Kompresi foto %s %s dalam %.3f detik', photo_id, 'selesai' if success else 'gagal', elapsed)
+
+
+def image_queue_stats():
+    """Kedalaman antrean dan waktu rata-rata per gambar di proses ini."""
+    with _stats_lock:
+        done = _stats['processed'] + _stats['failed']
+        return {
+            'queue_depth': _stats['queued'],
+            'processed': _stats['processed'],
+            'failed': _stats['failed'],
+            'avg_seconds_per_image': _stats['total_seconds'] / done if done else 0.0,
+            'last_seconds_per_image': _stats['last_seconds'],
+        }
+
+
+def wait_for_images(timeout=None):
+    """Tunggu semua kompresi yang sedang antre (dipakai oleh test dan CLI)."""
+    for future in list(_futures):
+        future.result(timeout)
+
+
+@click.command('process-photos')
+@click.option('--derivatives', is_flag=True, help='Buat juga thumbnail/medium untuk foto lama yang belum punya.')
+@with_appcontext
+def process_photos_command(derivatives):
+    """Proses ulang foto yang masih pending (misalnya setelah server restart)."""
+    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+    pending = ViolationPhoto.query.filter_by(status='pending').all()
+    count = 0
+    for photo in pending:
+        raw_path = os.path.join(raw_upload_folder(), photo.filename)
+        if os.path.exists(raw_path):
+            submit_photo(photo.id, raw_path, upload_folder)
+            count += 1
+    wait_for_images()
+    click.echo(f"{count} foto pending diproses. {image_queue_stats()}")
+
+    if derivatives:
+        # Foto hasil restore / versi lama hanya punya file full; turunannya dibuat dari file tersebut
+        sizes = current_app.config.get('IMAGE_SIZES') or {'thumb': 200, 'medium': 512}
+        small_sizes = {k: v for k, v in sizes.items() if k != 'full'}
+        legacy = ViolationPhoto.query.filter(ViolationPhoto.status == 'ready', ViolationPhoto.thumb_filename.is_(None)).all()
+        done = 0
+        for photo in legacy:
+            blob = db.session.get(PhotoBlob, photo.blob_hash) if photo.blob_hash else None
+            if blob is not None and blob.thumb_filename:
+                # Blob yang sama sudah diproses untuk foto lain
+                blob.apply_to(photo)
+                done += 1
+                continue
+            path = upload_path(upload_folder, photo.filename)
+            if not os.path.exists(path):
+                continue
+            # File full dibiarkan apa adanya agar tidak di-encode ulang (lossy).
+            # Turunan ditulis di samping file full, jadi untuk blob namanya blobs/ab/cd/<hash>_thumb.jpg
+            result = generate_derivatives(path, os.path.dirname(path), os.path.basename(path), sizes=small_sizes,
+                                          webp=current_app.config.get('IMAGE_WEBP', False))
+            if result:
+                folder = os.path.dirname(photo.filename)
+                result = {k: (f"{folder}/{name}" if folder else name, w, h) for k, (name, w, h) in result.items()}
+                with Image.open(path) as img:
+                    photo.width = img.width
+                apply_derivatives(photo, result)
+                if blob is not None:
+                    blob.width = photo.width
+                    apply_derivatives(blob, result)
+                done += 1
+        db.session.commit()
+        click.echo(f"Turunan gambar dibuat untuk {done} foto lama.")
@@ -0,0 +1,253 @@
+import os
+import csv
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, update, bindparam
+
+from my_app.extensions import db
+from my_app.models import School, Student, Classroom, SchoolStats, StudentNameGram
+from my_app.utils import normalize_name
+from my_app.cache import invalidate_statistics, invalidate_roster, invalidate_reference
+
+# Judul kolom yang dikenali (huruf kecil) -> field
+IMPORT_COLUMNS = {
+    'nis': 'nis', 'nisn': 'nis', 'no induk': 'nis',
+    'nama': 'name', 'name': 'name', 'nama siswa': 'name', 'nama lengkap': 'name',
+    'kelas': 'classroom', 'class': 'classroom', 'rombel': 'classroom',
+}
+ERROR_SAMPLE_SIZE = 20
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # NIS yang diketik sebagai angka di Excel terbaca 12345.0
+        value = int(value)
+    return str(value).strip()
+
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            # Excel berbahasa Indonesia biasanya menyimpan CSV dengan pemisah ';'
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield [_cell(value) for value in row]
+
+
+def _xlsx_rows(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Impor XLSX membutuhkan paket 'openpyxl'. Simpan file sebagai CSV atau pasang openpyxl.")
+    # read_only: baris dibaca bertahap dari arsip, bukan seluruh sheet sekaligus
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [_cell(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_records(path):
+    """Baca file CSV/XLSX baris demi baris. Menghasilkan (nomor_baris, {'nis', 'name', 'classroom'})."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        rows = _csv_rows(path)
+    elif ext == '.xlsx':
+        rows = _xlsx_rows(path)
+    else:
+        raise ValueError('Format file harus .csv atau .xlsx')
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('File kosong.')
+    columns = [IMPORT_COLUMNS.get(title.lower()) for title in header]
+    if 'nis' not in columns or 'name' not in columns:
+        raise ValueError('Baris judul harus memuat kolom "NIS" dan "Nama" (kolom "Kelas" opsional).')
+    for line, row in enumerate(rows, start=2):
+        if not any(row):
+            continue
+        record = {'nis': '', 'name': '', 'classroom': ''}
+        for column, value in zip(columns, row):
+            if column:
+                record[column] = value
+        yield line, record
+
+
+def _validate(record, seen_nis):
+    problems = []
+    if not record['nis']:
+        problems.append('NIS kosong')
+    elif len(record['nis']) > 20:
+        problems.append('NIS lebih dari 20 karakter')
+    elif record['nis'] in seen_nis:
+        problems.append('NIS ganda di dalam file')
+    if not record['name']:
+        problems.append('Nama kosong')
+    elif len(record['name']) > 100:
+        problems.append('Nama lebih dari 100 karakter')
+    if len(record['classroom']) > 50:
+        problems.append('Nama kelas lebih dari 50 karakter')
+    return problems
+
+
+def _chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _existing(school_id, nis_list):
+    return {nis: (sid, name, classroom_id) for sid, nis, name, classroom_id in db.session.query(
+        Student.id, Student.nis, Student.name, Student.classroom_id
+    ).filter(Student.school_id == school_id, Student.nis.in_(nis_list))}
+
+
+def import_students(school_id, path, dry_run=False, chunk_size=1000, error_path=None, progress=None):
+    """
+    Impor daftar siswa satu sekolah dari CSV/XLSX, upsert berdasarkan NIS.
+
+    Tahap 1 selalu berjalan: validasi seluruh file (dibaca bertahap), tulis baris bermasalah ke
+    `error_path` (CSV), dan hitung siswa baru / yang diperbarui serta kelas yang akan dibuat.
+    Tahap 2 hanya berjalan jika tidak ada error dan bukan dry run: kelas baru dibuat, lalu siswa
+    ditulis dengan bulk insert / update per `chunk_size` baris. Tidak melakukan commit.
+    """
+    summary = {'rows': 0, 'errors': 0, 'created': 0, 'updated': 0, 'unchanged': 0,
+               'classrooms_created': 0, 'error_samples': [], 'dry_run': dry_run, 'applied': False}
+    classroom_ids = dict(db.session.query(Classroom.name, Classroom.id).filter_by(school_id=school_id))
+    new_classes = set()
+    seen_nis = set()
+
+    error_file = open(error_path, 'w', newline='', encoding='utf-8') if error_path else None
+    try:
+        writer = csv.writer(error_file) if error_file else None
+        if writer:
+            writer.writerow(['Baris', 'NIS', 'Nama', 'Kelas', 'Kesalahan'])
+
+        def valid_records():
+            for line, record in iter_records(path):
+                summary['rows'] += 1
+                problems = _validate(record, seen_nis)
+                seen_nis.add(record['nis'])
+                if problems:
+                    summary['errors'] += 1
+                    message = '; '.join(problems)
+                    if writer:
+                        writer.writerow([line, record['nis'], record['name'], record['classroom'], message])
+                    if len(summary['error_samples']) < ERROR_SAMPLE_SIZE:
+                        summary['error_samples'].append((line, message))
+                    continue
+                if record['classroom'] and record['classroom'] not in classroom_ids:
+                    new_classes.add(record['classroom'])
+                yield record
+
+        for chunk in _chunks(valid_records(), chunk_size):
+            existing = _existing(school_id, [r['nis'] for r in chunk])
+            for record in chunk:
+                current = existing.get(record['nis'])
+                if current is None:
+                    summary['created'] += 1
+                elif current[1] != record['name'] or (record['classroom'] and classroom_ids.get(record['classroom']) != current[2]):
+                    summary['updated'] += 1
+                else:
+                    summary['unchanged'] += 1
+    finally:
+        if error_file:
+            error_file.close()
+    summary['classrooms_created'] = len(new_classes)
+    if dry_run or summary['errors']:
+        return summary
+
+    # Tahap 2: tulis. Kelas baru lewat ORM (penghitung kelas ikut diperbarui oleh event session)
+    classrooms = [Classroom(name=name, school_id=school_id) for name in sorted(new_classes)]
+    db.session.add_all(classrooms)
+    db.session.flush()
+    classroom_ids.update((c.name, c.id) for c in classrooms)
+
+    connection = db.session.connection()
+    update_stmt = update(Student.__table__).where(Student.__table__.c.id == bindparam('sid')).values(
+        name=bindparam('new_name'), name_search=bindparam('new_name_search'), classroom_id=bindparam('new_classroom_id')
+    )
+    done = 0
+    total = summary['rows']
+    for chunk in _chunks((record for _, record in iter_records(path)), chunk_size):
+        existing = _existing(school_id, [r['nis'] for r in chunk])
+        inserts, updates = [], []
+        for record in chunk:
+            classroom_id = classroom_ids.get(record['classroom']) if record['classroom'] else None
+            current = existing.get(record['nis'])
+            if current is None:
+                inserts.append({'name': record['name'], 'name_search': normalize_name(record['name']), 'nis': record['nis'],
+                                'school_id': school_id, 'classroom_id': classroom_id})
+                continue
+            sid, name, current_class = current
+            new_class = classroom_id if record['classroom'] else current_class
+            if name != record['name'] or new_class != current_class:
+                updates.append({'sid': sid, 'new_name': record['name'], 'new_name_search': normalize_name(record['name']),
+                                'new_classroom_id': new_class})
+        # Insert / update Core melewati event session: penghitung dan indeks nama disesuaikan di sini
+        if inserts:
+            connection.execute(insert(Student), inserts)
+            SchoolStats.adjust(connection, school_id, students=len(inserts))
+            created = _existing(school_id, [row['nis'] for row in inserts])
+            StudentNameGram.index(connection, [(created[row['nis']][0], school_id, row['name_search']) for row in inserts])
+        if updates:
+            connection.execute(update_stmt, updates)
+            StudentNameGram.index(connection, [(row['sid'], school_id, row['new_name_search']) for row in updates])
+        done += len(chunk)
+        if progress:
+            progress(done, total)
+    # Objek Student yang sudah ada di session tidak tahu perubahan Core di atas
+    db.session.expire_all()
+    summary['applied'] = True
+    return summary
+
+
+def summary_message(summary):
+    if summary['errors']:
+        return (f"Validasi gagal: {summary['errors']} dari {summary['rows']} baris bermasalah, tidak ada data yang diimpor. "
+                f"Unduh laporan kesalahan untuk detailnya.")
+    prefix = 'Dry run (tidak ada perubahan)' if summary['dry_run'] else 'Impor selesai'
+    return (f"{prefix}: {summary['created']} siswa baru, {summary['updated']} diperbarui, {summary['unchanged']} tetap, "
+            f"{summary['classrooms_created']} kelas baru.")
+
+
+@click.command('import-students')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--school', 'school_id', type=int, required=True, help='Id sekolah tujuan.')
+@click.option('--dry-run', is_flag=True, help='Hanya validasi dan hitung perubahan, tanpa menulis.')
+@click.option('--errors', 'error_path', default=None, help='Tulis baris bermasalah ke file CSV ini.')
+@click.option('--chunk-size', type=int, default=None, help='Jumlah baris per bulk insert (bawaan: IMPORT_CHUNK_SIZE).')
+@with_appcontext
+def import_students_command(path, school_id, dry_run, error_path, chunk_size):
+    """Impor daftar siswa (CSV/XLSX: kolom NIS, Nama, Kelas) untuk satu sekolah."""
+    if db.session.get(School, school_id) is None:
+        raise click.ClickException(f"Sekolah {school_id} tidak ditemukan.")
+    chunk_size = chunk_size or current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+    try:
+        summary = import_students(school_id, path, dry_run=dry_run, chunk_size=chunk_size, error_path=error_path)
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    if summary['applied']:
+        invalidate_statistics(school_id)
+        invalidate_roster(school_id)
+        if summary['classrooms_created']:
+            invalidate_reference(school_id)
+    for line, message in summary['error_samples']:
+        click.echo(f"  Baris {line}: {message}")
+    click.echo(summary_message(summary))
+    if summary['errors']:
+        raise SystemExit(1)
@@ -0,0 +1,250 @@
+import os
+import time
+import secrets
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import insert, or_
+from werkzeug.utils import secure_filename
+
+from my_app.extensions import db
+from my_app.models import Student, Violation, ViolationCategory, ViolationPhoto, SchoolStats, ViolationDailyRollup
+from my_app.images import raw_upload_folder, save_raw_upload
+
+MAX_PHOTOS_PER_ITEM = 10
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='violation-upload')
+
+
+def store_upload(file_storage, school_id):
+    """Simpan foto mentah untuk dipakai nanti oleh batch ingest. Mengembalikan token upload."""
+    name = os.path.splitext(secure_filename(file_storage.filename))[0]
+    filename = f"{int(time.time())}_{secrets.token_hex(4)}_{name}.jpg"
+    save_raw_upload(file_storage, filename)
+    return _serializer().dumps({'f': filename, 's': school_id})
+
+
+def read_upload(token, school_id):
+    """
+    Nama file mentah dari token upload, atau None jika token palsu, kedaluwarsa, milik sekolah lain, atau
+    filenya sudah tidak ada. Apakah token sudah dipakai dicek terpisah lewat ViolationPhoto.raw_filename.
+    """
+    if not isinstance(token, str):
+        return None
+    try:
+        data = _serializer().loads(token, max_age=current_app.config.get('UPLOAD_TOKEN_MAX_AGE', 7 * 86400))
+    except (BadSignature, TypeError):
+        return None
+    if data.get('s') != school_id or not os.path.exists(os.path.join(raw_upload_folder(), data['f'])):
+        return None
+    return data['f']
+
+
+def _consumed_uploads(filenames):
+    """File mentah yang sudah terpasang ke ViolationPhoto (token-nya sudah pernah dipakai)."""
+    if not filenames:
+        return set()
+    return {name for name, in db.session.query(ViolationPhoto.raw_filename).filter(
+        ViolationPhoto.raw_filename.in_(list(filenames))
+    )}
+
+
+def _int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _client_key(item):
+    """client_key sebagai teks (angka diterima), atau None jika kosong, bukan teks, atau lebih dari 64 karakter."""
+    if not isinstance(item, dict):
+        return None
+    key = item.get('client_key')
+    if isinstance(key, int) and not isinstance(key, bool):
+        key = str(key)
+    if not isinstance(key, str) or not key or len(key) > 64:
+        return None
+    return key
+
+
+def _parse_date(value):
+    if not value:
+        return datetime.utcnow()
+    if not isinstance(value, str):
+        raise ValueError(value)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Disimpan naif dalam UTC seperti kolom lainnya; waktu dengan zona (mis. +07:00) dikonversi dulu
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.replace(tzinfo=None)
+
+
+def _text(item, field, max_length):
+    """Nilai teks opsional; ValueError jika bukan string atau terlalu panjang untuk kolomnya."""
+    value = item.get(field)
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} harus berupa teks.')
+    if len(value) > max_length:
+        raise ValueError(f'{field} maksimal {max_length} karakter.')
+    return value
+
+
+def ingest_violations(school_id, items, max_items=200):
+    """
+    Simpan banyak pelanggaran sekaligus. Tiap item memuat client_key (kunci idempotensi), student_id atau nis,
+    description, serta opsional kategori_id / kategori, pasal, di_input_oleh, date_posted (ISO 8601), photos (token upload).
+
+    Siswa, kategori, dan kunci yang sudah pernah dikirim masing-masing diambil dengan satu query untuk seluruh batch,
+    lalu pelanggaran ditulis dengan satu bulk insert. Mengembalikan (hasil per item, [(photo_id, raw_path)] untuk
+    dikompres setelah commit). Status item: created, duplicate, atau error. Tidak melakukan commit.
+    """
+    if len(items) > max_items:
+        raise ValueError(f'Maksimal {max_items} pelanggaran per batch.')
+    results = [{'client_key': item.get('client_key') if isinstance(item, dict) else None} for item in items]
+
+    def fail(index, message):
+        results[index].update(status='error', error=message)
+
+    keys = [key for key in (_client_key(item) for item in items) if key]
+    ids = {_int(item.get('student_id')) for item in items if isinstance(item, dict) and _int(item.get('student_id'))}
+    nis = {item['nis'] for item in items if isinstance(item, dict) and isinstance(item.get('nis'), str) and not item.get('student_id')}
+    existing = dict(db.session.query(Violation.client_key, Violation.id).filter(
+        Violation.school_id == school_id, Violation.client_key.in_(keys)
+    )) if keys else {}
+    students_by_id, students_by_nis = {}, {}
+    if ids or nis:
+        for sid, student_nis in db.session.query(Student.id, Student.nis).filter(
+            Student.school_id == school_id, or_(Student.id.in_(ids), Student.nis.in_(nis))
+        ):
+            students_by_id[sid] = sid
+            students_by_nis[student_nis] = sid
+    categories = ViolationCategory.query.filter_by(school_id=school_id).all()
+    categories_by_id = {c.id: c for c in categories}
+    categories_by_name = {c.name: c for c in categories}
+    # Token foto dibaca lebih dulu agar token yang sudah pernah dipakai dicek dengan satu query per batch
+    files_by_index = {}
+    for index, item in enumerate(items):
+        tokens = item.get('photos') if isinstance(item, dict) else None
+        if isinstance(tokens, list) and len(tokens) <= MAX_PHOTOS_PER_ITEM:
+            files_by_index[index] = [read_upload(token, school_id) for token in tokens]
+    consumed = _consumed_uploads({name for files in files_by_index.values() for name in files if name})
+
+    rows, photos = [], {}  # photos: client_key -> [nama file mentah]
+    seen_keys, used_files = set(), set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            fail(index, 'Item harus berupa objek JSON.')
+            continue
+        key = _client_key(item)
+        if not key:
+            fail(index, 'client_key wajib diisi (teks, maksimal 64 karakter).')
+            continue
+        if key in existing:
+            results[index].update(status='duplicate', id=existing[key])
+            continue
+        if key in seen_keys:
+            fail(index, 'client_key ganda di dalam batch.')
+            continue
+        nis_value = item.get('nis') if isinstance(item.get('nis'), str) else None
+        student_id = students_by_id.get(_int(item.get('student_id'))) if item.get('student_id') else students_by_nis.get(nis_value)
+        if student_id is None:
+            fail(index, 'Siswa tidak ditemukan.')
+            continue
+        description = item.get('description')
+        if not isinstance(description, str) or not description.strip():
+            fail(index, 'Deskripsi wajib diisi.')
+            continue
+        description = description.strip()
+        if len(description) > 2000:
+            fail(index, 'description maksimal 2000 karakter.')
+            continue
+        try:
+            date_posted = _parse_date(item.get('date_posted'))
+        except ValueError:
+            fail(index, 'Format date_posted harus ISO 8601.')
+            continue
+        try:
+            category_name = _text(item, 'kategori', 50)
+            pasal = _text(item, 'pasal', 255)
+            recorded_by = _text(item, 'di_input_oleh', 100)
+        except ValueError as e:
+            fail(index, str(e))
+            continue
+        if item.get('kategori_id') is not None:
+            category = categories_by_id.get(_int(item.get('kategori_id')))
+        else:
+            category = categories_by_name.get(category_name)
+        if category is None and (item.get('kategori_id') is not None or category_name):
+            # Kategori yang dikirim harus ada; tanpa kategori barulah dicatat sebagai "Umum" dengan 0 poin
+            fail(index, 'Kategori pelanggaran tidak ditemukan.')
+            continue
+        tokens = item.get('photos') or []
+        if not isinstance(tokens, list):
+            fail(index, 'photos harus berupa daftar token upload.')
+            continue
+        if len(tokens) > MAX_PHOTOS_PER_ITEM:
+            fail(index, f'Maksimal {MAX_PHOTOS_PER_ITEM} foto per pelanggaran.')
+            continue
+        files = files_by_index.get(index, [])
+        if None in files:
+            fail(index, 'Token foto tidak valid atau kedaluwarsa.')
+            continue
+        if (consumed | used_files) & set(files) or len(set(files)) != len(files):
+            fail(index, 'Token foto sudah dipakai.')
+            continue
+        used_files.update(files)
+        seen_keys.add(key)
+        photos[key] = files
+        rows.append({
+            'description': description,
+            'points': category.points if category else 0,
+            'date_posted': date_posted,
+            'student_id': student_id,
+            'school_id': school_id,
+            'pasal': pasal,
+            'kategori_pelanggaran': category.name if category else "Umum",
+            'di_input_oleh': recorded_by,
+            'is_remitted': False,
+            'client_key': key,
+        })
+        results[index]['status'] = 'created'
+
+    pending_photos = []
+    if rows:
+        # Insert Core melewati event session: penghitung, poin siswa, dan rekap harian disesuaikan di sini
+        connection = db.session.connection()
+        db.session.execute(insert(Violation), rows)
+        SchoolStats.adjust(connection, school_id, violations=len(rows))
+        points = Counter()
+        rollup = defaultdict(lambda: [0, 0])
+        for row in rows:
+            points[row['student_id']] += row['points']
+            delta = rollup[ViolationDailyRollup.key(school_id, row['date_posted'], row['kategori_pelanggaran'])]
+            delta[0] += 1
+            delta[1] += row['points']
+        Student.adjust_points(connection, points)
+        ViolationDailyRollup.apply(connection, rollup)
+
+        created = dict(db.session.query(Violation.client_key, Violation.id).filter(
+            Violation.school_id == school_id, Violation.client_key.in_([row['client_key'] for row in rows])
+        ))
+        for result in results:
+            if result.get('status') == 'created':
+                result['id'] = created[str(result['client_key'])]
+        photo_rows = [{'filename': filename, 'raw_filename': filename, 'violation_id': created[key], 'status': 'pending'}
+                      for key, files in photos.items() for filename in files]
+        if photo_rows:
+            db.session.execute(insert(ViolationPhoto), photo_rows)
+            folder = raw_upload_folder()
+            pending_photos = [(photo_id, os.path.join(folder, filename)) for photo_id, filename in db.session.query(
+                ViolationPhoto.id, ViolationPhoto.filename
+            ).filter(ViolationPhoto.violation_id.in_(created.values()), ViolationPhoto.status == 'pending')]
+    return results, pending_photos
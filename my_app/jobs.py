@@ -0,0 +1,285 @@
+import os
+import time
+import socket
+import secrets
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, render_template
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload, selectinload
+
+from my_app.extensions import db
+from my_app.models import Job, School, Classroom, Student, Violation
+from my_app.backup import iter_backup_zip, backup_filename, restore_backup
+from my_app.importer import import_students, summary_message
+from my_app.cache import invalidate_statistics, invalidate_roster, invalidate_reference, invalidate_school
+from my_app.metrics import JOB_SECONDS
+from my_app.utils import pid_alive
+
+# Pool thread lokal, tanpa broker eksternal. Dibuat saat job pertama masuk.
+_executor = None
+_executor_lock = threading.Lock()
+
+# Progres terbaru per job di proses ini (lebih segar daripada kolom DB)
+_live_progress = {}
+_futures = {}
+
+# Identitas proses ini di kolom Job.worker. Token acak membedakan proses baru dari proses lama
+# dengan PID yang sama (misalnya container yang di-restart).
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('JOB_WORKERS', 2),
+                                           thread_name_prefix='tanse-job')
+        return _executor
+
+
+def job_folder(app=None):
+    app = app or current_app
+    folder = app.config['JOB_FOLDER']
+    if not os.path.exists(folder): os.makedirs(folder)
+    return folder
+
+
+class JobContext:
+    """Diberikan ke fungsi job: id job, sekolah pemilik, lokasi artefak, dan pelapor progres."""
+
+    def __init__(self, app, job_id, school_id):
+        self.app = app
+        self.job_id = job_id
+        self.school_id = school_id
+        self._last_percent = -1
+
+    def path(self, filename):
+        return os.path.join(job_folder(self.app), filename)
+
+    def progress(self, done, total):
+        percent = min(99, int(done * 100 / total)) if total else 0
+        if percent == self._last_percent:
+            return
+        self._last_percent = percent
+        _live_progress[self.job_id] = percent
+        # SQLite hanya punya satu writer; job yang sedang menulis akan membuat update ini menunggu.
+        # Di sana cukup progres in-memory, di MySQL progres juga dicatat agar terbaca oleh worker lain.
+        if db.engine.dialect.name == 'sqlite':
+            return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(update(Job).where(Job.id == self.job_id).values(progress=percent))
+        except Exception as e:
+            self.app.logger.warning('Gagal mencatat progres job %s: %s', self.job_id, e)
+
+
+def enqueue(kind, school_id, user_id, func, *args):
+    """
+    Simpan job baru di tabel jobs lalu jalankan `func(ctx, *args)` di pool thread.
+    `func` menerima JobContext sebagai argumen pertama dan boleh mengembalikan dict
+    berisi artifact, download_name, mimetype, dan message.
+    """
+    purge_expired_artifacts()
+    job = Job(kind=kind, school_id=school_id, user_id=user_id, worker=_WORKER_ID)
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    _futures[job.id] = _get_executor(app).submit(_run, app, job.id, func, args)
+    return job
+
+
+def _run(app, job_id, func, args):
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.status = 'running'
+        db.session.commit()
+        started = time.perf_counter()
+        try:
+            result = func(JobContext(app, job_id, job.school_id), *args) or {}
+            job = db.session.get(Job, job_id)
+            job.status = 'done'
+            job.progress = 100
+            job.message = result.get('message')
+            job.artifact = result.get('artifact')
+            job.download_name = result.get('download_name')
+            job.mimetype = result.get('mimetype')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Job %s (%s) gagal', job_id, func.__name__)
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.message = str(e)[:255]
+        finally:
+            _live_progress.pop(job_id, None)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        JOB_SECONDS.observe(elapsed, kind=job.kind, status=job.status)
+        app.logger.info('Job %s (%s) %s dalam %.2f detik', job_id, job.kind, job.status, elapsed)
+        _futures.pop(job_id, None)
+
+
+def job_progress(job):
+    """
+    Progres job dalam persen. Proses yang menjalankan job membaca progres in-memory; proses lain membaca
+    kolom Job.progress. Di SQLite kolom itu baru diisi saat job selesai (lihat JobContext.progress), jadi
+    /jobs/<id> yang dilayani worker lain menampilkan 0% sampai job selesai.
+    """
+    if job.is_finished:
+        return job.progress
+    return _live_progress.get(job.id, job.progress)
+
+
+def _is_orphaned(worker):
+    if not worker:
+        return True
+    host, _, rest = worker.partition(':')
+    pid, _, token = rest.partition(':')
+    if host != socket.gethostname():
+        # PID di host lain tidak bisa diperiksa
+        return False
+    if worker == _WORKER_ID:
+        return False
+    if pid == str(os.getpid()):
+        # PID sama dengan proses ini tetapi token berbeda: proses lama sudah berhenti
+        return True
+    return not (pid.isdigit() and pid_alive(int(pid)))
+
+
+def fail_orphaned_jobs():
+    """
+    Tandai job queued / running yang prosesnya sudah berhenti sebagai failed. Job berjalan di pool thread
+    proses pembuatnya, jadi setelah restart job tersebut tidak akan pernah selesai dan halaman pengaturan
+    akan terus mem-polling-nya. Mengembalikan jumlah job yang ditandai.
+    """
+    orphaned = [job for job in Job.query.filter(Job.status.in_(['queued', 'running'])) if _is_orphaned(job.worker)]
+    for job in orphaned:
+        job.status = 'failed'
+        job.message = 'Proses berhenti (server di-restart) sebelum job selesai. Silakan ulangi.'
+        job.finished_at = datetime.utcnow()
+    if orphaned:
+        db.session.commit()
+    return len(orphaned)
+
+
+def init_jobs(app):
+    """Bersihkan job yatim sekali per proses, saat request pertama (tabel jobs pasti sudah ada)."""
+    state = {'done': False}
+    lock = threading.Lock()
+
+    @app.before_request
+    def _fail_orphaned_jobs():
+        if state['done']:
+            return
+        with lock:
+            if state['done']:
+                return
+            state['done'] = True
+            try:
+                count = fail_orphaned_jobs()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Gagal memeriksa job yatim')
+                return
+            if count:
+                app.logger.warning('%d job yatim dari proses sebelumnya ditandai gagal', count)
+
+
+def wait_for(job_id, timeout=None):
+    """Tunggu job selesai (dipakai oleh test dan skrip CLI)."""
+    future = _futures.get(job_id)
+    if future:
+        future.result(timeout)
+
+
+def purge_expired_artifacts():
+    """Hapus file artefak job yang sudah melewati JOB_ARTIFACT_TTL."""
+    limit = datetime.utcnow() - timedelta(seconds=current_app.config.get('JOB_ARTIFACT_TTL', 86400))
+    expired = Job.query.filter(Job.artifact.isnot(None), Job.finished_at < limit).all()
+    for job in expired:
+        path = os.path.join(job_folder(), job.artifact)
+        if os.path.exists(path): os.remove(path)
+        job.artifact = None
+    if expired:
+        db.session.commit()
+
+
+# --- FUNGSI JOB ---
+
+def backup_task(ctx, upload_folder, batch_size):
+    school = db.session.get(School, ctx.school_id)
+    download_name = backup_filename(school.name)
+    artifact = f"backup_{ctx.job_id}.zip"
+    with open(ctx.path(artifact), 'wb') as f:
+        for chunk in iter_backup_zip(school.id, upload_folder, batch_size, progress=ctx.progress):
+            f.write(chunk)
+    return {'artifact': artifact, 'download_name': download_name, 'mimetype': 'application/zip'}
+
+
+def restore_task(ctx, zip_path, upload_folder, chunk_size):
+    try:
+        try:
+            zf = zipfile.ZipFile(zip_path)
+        except zipfile.BadZipFile:
+            raise ValueError('File ZIP rusak atau tidak valid.')
+        with zf:
+            if 'data.json' not in zf.namelist():
+                raise ValueError('Format backup tidak valid (data.json hilang).')
+            school = db.session.get(School, ctx.school_id)
+            result = restore_backup(zf, school, upload_folder, chunk_size, progress=ctx.progress)
+        db.session.commit()
+        invalidate_statistics(ctx.school_id)
+        invalidate_roster(ctx.school_id)
+        invalidate_reference(ctx.school_id)
+        invalidate_school(ctx.school_id)  # nama, alamat, dan logo ikut dipulihkan
+    finally:
+        if os.path.exists(zip_path): os.remove(zip_path)
+    current_app.logger.info('Restore sekolah %s: %d baris dalam %.2f detik (%.0f baris/detik)',
+                            ctx.school_id, result['rows'], result['seconds'], result['rows_per_second'])
+    return {'message': f"Restore Berhasil! {result['students']} siswa dan {result['violations']} pelanggaran dipulihkan "
+                       f"({result['rows_per_second']:.0f} baris/detik)."}
+
+
+def import_task(ctx, file_path, dry_run, chunk_size):
+    artifact = f"import_errors_{ctx.job_id}.csv"
+    try:
+        summary = import_students(ctx.school_id, file_path, dry_run=dry_run, chunk_size=chunk_size,
+                                  error_path=ctx.path(artifact), progress=ctx.progress)
+        db.session.commit()
+        if summary['applied']:
+            invalidate_statistics(ctx.school_id)
+            invalidate_roster(ctx.school_id)
+            if summary['classrooms_created']:
+                invalidate_reference(ctx.school_id)
+    finally:
+        if os.path.exists(file_path): os.remove(file_path)
+    result = {'message': summary_message(summary)[:255]}
+    if summary['errors']:
+        # Laporan kesalahan jadi artefak yang bisa diunduh dari daftar job
+        result.update(artifact=artifact, download_name='Laporan_Kesalahan_Impor.csv', mimetype='text/csv')
+    elif os.path.exists(ctx.path(artifact)):
+        os.remove(ctx.path(artifact))
+    return result
+
+
+def class_report_task(ctx, class_id):
+    school = db.session.get(School, ctx.school_id)
+    classroom = Classroom.query.filter_by(id=class_id, school_id=school.id).first()
+    if not classroom:
+        raise ValueError('Kelas tidak ditemukan.')
+    violations = Violation.query.join(Student).filter(
+        Violation.school_id == school.id,
+        Student.classroom_id == class_id
+    ).options(joinedload(Violation.student), selectinload(Violation.photos)).order_by(Violation.date_posted.desc()).all()
+
+    # url_for di template butuh request context
+    with ctx.app.test_request_context():
+        html = render_template('print_class_report.html', classroom=classroom, violations=violations, school=school)
+    artifact = f"class_report_{ctx.job_id}.html"
+    with open(ctx.path(artifact), 'w', encoding='utf-8') as f:
+        f.write(html)
+    return {'artifact': artifact, 'download_name': f"Laporan_Kelas_{classroom.name}.html", 'mimetype': 'text/html'}
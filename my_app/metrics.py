@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import atexit
+import threading
+
+from flask import g, request, current_app
+from sqlalchemy import event
+
+from my_app.extensions import db
+from my_app.utils import pid_alive
+
+# Bucket default Prometheus (detik) untuk latensi request dan kompresi gambar
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Backup / restore bisa berjalan beberapa menit
+JOB_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.values = {}
+        with _lock:
+            _metrics[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def snapshot(self):
+        return {'kind': self.kind, 'doc': self.doc, 'labels': list(self.labels),
+                'samples': [[list(key), value] for key, value in self.values.items()]}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Nilai sesaat. Antar worker dijumlahkan (hanya dari proses yang masih hidup)."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [jumlah per bucket (tidak kumulatif) ..., +Inf, sum]
+            sample = self.values.get(key)
+            if sample is None:
+                sample = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(self.buckets)
+            sample[index] += 1
+            sample[-1] += value
+
+    def snapshot(self):
+        data = super().snapshot()
+        data['buckets'] = list(self.buckets)
+        return data
+
+
+REQUEST_COUNT = Counter('tanse_http_requests_total', 'Jumlah request HTTP per endpoint.', ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('tanse_http_request_duration_seconds', 'Latensi request HTTP per endpoint.', ('endpoint',))
+POOL_CHECKOUTS = Counter('tanse_db_pool_checkouts_total', 'Jumlah koneksi yang diambil dari pool SQLAlchemy.')
+POOL_SIZE = Gauge('tanse_db_pool_size', 'Ukuran pool koneksi SQLAlchemy.')
+POOL_CHECKED_OUT = Gauge('tanse_db_pool_checked_out', 'Koneksi yang sedang dipakai.')
+POOL_OVERFLOW = Gauge('tanse_db_pool_overflow', 'Koneksi overflow di atas pool_size.')
+IMAGE_SECONDS = Histogram('tanse_image_compress_seconds', 'Durasi kompresi satu foto bukti.', ('status',))
+IMAGE_BYTES_SAVED = Counter('tanse_image_bytes_saved_total', 'Selisih ukuran file mentah dan hasil kompresi (byte).')
+JOB_SECONDS = Histogram('tanse_job_duration_seconds', 'Durasi job latar belakang (backup, restore, laporan).',
+                        ('kind', 'status'), buckets=JOB_BUCKETS)
+
+
+def _update_pool_gauges(pool):
+    # size() / checkedout() / overflow() hanya ada di QueuePool (MySQL); SQLite memakai pool lain
+    for gauge, attr in ((POOL_SIZE, 'size'), (POOL_CHECKED_OUT, 'checkedout'), (POOL_OVERFLOW, 'overflow')):
+        method = getattr(pool, attr, None)
+        if method is not None:
+            gauge.set(method())
+
+
+def snapshot():
+    """Semua metrik proses ini dalam bentuk dict yang bisa di-serialisasi ke JSON."""
+    for collect in _collectors:
+        collect()
+    with _lock:
+        return {name: metric.snapshot() for name, metric in _metrics.items()}
+
+
+def write_snapshot(folder):
+    """Tulis snapshot proses ini ke <folder>/<pid>.json secara atomik (rename)."""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def aggregate(folder, dead_worker_ttl=None):
+    """
+    Gabungkan snapshot semua worker di `folder`. Counter dan histogram dijumlahkan, gauge hanya dari
+    worker yang masih hidup. Snapshot worker yang sudah berhenti masih dijumlahkan sampai berumur
+    `dead_worker_ttl` detik (agar request terakhirnya sempat terbaca), lalu dihapus; Prometheus
+    memperlakukan turunnya counter sebagai reset.
+    """
+    merged = {}
+    now = time.time()
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(folder, name)
+        alive = pid_alive(int(name[:-5])) if name[:-5].isdigit() else False
+        try:
+            if not alive and dead_worker_ttl is not None and now - os.path.getmtime(path) > dead_worker_ttl:
+                os.remove(path)
+                continue
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric_name, metric in data.items():
+            if metric['kind'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(metric_name, dict(metric, samples={}))
+            for key, value in metric['samples']:
+                key = tuple(key)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target['samples'][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target['samples'][key] = current + value
+    return merged
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render_text(metrics):
+    """Format eksposisi teks Prometheus (versi 0.0.4)."""
+    lines = []
+    for name in sorted(metrics):
+        metric = metrics[name]
+        samples = metric['samples']
+        if isinstance(samples, list):
+            samples = {tuple(key): value for key, value in samples}
+        lines.append(f"# HELP {name} {metric['doc']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(samples.items()):
+            if metric['kind'] != 'histogram':
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            bounds = [repr(float(b)) for b in metric['buckets']] + ['+Inf']
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(metric['labels'], key, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(metric['labels'], key)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(metric['labels'], key)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def collect_text(app=None):
+    """Isi endpoint /metrics: gabungan semua worker jika METRICS_FOLDER diatur, selain itu proses ini saja."""
+    app = app or current_app
+    folder = app.config.get('METRICS_FOLDER')
+    if not folder:
+        return render_text(snapshot())
+    write_snapshot(folder)
+    return render_text(aggregate(folder, app.config.get('METRICS_DEAD_WORKER_TTL', 15 * 60)))
+
+
+def observe_stream(stream, histogram, **labels):
+    """Teruskan isi `stream` (mis. respons yang di-stream) lalu catat durasinya ke histogram beserta status."""
+    started = time.perf_counter()
+    status = 'failed'
+    try:
+        yield from stream
+        status = 'done'
+    finally:
+        histogram.observe(time.perf_counter() - started, status=status, **labels)
+
+
+def init_metrics(app):
+    """Catat latensi dan jumlah request per endpoint, serta statistik pool koneksi database."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    with app.app_context():
+        pool = db.engine.pool
+
+    @event.listens_for(pool, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+
+    _collectors.append(lambda: _update_pool_gauges(pool))
+
+    folder = app.config.get('METRICS_FOLDER')
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    last_flush = [0.0]
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'none'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUEST_COUNT.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        # Setiap worker menyalin metriknya ke folder bersama paling sering tiap `interval` detik
+        if folder and time.monotonic() - last_flush[0] >= interval:
+            last_flush[0] = time.monotonic()
+            try:
+                write_snapshot(folder)
+            except OSError:
+                app.logger.exception('Gagal menulis snapshot metrik')
+        return response
+
+    if folder:
+        atexit.register(write_snapshot, folder)
@@ -1,7 +1,12 @@
 from my_app.extensions import db
 from flask_login import UserMixin
+from collections import defaultdict, Counter
+from sqlalchemy import event, update, insert, delete, select, func, bindparam, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import attributes, Session
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+from my_app.utils import normalize_name, name_grams
 
 class School(db.Model):
     __tablename__ = 'schools'
@@ -47,6 +52,8 @@ class Classroom(db.Model):
     school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False)
     students = db.relationship('Student', backref='classroom', lazy=True)
 
+    __table_args__ = (db.Index('ix_classrooms_school_name', 'school_id', 'name'),)
+
 class Student(db.Model):
     __tablename__ = 'students'
     
@@ -56,11 +63,58 @@ class Student(db.Model):
     
     classroom_id = db.Column(db.Integer, db.ForeignKey('classrooms.id'), index=True)
     rombel = db.Column(db.String(50)) 
-    poin = db.Column(db.Integer, default=100)
+    # Total poin pelanggaran aktif (belum diremisi), dijaga oleh event session di bawah
+    poin = db.Column(db.Integer, default=0, nullable=False)
     
     school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False, index=True)
+    # Nama yang sudah dinormalisasi (huruf kecil, tanpa aksen) untuk pencarian, diisi otomatis dari `name`
+    name_search = db.Column(db.String(100), nullable=True)
     violations = db.relationship('Violation', backref='student', lazy=True)
 
+    # name_search per sekolah: pencarian awalan nama (autocomplete) lewat rentang indeks
+    __table_args__ = (
+        db.Index('ix_students_school_nis', 'school_id', 'nis'),
+        db.Index('ix_students_school_name_search', 'school_id', 'name_search'),
+    )
+
+    @staticmethod
+    def adjust_points(connection, deltas):
+        """Tambahkan selisih poin aktif {student_id: delta} dalam satu executemany."""
+        params = [{'sid': sid, 'delta': delta} for sid, delta in deltas.items() if delta]
+        if params:
+            connection.execute(
+                update(Student.__table__).where(Student.__table__.c.id == bindparam('sid'))
+                .values(poin=Student.__table__.c.poin + bindparam('delta')),
+                params
+            )
+
+class StudentNameGram(db.Model):
+    """
+    Indeks pencarian nama siswa: potongan 3 huruf (lihat utils.name_grams) per siswa.
+    Bekerja sama di MySQL maupun SQLite, tanpa LIKE '%...%' atas seluruh tabel siswa.
+    """
+    __tablename__ = 'student_name_grams'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True)
+    gram = db.Column(db.String(3), primary_key=True)
+    school_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index('ix_student_name_grams_school_gram', 'school_id', 'gram', 'student_id'),)
+
+    @classmethod
+    def index(cls, connection, students):
+        """Tulis ulang gram untuk daftar (student_id, school_id, name_search)."""
+        students = list(students)
+        if not students:
+            return
+        ids = [sid for sid, _, _ in students]
+        for start in range(0, len(ids), 1000):
+            connection.execute(delete(cls).where(cls.student_id.in_(ids[start:start + 1000])))
+        rows = [{'student_id': sid, 'school_id': school_id, 'gram': gram}
+                for sid, school_id, name_search in students for gram in name_grams(name_search or '')]
+        for start in range(0, len(rows), 1000):
+            connection.execute(insert(cls), rows[start:start + 1000])
+
 class ViolationRule(db.Model):
     __tablename__ = 'violation_rules'
     id = db.Column(db.Integer, primary_key=True)
@@ -84,6 +138,8 @@ class Violation(db.Model):
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
+    # Salinan Student.school_id agar filter tenant tidak perlu join ke students (diisi otomatis saat flush)
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False)
 
     pasal = db.Column(db.String(255), nullable=True)
     kategori_pelanggaran = db.Column(db.String(50), nullable=True, index=True)
@@ -96,6 +152,16 @@ class Violation(db.Model):
     remission_reason = db.Column(db.String(255), nullable=True) # Alasan Remisi
     remission_date = db.Column(db.DateTime, nullable=True) # Kapan diremisi
 
+    # Kunci idempotensi dari klien (API batch); pengiriman ulang dengan kunci sama tidak membuat data ganda
+    client_key = db.Column(db.String(64), nullable=True)
+
+    # Filter tenant + urutan feed (date_posted DESC, id DESC) untuk keyset pagination, dan filter kategori
+    __table_args__ = (
+        db.Index('ix_violations_school_date', 'school_id', 'date_posted', 'id'),
+        db.Index('ix_violations_school_category', 'school_id', 'kategori_pelanggaran'),
+        db.Index('ix_violations_school_client_key', 'school_id', 'client_key', unique=True),
+    )
+
     @property
     def tanggal_kejadian(self):
         if self.date_posted:
@@ -112,5 +178,399 @@ class ViolationPhoto(db.Model):
     __tablename__ = 'violation_photos'
     
     id = db.Column(db.Integer, primary_key=True)
+    # Path relatif terhadap folder uploads. Untuk foto yang disimpan per-hash isinya blobs/ab/cd/<hash>.jpg
     filename = db.Column(db.String(255), nullable=False)
-    violation_id = db.Column(db.Integer, db.ForeignKey('violations.id'), nullable=False)
\ No newline at end of file
+    violation_id = db.Column(db.Integer, db.ForeignKey('violations.id'), nullable=False)
+    blob_hash = db.Column(db.String(64), db.ForeignKey('photo_blobs.hash'), nullable=True, index=True)
+    # pending: file mentah menunggu dikompres worker, ready: siap ditampilkan, failed: gagal dikompres
+    status = db.Column(db.String(20), default='ready', nullable=False)
+    # Nama file mentah dari token upload API batch; unik agar satu token hanya bisa dipakai sekali
+    raw_filename = db.Column(db.String(255), nullable=True)
+
+    # Turunan ukuran gambar (thumbnail & medium). Foto lama tanpa turunan memakai file full.
+    width = db.Column(db.Integer, nullable=True)
+    thumb_filename = db.Column(db.String(255), nullable=True)
+    thumb_width = db.Column(db.Integer, nullable=True)
+    medium_filename = db.Column(db.String(255), nullable=True)
+    medium_width = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (db.Index('ix_violation_photos_raw_filename', 'raw_filename', unique=True),)
+
+    def variant(self, size='full'):
+        """Nama file untuk ukuran tertentu (thumb / medium / full), fallback ke file full."""
+        if size == 'thumb' and self.thumb_filename:
+            return self.thumb_filename
+        if size in ('thumb', 'medium') and self.medium_filename:
+            return self.medium_filename
+        return self.filename
+
+    @property
+    def srcset_items(self):
+        """Pasangan (nama_file, lebar) untuk atribut srcset."""
+        items = [(self.thumb_filename, self.thumb_width), (self.medium_filename, self.medium_width), (self.filename, self.width)]
+        return [(name, width) for name, width in items if name and width]
+
+class PhotoBlob(db.Model):
+    """
+    Isi file foto yang disimpan sekali berdasarkan hash SHA-256 dari file full-nya.
+    Beberapa ViolationPhoto boleh menunjuk blob yang sama; refcount dijaga oleh event di bawah.
+    """
+    __tablename__ = 'photo_blobs'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Metadata turunan, disalin ke ViolationPhoto saat blob dipakai ulang
+    width = db.Column(db.Integer, nullable=True)
+    thumb_filename = db.Column(db.String(255), nullable=True)
+    thumb_width = db.Column(db.Integer, nullable=True)
+    medium_filename = db.Column(db.String(255), nullable=True)
+    medium_width = db.Column(db.Integer, nullable=True)
+
+    @staticmethod
+    def path_for(hash_hex, suffix='', ext='jpg'):
+        """Layout direktori ber-shard: blobs/ab/cd/<hash><suffix>.<ext>"""
+        return f"blobs/{hash_hex[:2]}/{hash_hex[2:4]}/{hash_hex}{suffix}.{ext}"
+
+    @property
+    def filename(self):
+        return self.path_for(self.hash)
+
+    def apply_to(self, photo):
+        """Arahkan ViolationPhoto ke blob ini (file full dan turunannya)."""
+        photo.blob_hash = self.hash
+        photo.filename = self.filename
+        photo.width = self.width
+        photo.thumb_filename = self.thumb_filename
+        photo.thumb_width = self.thumb_width
+        photo.medium_filename = self.medium_filename
+        photo.medium_width = self.medium_width
+
+class SchoolStats(db.Model):
+    """
+    Penghitung jumlah siswa, pelanggaran, dan kelas per sekolah untuk dashboard.
+    Dijaga oleh event session di bawah; `flask reconcile-stats` menghitung ulang dari tabel aslinya.
+    """
+    __tablename__ = 'school_stats'
+
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), primary_key=True)
+    students = db.Column(db.Integer, default=0, nullable=False)
+    violations = db.Column(db.Integer, default=0, nullable=False)
+    classrooms = db.Column(db.Integer, default=0, nullable=False)
+
+    COUNTERS = ('students', 'violations', 'classrooms')
+
+    @staticmethod
+    def count(connection, school_id):
+        """Hitung ulang ketiga penghitung untuk satu sekolah langsung dari tabelnya."""
+        return {
+            'students': connection.scalar(select(func.count(Student.id)).where(Student.school_id == school_id)),
+            'violations': connection.scalar(select(func.count(Violation.id)).where(Violation.school_id == school_id)),
+            'classrooms': connection.scalar(select(func.count(Classroom.id)).where(Classroom.school_id == school_id)),
+        }
+
+    @classmethod
+    def adjust(cls, connection, school_id, **deltas):
+        """Tambah/kurangi penghitung. Jika barisnya belum ada, baris dibuat dari hitungan aktual."""
+        deltas = {k: v for k, v in deltas.items() if v}
+        if not deltas:
+            return
+        values = {k: getattr(cls, k) + v for k, v in deltas.items()}
+        result = connection.execute(update(cls).where(cls.school_id == school_id).values(**values))
+        if result.rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(cls).values(school_id=school_id, **cls.count(connection, school_id)))
+        except IntegrityError:
+            # Baris dibuat bersamaan oleh transaksi lain; cukup tambahkan selisihnya
+            connection.execute(update(cls).where(cls.school_id == school_id).values(**values))
+
+    @classmethod
+    def for_school(cls, school_id):
+        """Penghitung satu sekolah (dibuat dari hitungan aktual jika belum ada)."""
+        stats = db.session.get(cls, school_id)
+        if stats is None:
+            stats = cls(school_id=school_id, **cls.count(db.session.connection(), school_id))
+            db.session.add(stats)
+            db.session.commit()
+        return stats
+
+class ViolationDailyRollup(db.Model):
+    """
+    Rekap harian pelanggaran per (sekolah, tanggal, kategori) untuk halaman statistik.
+    Dijaga oleh event session di bawah; `flask rebuild-rollup` membangun ulang dari tabel violations.
+    Kategori kosong disimpan sebagai '' karena menjadi bagian primary key.
+    """
+    __tablename__ = 'violation_daily_rollup'
+
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, default=0, nullable=False)
+    points = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def key(school_id, date_posted, category):
+        return school_id, date_posted.date(), category or ''
+
+    @classmethod
+    def count_actual(cls, connection, school_id, day, category):
+        """Hitung satu baris rekap langsung dari tabel violations."""
+        start = datetime.combine(day, datetime.min.time())
+        query = select(func.count(Violation.id), func.coalesce(func.sum(Violation.points), 0)).where(
+            Violation.school_id == school_id, Violation.date_posted >= start, Violation.date_posted < start + timedelta(days=1)
+        )
+        if category:
+            query = query.where(Violation.kategori_pelanggaran == category)
+        else:
+            query = query.where(or_(Violation.kategori_pelanggaran.is_(None), Violation.kategori_pelanggaran == ''))
+        return connection.execute(query).one()
+
+    @classmethod
+    def apply(cls, connection, deltas):
+        """
+        Terapkan selisih {(school_id, day, category): [count, points]}.
+        Baris yang belum ada dibuat dari hitungan aktual sehingga data lama tetap benar.
+        """
+        for (school_id, day, category), (count, points) in deltas.items():
+            if not count and not points:
+                continue
+            where = (cls.school_id == school_id, cls.day == day, cls.category == category)
+            values = {'count': cls.count + count, 'points': cls.points + points}
+            if connection.execute(update(cls).where(*where).values(**values)).rowcount:
+                continue
+            actual_count, actual_points = cls.count_actual(connection, school_id, day, category)
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(cls).values(school_id=school_id, day=day, category=category,
+                                                          count=actual_count, points=actual_points))
+            except IntegrityError:
+                connection.execute(update(cls).where(*where).values(**values))
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # backup / restore / class_report
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued / running / done / failed
+    progress = db.Column(db.Integer, default=0, nullable=False)  # 0 - 100
+    message = db.Column(db.String(255), nullable=True)
+
+    # Artefak hasil job (file di JOB_FOLDER) yang bisa diunduh setelah selesai
+    artifact = db.Column(db.String(255), nullable=True)
+    download_name = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+
+    school_id = db.Column(db.Integer, db.ForeignKey('schools.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # Proses yang menjalankan job (host:pid:token), untuk mengenali job yatim setelah restart
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+class CacheVersion(db.Model):
+    """
+    Versi cache per namespace dan id (mis. 'ref:v:3'), dipakai semua worker jika STATS_CACHE_URL (Redis)
+    tidak diisi. Invalidasi menaikkan versi di sini, jadi entri LRU lokal di worker lain ikut usang.
+    """
+    __tablename__ = 'cache_versions'
+
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+
+    @classmethod
+    def bump(cls, connection, key):
+        """Naikkan versi satu kunci; barisnya dibuat jika belum ada."""
+        result = connection.execute(update(cls).where(cls.key == key).values(version=cls.version + 1))
+        if result.rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(cls).values(key=key, version=1))
+        except IntegrityError:
+            # Baris dibuat bersamaan oleh transaksi lain
+            connection.execute(update(cls).where(cls.key == key).values(version=cls.version + 1))
+
+
+# --- REFCOUNT BLOB FOTO ---
+# Dijalankan di dalam flush ORM. Insert massal lewat Core (restore) menyesuaikan refcount sendiri.
+
+def _adjust_blob_refcount(connection, blob_hash, delta):
+    if blob_hash:
+        connection.execute(update(PhotoBlob).where(PhotoBlob.hash == blob_hash).values(refcount=PhotoBlob.refcount + delta))
+
+@event.listens_for(ViolationPhoto, 'after_insert')
+def _photo_inserted(mapper, connection, target):
+    _adjust_blob_refcount(connection, target.blob_hash, 1)
+
+@event.listens_for(ViolationPhoto, 'after_update')
+def _photo_updated(mapper, connection, target):
+    history = attributes.get_history(target, 'blob_hash')
+    for old_hash in history.deleted or ():
+        _adjust_blob_refcount(connection, old_hash, -1)
+    for new_hash in history.added or ():
+        _adjust_blob_refcount(connection, new_hash, 1)
+
+@event.listens_for(ViolationPhoto, 'after_delete')
+def _photo_deleted(mapper, connection, target):
+    _adjust_blob_refcount(connection, target.blob_hash, -1)
+
+
+# --- PENGHITUNG DASHBOARD PER SEKOLAH ---
+# Selisih dikumpulkan per flush sehingga impor banyak siswa cukup satu UPDATE per sekolah.
+# Insert massal lewat Core (restore) memanggil SchoolStats.adjust sendiri.
+
+_STAT_COUNTERS = {Student: 'students', Violation: 'violations', Classroom: 'classrooms'}
+
+def _student_schools(session, student_ids):
+    """Peta student_id -> school_id; siswa yang sudah ada di session tidak di-query ulang."""
+    schools = {}
+    for sid in student_ids:
+        student = session.identity_map.get(session.identity_key(Student, sid)) if sid else None
+        if student is not None and 'school_id' in student.__dict__:
+            schools[sid] = student.school_id
+    missing = {sid for sid in student_ids if sid} - set(schools)
+    if missing:
+        schools.update(session.connection().execute(select(Student.id, Student.school_id).where(Student.id.in_(missing))).all())
+    return schools
+
+@event.listens_for(Session, 'before_flush')
+def _fill_violation_school(session, flush_context, instances):
+    # Violation.school_id disalin dari siswanya jika pemanggil tidak mengisinya
+    pending = [obj for obj in session.new if isinstance(obj, Violation) and obj.school_id is None]
+    if not pending:
+        return
+    schools = _student_schools(session, {v.student_id for v in pending if v.student_id})
+    for v in pending:
+        if v.__dict__.get('student') is not None:
+            v.school_id = v.student.school_id
+        else:
+            v.school_id = schools.get(v.student_id)
+
+@event.listens_for(Session, 'after_flush')
+def _update_school_stats(session, flush_context):
+    deltas = defaultdict(Counter)
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            counter = _STAT_COUNTERS.get(type(obj))
+            if counter:
+                deltas[obj.school_id][counter] += sign
+    if not deltas:
+        return
+
+    connection = session.connection()
+    for school_id, counters in deltas.items():
+        SchoolStats.adjust(connection, school_id, **counters)
+
+
+# --- POIN AKTIF SISWA (Student.poin) ---
+# Kontribusi pelanggaran = points jika belum diremisi. Selisih lama -> baru dihitung dari history atribut
+# (masih tersedia di after_flush), jadi tambah, remisi, ubah poin, pindah siswa, dan hapus ikut tercatat.
+
+# Nilai lama atribut berikut dibutuhkan saat after_flush. Dengan active_history nilai lama dimuat
+# sebelum ditimpa, walaupun objeknya sudah di-expire (misalnya setelah commit).
+_TRACKED_VIOLATION_FIELDS = ('student_id', 'school_id', 'points', 'is_remitted', 'date_posted', 'kategori_pelanggaran')
+for _field in _TRACKED_VIOLATION_FIELDS:
+    event.listen(getattr(Violation, _field), 'set', lambda *args: None, active_history=True)
+
+def _violation_value(violation, key, committed):
+    """Nilai atribut sebelum flush (committed=True) atau sesudahnya."""
+    if not committed:
+        return getattr(violation, key)
+    history = attributes.get_history(violation, key)
+    if history.deleted:
+        return history.deleted[0]
+    return (history.unchanged or history.added or [None])[0]
+
+def _point_contribution(violation, committed):
+    if _violation_value(violation, 'is_remitted', committed):
+        return None, 0
+    return _violation_value(violation, 'student_id', committed), _violation_value(violation, 'points', committed) or 0
+
+@event.listens_for(Session, 'after_flush')
+def _update_student_points(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Violation):
+            student_id, points = _point_contribution(obj, committed=False)
+            deltas[student_id] += points
+    for obj in session.deleted:
+        if isinstance(obj, Violation):
+            student_id, points = _point_contribution(obj, committed=True)
+            deltas[student_id] -= points
+    for obj in session.dirty:
+        if isinstance(obj, Violation) and session.is_modified(obj, include_collections=False):
+            old_student, old_points = _point_contribution(obj, committed=True)
+            new_student, new_points = _point_contribution(obj, committed=False)
+            deltas[old_student] -= old_points
+            deltas[new_student] += new_points
+    deltas.pop(None, None)
+    Student.adjust_points(session.connection(), deltas)
+    session.info.setdefault('stale_points', set()).update(sid for sid, delta in deltas.items() if delta)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_student_points(session, flush_context):
+    # Objek Student yang sudah dimuat di session perlu membaca ulang poin yang baru di-UPDATE
+    for sid in session.info.pop('stale_points', ()):
+        student = session.identity_map.get(session.identity_key(Student, sid))
+        if student is not None:
+            session.expire(student, ['poin'])
+
+
+# --- REKAP HARIAN PELANGGARAN (violation_daily_rollup) ---
+
+_ROLLUP_FIELDS = ('school_id', 'date_posted', 'kategori_pelanggaran', 'points')
+
+def _rollup_contribution(violation, committed):
+    school_id, date_posted, category, points = (_violation_value(violation, key, committed) for key in _ROLLUP_FIELDS)
+    return school_id, date_posted, category, points or 0
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_rollup(session, flush_context):
+    changes = []  # (sign, school_id, date_posted, category, points)
+    for obj in session.new:
+        if isinstance(obj, Violation):
+            changes.append((1,) + _rollup_contribution(obj, committed=False))
+    for obj in session.deleted:
+        if isinstance(obj, Violation):
+            changes.append((-1,) + _rollup_contribution(obj, committed=True))
+    for obj in session.dirty:
+        if isinstance(obj, Violation) and any(attributes.get_history(obj, key).has_changes() for key in _ROLLUP_FIELDS):
+            changes.append((-1,) + _rollup_contribution(obj, committed=True))
+            changes.append((1,) + _rollup_contribution(obj, committed=False))
+    if not changes:
+        return
+
+    deltas = defaultdict(lambda: [0, 0])
+    for sign, school_id, date_posted, category, points in changes:
+        if school_id and date_posted:
+            delta = deltas[ViolationDailyRollup.key(school_id, date_posted, category)]
+            delta[0] += sign
+            delta[1] += sign * points
+    ViolationDailyRollup.apply(session.connection(), deltas)
+
+
+# --- INDEKS PENCARIAN NAMA SISWA ---
+# Insert massal lewat Core (restore) mengisi name_search sendiri dan memanggil StudentNameGram.index.
+
+@event.listens_for(Student.name, 'set')
+def _student_name_set(target, value, oldvalue, initiator):
+    target.name_search = normalize_name(value)
+
+@event.listens_for(Session, 'after_flush')
+def _update_name_index(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, Student)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Student) and attributes.get_history(obj, 'name_search').has_changes()]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Student)]
+    connection = session.connection() if changed or removed else None
+    if removed:
+        connection.execute(delete(StudentNameGram).where(StudentNameGram.student_id.in_(removed)))
+    if changed:
+        StudentNameGram.index(connection, [(obj.id, obj.school_id, obj.name_search) for obj in changed])
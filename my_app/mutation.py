@@ -0,0 +1,63 @@
+from sqlalchemy import update, case
+
+from my_app.extensions import db
+from my_app.models import Student, Classroom
+
+
+def _school_class_ids(school_id, class_ids):
+    """Id kelas dari `class_ids` yang benar-benar milik sekolah ini."""
+    if not class_ids:
+        return set()
+    return {cid for cid, in db.session.query(Classroom.id).filter(
+        Classroom.school_id == school_id, Classroom.id.in_(class_ids)
+    )}
+
+
+def _parse_ids(values):
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def transfer_students(school_id, student_ids, target_class_id):
+    """
+    Pindahkan siswa terpilih ke kelas lain dengan satu UPDATE ... WHERE id IN (...).
+    Siswa milik sekolah lain tidak ikut terubah karena filter school_id. Mengembalikan jumlah baris
+    yang diperbarui, atau None jika kelas tujuan bukan milik sekolah ini. Tidak melakukan commit.
+    """
+    ids = _parse_ids(student_ids)
+    if not _school_class_ids(school_id, [target_class_id]):
+        return None
+    if not ids:
+        return 0
+    result = db.session.execute(
+        update(Student).where(Student.school_id == school_id, Student.id.in_(ids)).values(classroom_id=target_class_id),
+        execution_options={'synchronize_session': False},
+    )
+    return result.rowcount
+
+
+def promote_classes(school_id, mapping):
+    """
+    Kenaikan kelas: `mapping` berisi {id_kelas_asal: id_kelas_tujuan atau None (lulus, tanpa kelas)}.
+    Semua siswa sekolah dipindah dengan satu UPDATE memakai CASE pada kelas lama, sehingga rantai
+    seperti X -> XI dan XI -> XII tidak saling menimpa. Mengembalikan jumlah siswa yang dipindah.
+    Melempar ValueError jika ada kelas yang bukan milik sekolah ini. Tidak melakukan commit.
+    """
+    mapping = {source: target for source, target in mapping.items() if source != target}
+    if not mapping:
+        return 0
+    referenced = set(mapping) | {target for target in mapping.values() if target is not None}
+    if _school_class_ids(school_id, referenced) != referenced:
+        raise ValueError('Pemetaan kelas memuat kelas yang tidak valid.')
+    result = db.session.execute(
+        update(Student).where(Student.school_id == school_id, Student.classroom_id.in_(mapping)).values(
+            classroom_id=case(mapping, value=Student.classroom_id)
+        ),
+        execution_options={'synchronize_session': False},
+    )
+    return result.rowcount
@@ -0,0 +1,82 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(date_posted, row_id, direction):
+    """Token opak berisi posisi (date_posted, id) dan arah halaman ('next' / 'prev')."""
+    raw = json.dumps([date_posted.isoformat(), row_id, direction], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Kebalikan encode_cursor. Token rusak dianggap tidak ada (kembali ke halaman pertama)."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        date_str, row_id, direction = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            return None
+        return datetime.fromisoformat(date_str), int(row_id), direction
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+class KeysetPage:
+    """Satu halaman hasil keyset pagination. Tidak ada COUNT; total diisi dari penghitung jika tersedia."""
+
+    def __init__(self, items, has_prev, has_next, total=None):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.total = total
+
+    @property
+    def prev_cursor(self):
+        if self.has_prev and self.items:
+            return encode_cursor(self.items[0].date_posted, self.items[0].id, 'prev')
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.items:
+            return encode_cursor(self.items[-1].date_posted, self.items[-1].id, 'next')
+
+
+def keyset_filter(date_col, id_col, date_value, row_id, direction='next'):
+    """
+    Predikat posisi (date_col, id_col) sebelum ('next') atau sesudah ('prev') baris kursor.
+    Ditulis sebagai rentang date_col ditambah OR di dalamnya, sehingga planner tetap memakai indeks
+    (school_id, date_posted, id) secara berurutan; bentuk OR di tingkat atas membuat SQLite memecahnya
+    menjadi beberapa pencarian indeks lalu mengurutkan ulang hasilnya.
+    """
+    if direction == 'next':
+        return and_(date_col <= date_value, or_(date_col < date_value, id_col < row_id))
+    return and_(date_col >= date_value, or_(date_col > date_value, id_col > row_id))
+
+
+def keyset_paginate(query, date_col, id_col, cursor=None, per_page=10, total=None):
+    """
+    Paginasi berurutan (date_posted DESC, id DESC) memakai posisi baris terakhir, bukan OFFSET,
+    sehingga biaya setiap halaman sama di kedalaman berapa pun (didukung indeks (date_posted, id)).
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        rows = query.order_by(date_col.desc(), id_col.desc()).limit(per_page + 1).all()
+        return KeysetPage(rows[:per_page], has_prev=False, has_next=len(rows) > per_page, total=total)
+
+    date_value, row_id, direction = position
+    if direction == 'next':
+        rows = query.filter(keyset_filter(date_col, id_col, date_value, row_id, 'next')).order_by(
+            date_col.desc(), id_col.desc()
+        ).limit(per_page + 1).all()
+        return KeysetPage(rows[:per_page], has_prev=True, has_next=len(rows) > per_page, total=total)
+
+    rows = query.filter(keyset_filter(date_col, id_col, date_value, row_id, 'prev')).order_by(
+        date_col.asc(), id_col.asc()
+    ).limit(per_page + 1).all()
+    items = list(reversed(rows[:per_page]))
+    return KeysetPage(items, has_prev=len(rows) > per_page, has_next=True, total=total)
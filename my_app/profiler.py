@@ -0,0 +1,192 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Penghitung aktif dari count_queries() per thread
+_local = threading.local()
+
+
+class QueryProfile:
+    """Catatan SQL dan waktu untuk satu request (atau satu blok count_queries)."""
+
+    def __init__(self):
+        self.statements = []  # (detik, sql)
+        self.render_seconds = 0.0
+        self.started = time.perf_counter()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for seconds, _ in self.statements)
+
+    def slowest(self, n=3):
+        return sorted(self.statements, key=lambda item: item[0], reverse=True)[:n]
+
+
+def _active_profiles():
+    profiles = list(getattr(_local, 'counters', ()))
+    if has_request_context() and getattr(g, '_query_profile', None) is not None:
+        profiles.append(g._query_profile)
+    return profiles
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Ditandai dengan execution context (atau cursor jika tidak ada) agar handle_error bisa mencocokkannya
+    owner = id(context if context is not None else cursor)
+    conn.info.setdefault('query_start', []).append((owner, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()[1]
+    for profile in _active_profiles():
+        profile.statements.append((elapsed, statement))
+
+
+def _handle_error(exception_context):
+    # Statement yang gagal tidak memicu after_cursor_execute; buang waktu mulainya agar tumpukan di
+    # koneksi pool tidak terus bertambah dan statement berikutnya tidak dipasangkan dengan waktu yang salah
+    conn = exception_context.connection
+    starts = conn.info.get('query_start') if conn is not None else None
+    owner = exception_context.execution_context
+    if owner is None:
+        owner = getattr(exception_context, 'cursor', None)
+    if starts and owner is not None and starts[-1][0] == id(owner):
+        starts.pop()
+
+
+# Listener engine hanya terpasang selama ada pemakainya (profiler aktif atau blok count_queries),
+# sehingga tanpa profiler tidak ada biaya tambahan per statement
+_ENGINE_LISTENERS = (
+    ('before_cursor_execute', _before_cursor_execute),
+    ('after_cursor_execute', _after_cursor_execute),
+    ('handle_error', _handle_error),
+)
+_listeners_lock = threading.Lock()
+_listener_users = 0
+
+
+def _acquire_listeners():
+    global _listener_users
+    with _listeners_lock:
+        _listener_users += 1
+        if _listener_users == 1:
+            for name, fn in _ENGINE_LISTENERS:
+                event.listen(Engine, name, fn)
+
+
+def _release_listeners():
+    global _listener_users
+    with _listeners_lock:
+        _listener_users -= 1
+        if _listener_users == 0:
+            for name, fn in _ENGINE_LISTENERS:
+                event.remove(Engine, name, fn)
+
+
+def query_budget(max_queries):
+    """Deklarasikan batas jumlah query untuk sebuah route (dicek oleh profiler dan check_query_budget)."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def _endpoint_budget(app, endpoint):
+    view = app.view_functions.get(endpoint)
+    return getattr(view, 'query_budget', None)
+
+
+def init_profiler(app):
+    """
+    Pasang profiler per request jika PROFILER_ENABLED aktif: jumlah query, waktu DB, waktu render,
+    dan statement paling lambat dikirim sebagai header X-Query-* dan/atau baris log.
+    """
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+    _acquire_listeners()
+
+    @app.before_request
+    def _start_profile():
+        g._query_profile = QueryProfile()
+
+    def _render_started(sender, template, context, **extra):
+        if getattr(g, '_query_profile', None) is not None:
+            g._render_started = time.perf_counter()
+
+    def _render_finished(sender, template, context, **extra):
+        started = getattr(g, '_render_started', None)
+        if started is not None:
+            g._query_profile.render_seconds += time.perf_counter() - started
+            g._render_started = None
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_query_profile', None)
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        budget = _endpoint_budget(app, request.endpoint)
+        if app.config.get('PROFILER_HEADERS', True):
+            response.headers['X-Query-Count'] = str(profile.count)
+            response.headers['X-DB-Time-ms'] = f"{profile.db_seconds * 1000:.1f}"
+            response.headers['X-Render-Time-ms'] = f"{profile.render_seconds * 1000:.1f}"
+            response.headers['X-Request-Time-ms'] = f"{total_ms:.1f}"
+            if budget is not None:
+                response.headers['X-Query-Budget'] = str(budget)
+        if app.config.get('PROFILER_LOG', True):
+            slowest = '; '.join(f"{seconds * 1000:.1f}ms {' '.join(sql.split())[:120]}"
+                                for seconds, sql in profile.slowest(app.config.get('PROFILER_SLOW_COUNT', 3)))
+            app.logger.info('[profil] %s %s: %d query, db %.1fms, render %.1fms, total %.1fms | %s',
+                            request.method, request.endpoint, profile.count, profile.db_seconds * 1000,
+                            profile.render_seconds * 1000, total_ms, slowest)
+        if budget is not None and profile.count > budget:
+            app.logger.warning('Endpoint %s memakai %d query, melebihi batas %d', request.endpoint, profile.count, budget)
+        return response
+
+
+@contextmanager
+def count_queries():
+    """Hitung semua query di thread ini selama blok berjalan. Tidak butuh PROFILER_ENABLED."""
+    profile = QueryProfile()
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(profile)
+    _acquire_listeners()
+    try:
+        yield profile
+    finally:
+        _release_listeners()
+        counters.remove(profile)
+
+
+def check_query_budget(client, url, method='get', budget=None, **kwargs):
+    """
+    Helper pytest: jalankan request lalu gagalkan test jika jumlah query melebihi batas
+    yang dideklarasikan lewat @query_budget pada route (atau argumen `budget`).
+    """
+    with count_queries() as profile:
+        response = getattr(client, method)(url, **kwargs)
+    app = client.application
+    if budget is None:
+        with app.test_request_context(url, method=method.upper()):
+            endpoint = request.url_rule.endpoint if request.url_rule else None
+        budget = _endpoint_budget(app, endpoint)
+        assert budget is not None, f"Route {url} belum mendeklarasikan @query_budget"
+    if profile.count > budget:
+        statements = '\n'.join(f"  {' '.join(sql.split())[:200]}" for _, sql in profile.statements)
+        raise AssertionError(f"{method.upper()} {url} menjalankan {profile.count} query (batas {budget}):\n{statements}")
+    return response
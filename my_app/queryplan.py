@@ -0,0 +1,255 @@
+import re
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select
+
+from my_app.extensions import db
+from my_app.models import School, Classroom, Student, Violation, ViolationCategory
+from my_app.search import student_search_ids
+from my_app.remission import remission_conditions
+from my_app.pagination import decode_cursor, encode_cursor, keyset_filter
+from my_app.routes import (violation_feed_query, category_stats_query, top_students_query, daily_stats_query,
+                           roster_query)
+
+# Nama query -> (pembuat statement, jenis masalah yang memang diterima untuk query itu)
+HOT_QUERIES = {}
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+def hot_query(name, allow=()):
+    """
+    Daftarkan query panas. `allow` berisi masalah yang memang tidak terhindarkan untuk query itu:
+    'scan:<tabel>' (full table scan), 'temp_group' (GROUP BY / DISTINCT lewat tabel sementara),
+    atau 'temp_sort' (ORDER BY lewat sort sementara / filesort).
+    """
+    def decorator(build):
+        HOT_QUERIES[name] = (build, set(allow))
+        return build
+    return decorator
+
+
+def _statement(query):
+    return query.statement if hasattr(query, 'statement') else query
+
+
+def _feed_page(query, sample):
+    # Sama dengan keyset_paginate: urutan (date_posted, id) dan posisi kursor halaman berikutnya
+    date_value, row_id, direction = decode_cursor(sample['cursor'])
+    return query.filter(keyset_filter(Violation.date_posted, Violation.id, date_value, row_id, direction)).order_by(Violation.date_posted.desc(), Violation.id.desc()).limit(11)
+
+
+@hot_query('feed_first_page')
+def _feed_first_page(sample):
+    return violation_feed_query(sample['school_id']).order_by(Violation.date_posted.desc(), Violation.id.desc()).limit(11)
+
+
+@hot_query('feed_next_page')
+def _feed_next_page(sample):
+    return _feed_page(violation_feed_query(sample['school_id']), sample)
+
+
+@hot_query('feed_category')
+def _feed_category(sample):
+    return _feed_page(violation_feed_query(sample['school_id'], category=sample['category']), sample)
+
+
+@hot_query('feed_month')
+def _feed_month(sample):
+    return _feed_page(violation_feed_query(sample['school_id'], date_range='month'), sample)
+
+
+@hot_query('feed_search', allow=('temp_group',))
+def _feed_search(sample):
+    return _feed_page(violation_feed_query(sample['school_id'], search=sample['search']), sample)
+
+
+@hot_query('student_search', allow=('temp_group',))
+def _student_search(sample):
+    # GROUP BY student_id pada gram memakai tabel sementara; jumlah baris kandidatnya kecil
+    return student_search_ids(sample['school_id'], sample['search'])
+
+
+@hot_query('student_autocomplete')
+def _student_autocomplete(sample):
+    return roster_query(sample['school_id'], sample['search'][:3]).limit(20)
+
+
+@hot_query('class_by_name')
+def _class_by_name(sample):
+    # /api/students/<class_name>: kelas dicari lewat nama, lalu siswanya lewat relasi classroom.students
+    return select(Classroom.id).where(Classroom.school_id == sample['school_id'], Classroom.name == sample['class_name'])
+
+
+@hot_query('students_by_class')
+def _students_by_class(sample):
+    return select(Student).where(Student.classroom_id == sample['class_id'])
+
+
+@hot_query('stats_categories', allow=('temp_group',))
+def _stats_categories(sample):
+    # GROUP BY kategori di dalam satu sekolah; hanya sebanyak hari x kategori baris rekap
+    return category_stats_query(sample['school_id'])
+
+
+@hot_query('stats_trend')
+def _stats_trend(sample):
+    return daily_stats_query(sample['school_id'], (datetime.utcnow() - timedelta(days=180)).date())
+
+
+@hot_query('stats_top_today', allow=('temp_group', 'temp_sort'))
+def _stats_top_today(sample):
+    # Urut berdasarkan SUM(points) selalu butuh sort; yang dijaga adalah akses violations lewat indeks
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return top_students_query(sample['school_id'], today, today + timedelta(days=1))
+
+
+@hot_query('restore_students_by_nis')
+def _restore_students_by_nis(sample):
+    # restore_backup: id siswa baru diambil kembali lewat NIS
+    return select(Student.nis, Student.id).where(Student.school_id == sample['school_id'], Student.nis.in_(sample['nis']))
+
+
+@hot_query('restore_existing_violations')
+def _restore_existing_violations(sample):
+    # restore_backup: kunci pelanggaran yang sudah ada untuk deteksi duplikat
+    return select(Violation.student_id, Violation.date_posted, Violation.description).where(
+        Violation.school_id == sample['school_id']
+    )
+
+
+@hot_query('ingest_existing_keys')
+def _ingest_existing_keys(sample):
+    # ingest_violations_batch: kunci idempotensi yang sudah tersimpan
+    return select(Violation.client_key, Violation.id).where(
+        Violation.school_id == sample['school_id'], Violation.client_key.in_(['hp-1', 'hp-2'])
+    )
+
+
+@hot_query('bulk_remission')
+def _bulk_remission(sample):
+    # remit_violations_bulk: baris yang akan diremisi untuk satu kategori
+    return select(Violation.student_id, Violation.points).where(
+        *remission_conditions(sample['school_id'], category=sample['category'])
+    )
+
+
+def sample_parameters(school_id=None):
+    """Nilai contoh untuk parameter query, diambil dari sekolah dengan data terbanyak (atau `school_id`)."""
+    if school_id is None:
+        school_id = db.session.query(Violation.school_id).group_by(Violation.school_id).order_by(
+            db.func.count(Violation.id).desc()
+        ).limit(1).scalar() or db.session.query(School.id).order_by(School.id).limit(1).scalar()
+    if school_id is None:
+        raise click.ClickException('Belum ada data sekolah. Jalankan `flask seed` terlebih dahulu.')
+    middle = Violation.query.filter_by(school_id=school_id).order_by(Violation.date_posted.desc()).offset(10).first()
+    student = Student.query.filter_by(school_id=school_id).order_by(Student.id).first()
+    classroom = Classroom.query.filter_by(school_id=school_id).order_by(Classroom.id).first()
+    category = ViolationCategory.query.filter_by(school_id=school_id).order_by(ViolationCategory.id).first()
+    nis = [n for n, in db.session.query(Student.nis).filter_by(school_id=school_id).order_by(Student.id).limit(20)]
+    return {
+        'school_id': school_id,
+        'cursor': encode_cursor(middle.date_posted if middle else datetime.utcnow(), middle.id if middle else 0, 'next'),
+        'search': student.name.split()[0] if student else 'budi',
+        'class_name': classroom.name if classroom else 'X-1',
+        'class_id': classroom.id if classroom else 0,
+        'category': category.name if category else 'Ringan',
+        'nis': nis or ['0'],
+    }
+
+
+def _compile(statement, dialect):
+    """SQL dan parameter posisional (sudah diproses tipe kolomnya) untuk dijalankan dengan EXPLAIN."""
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    values = []
+    for key in compiled.positiontup:
+        bind = compiled.binds.get(key)
+        processor = bind.type.bind_processor(dialect) if bind is not None else None
+        values.append(processor(params[key]) if processor else params[key])
+    return str(compiled), tuple(values)
+
+
+def explain(statement):
+    """Jalankan EXPLAIN (MySQL) / EXPLAIN QUERY PLAN (SQLite). Mengembalikan (baris plan, daftar masalah)."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    sql, params = _compile(_statement(statement), dialect)
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).all()
+        plan = [row[3] for row in rows]
+        problems = set()
+        for detail in plan:
+            match = _SQLITE_SCAN.match(detail)
+            if match:
+                problems.add(f"scan:{match.group(1)}")
+            if detail.startswith('USE TEMP B-TREE FOR ORDER BY'):
+                problems.add('temp_sort')
+            elif detail.startswith('USE TEMP B-TREE'):
+                problems.add('temp_group')
+        return plan, problems
+
+    result = connection.exec_driver_sql(f"EXPLAIN {sql}", params)
+    columns = list(result.keys())
+    plan, problems = [], set()
+    for row in result.mappings():
+        plan.append(' '.join(f"{c}={row[c]}" for c in columns if row[c] is not None))
+        if row.get('type') == 'ALL' and row.get('table') and not str(row['table']).startswith('<'):
+            problems.add(f"scan:{row['table']}")
+        extra = row.get('Extra') or ''
+        if 'Using temporary' in extra:
+            problems.add('temp_group')
+        if 'Using filesort' in extra:
+            problems.add('temp_sort')
+    return plan, problems
+
+
+def analyze_tables():
+    """Perbarui statistik tabel agar planner memilih seperti di produksi."""
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('ANALYZE')
+    elif connection.dialect.name == 'mysql':
+        tables = ', '.join(table.name for table in db.metadata.sorted_tables)
+        connection.exec_driver_sql(f"ANALYZE TABLE {tables}").all()
+    db.session.commit()
+
+
+def check_plans(school_id=None, names=None, analyze=True):
+    """
+    Periksa plan semua query panas. Mengembalikan daftar (nama, plan, masalah_tidak_diizinkan);
+    query dengan daftar masalah kosong dianggap lolos.
+    """
+    if analyze:
+        analyze_tables()
+    sample = sample_parameters(school_id)
+    report = []
+    for name, (build, allow) in HOT_QUERIES.items():
+        if names and name not in names:
+            continue
+        plan, problems = explain(build(sample))
+        report.append((name, plan, sorted(problems - allow)))
+    return report
+
+
+@click.command('check-plans')
+@click.option('--school', 'school_id', type=int, default=None, help='Sekolah untuk nilai contoh parameter.')
+@click.option('--query', 'names', multiple=True, help='Hanya periksa query dengan nama ini (boleh berulang).')
+@click.option('--no-analyze', is_flag=True, help='Jangan jalankan ANALYZE sebelum EXPLAIN.')
+@click.option('--verbose', '-v', is_flag=True, help='Tampilkan plan lengkap untuk semua query.')
+@with_appcontext
+def check_plans_command(school_id, names, no_analyze, verbose):
+    """Pastikan query panas tetap memakai indeks (tanpa full scan / sort sementara)."""
+    report = check_plans(school_id, names, analyze=not no_analyze)
+    failed = 0
+    for name, plan, problems in report:
+        click.echo(f"{'GAGAL' if problems else 'OK':<5} {name}" + (f"  ({', '.join(problems)})" if problems else ''))
+        if problems or verbose:
+            for line in plan:
+                click.echo(f"        {line}")
+        failed += bool(problems)
+    click.echo(f"{len(report) - failed}/{len(report)} query lolos.")
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+from my_app.extensions import db
+from my_app.models import User, Classroom, ViolationRule, ViolationCategory
+from my_app.cache import cached_reference
+
+# Tuple biasa (bukan objek ORM) agar aman disimpan di cache dan dipakai lintas request
+ClassRef = namedtuple('ClassRef', 'id name')
+RuleRef = namedtuple('RuleRef', 'id code description')
+CategoryRef = namedtuple('CategoryRef', 'id name points')
+MemberRef = namedtuple('MemberRef', 'id username full_name role')
+
+
+def _load(school_id):
+    return {
+        'classes': [ClassRef(*row) for row in db.session.query(Classroom.id, Classroom.name).filter_by(
+            school_id=school_id).order_by(Classroom.name)],
+        'rules': [RuleRef(*row) for row in db.session.query(
+            ViolationRule.id, ViolationRule.code, ViolationRule.description).filter_by(school_id=school_id).order_by(ViolationRule.id)],
+        'categories': [CategoryRef(*row) for row in db.session.query(
+            ViolationCategory.id, ViolationCategory.name, ViolationCategory.points).filter_by(school_id=school_id).order_by(ViolationCategory.id)],
+        'members': [MemberRef(*row) for row in db.session.query(
+            User.id, User.username, User.full_name, User.role).filter_by(school_id=school_id).order_by(User.id)],
+    }
+
+
+def school_reference(school_id):
+    """
+    Kelas, pasal, kategori, dan anggota satu sekolah dari cache referensi (versi per sekolah).
+    Rute yang mengubah salah satunya wajib memanggil invalidate_reference(school_id).
+    """
+    return cached_reference(school_id, lambda: _load(school_id))
+
+
+def category_by_id(school_id, category_id):
+    """
+    Kategori milik sekolah ini berdasarkan id, atau None. Jika tidak ada di cache (mis. baru dibuat dan
+    cache belum membaca versi barunya), dicari langsung di database sebelum dianggap tidak ada.
+    """
+    if not category_id:
+        return None
+    category = next((c for c in school_reference(school_id)['categories'] if c.id == category_id), None)
+    if category is None:
+        row = db.session.query(ViolationCategory.id, ViolationCategory.name, ViolationCategory.points).filter_by(
+            id=category_id, school_id=school_id).first()
+        category = CategoryRef(*row) if row else None
+    return category
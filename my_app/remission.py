@@ -0,0 +1,63 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, or_
+
+from my_app.extensions import db
+from my_app.models import Student, Violation
+
+
+def remission_conditions(school_id, category=None, start=None, end=None, class_id=None, ids=None):
+    """
+    Kondisi WHERE untuk pelanggaran aktif (belum diremisi) satu sekolah yang cocok dengan filter.
+    `start` / `end` berupa date (keduanya inklusif). Melempar ValueError jika tidak ada filter sama sekali,
+    agar remisi massal tidak pernah mengenai seluruh data sekolah secara tidak sengaja.
+    """
+    if not (category or start or end or class_id or ids):
+        raise ValueError('Pilih minimal satu filter (kategori, tanggal, kelas, atau pelanggaran).')
+    conditions = [
+        Violation.school_id == school_id,
+        or_(Violation.is_remitted.is_(False), Violation.is_remitted.is_(None)),
+    ]
+    if category:
+        conditions.append(Violation.kategori_pelanggaran == category)
+    if start:
+        conditions.append(Violation.date_posted >= datetime.combine(start, datetime.min.time()))
+    if end:
+        conditions.append(Violation.date_posted < datetime.combine(end, datetime.min.time()) + timedelta(days=1))
+    if class_id:
+        conditions.append(Violation.student_id.in_(
+            select(Student.id).where(Student.school_id == school_id, Student.classroom_id == class_id)
+        ))
+    if ids:
+        conditions.append(Violation.id.in_(ids))
+    return conditions
+
+
+def bulk_remit(school_id, reason, remission_date=None, **filters):
+    """
+    Remisi massal dengan satu UPDATE berbasis himpunan. Poin aktif siswa disesuaikan dengan satu
+    executemany untuk semua siswa terdampak (event session tidak berjalan untuk UPDATE Core).
+    Rekap harian tidak berubah karena menghitung semua pelanggaran, termasuk yang diremisi.
+    Mengembalikan {'violations': jumlah, 'students': jumlah, 'points': total}. Tidak melakukan commit.
+    """
+    conditions = remission_conditions(school_id, **filters)
+    # Selisih dijumlahkan di Python: GROUP BY student_id membuat planner memilih scan indeks student_id
+    # daripada indeks (school_id, kategori/tanggal). FOR UPDATE (MySQL) mengunci baris yang dihitung agar
+    # remisi bersamaan tidak mengurangi poin dua kali.
+    deltas, count = defaultdict(int), 0
+    for student_id, points in db.session.execute(
+        select(Violation.student_id, Violation.points).where(*conditions).with_for_update()
+    ):
+        deltas[student_id] -= points or 0
+        count += 1
+    if not count:
+        return {'violations': 0, 'students': 0, 'points': 0}
+    db.session.execute(
+        update(Violation).where(*conditions).values(
+            is_remitted=True, remission_reason=reason, remission_date=remission_date or datetime.utcnow()
+        ),
+        execution_options={'synchronize_session': False},
+    )
+    Student.adjust_points(db.session.connection(), deltas)
+    return {'violations': count, 'students': len(deltas), 'points': -sum(deltas.values())}
@@ -1,19 +1,31 @@
 import os
+import hashlib
 import secrets
-import json
-import zipfile
-import io
 from datetime import datetime, timedelta
-from flask import render_template, url_for, flash, redirect, request, abort, Blueprint, jsonify, current_app, Response, send_file
-from sqlalchemy.orm import joinedload
+from flask import render_template, url_for, flash, redirect, request, abort, Blueprint, jsonify, current_app, Response, send_file, stream_with_context
+from sqlalchemy.orm import selectinload
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 from functools import wraps
 import time
 
 from my_app.extensions import db
-from my_app.models import User, Student, Violation, Classroom, School, ViolationRule, ViolationCategory, ViolationPhoto
-from my_app.utils import compress_image
+from my_app.models import User, Student, Violation, Classroom, School, ViolationRule, ViolationCategory, ViolationPhoto, Job, SchoolStats, ViolationDailyRollup
+from my_app.images import save_raw_upload, submit_photo, image_queue_stats
+from my_app.backup import iter_backup_zip, backup_filename
+from my_app.search import student_search_ids
+from my_app.utils import normalize_name
+from my_app.pagination import keyset_paginate
+from my_app.profiler import query_budget
+from my_app.metrics import collect_text, observe_stream, JOB_SECONDS
+from my_app.cache import (cached_statistics, invalidate_statistics, cached_roster, invalidate_roster,
+                          invalidate_reference, invalidate_user, invalidate_school, cache_stats)
+from my_app.reference import school_reference, category_by_id
+from my_app.mutation import transfer_students, promote_classes
+from my_app.remission import bulk_remit
+from my_app.ingest import store_upload, ingest_violations
+from my_app.jobs import enqueue, job_folder, job_progress, backup_task, restore_task, import_task, class_report_task
 from flask_login import login_user, current_user, logout_user, login_required
 
 main = Blueprint('main', __name__)
@@ -37,14 +49,59 @@ def school_admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- TEMPLATE FILTERS ---
+
+@main.app_template_filter('photo_url')
+def photo_url(photo, size='full'):
+    """
+    URL foto bukti untuk ukuran tertentu (thumb / medium / full). Foto yang belum selesai dikompres (pending)
+    atau gagal (failed) belum punya file di folder uploads, jadi ditampilkan gambar pengganti.
+    """
+    if photo.status != 'ready':
+        return url_for('static', filename='photo-placeholder.svg')
+    return url_for('static', filename='uploads/' + photo.variant(size))
+
+@main.app_template_filter('photo_srcset')
+def photo_srcset(photo):
+    """Isi atribut srcset dari semua turunan foto yang tersedia (kosong jika foto belum siap)."""
+    if photo.status != 'ready':
+        return ''
+    return ', '.join(f"{url_for('static', filename='uploads/' + name)} {width}w" for name, width in photo.srcset_items)
+
 # --- SUPER ADMIN ROUTES ---
 
 @main.route("/super-admin")
 @super_admin_required
+@query_budget(4)
 def super_dashboard():
     schools = School.query.all()
     total_users = User.query.count()
-    return render_template('super_admin/dashboard.html', schools=schools, total_users=total_users)
+    stats = {s.school_id: s for s in SchoolStats.query}
+    return render_template('super_admin/dashboard.html', schools=schools, total_users=total_users, stats=stats)
+
+@main.route("/super-admin/image-queue")
+@super_admin_required
+def image_queue_status():
+    return jsonify(image_queue_stats())
+
+@main.route("/super-admin/cache")
+@super_admin_required
+def cache_status():
+    return jsonify(cache_stats())
+
+@main.route("/metrics")
+def metrics():
+    # Dibaca oleh Prometheus, bukan oleh pengguna. Tanpa METRICS_TOKEN hanya scraper di mesin yang sama
+    # (langsung, bukan lewat proxy) yang dilayani; request dari proxy membawa X-Forwarded-For / Forwarded.
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(403)
+    elif request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers:
+        abort(403)
+    return Response(collect_text(), mimetype='text/plain; version=0.0.4')
 
 @main.route("/super-admin/create-school", methods=['GET', 'POST'])
 @super_admin_required
@@ -73,6 +130,7 @@ def create_school():
         for r_code, r_desc in default_rules:
             db.session.add(ViolationRule(code=r_code, description=r_desc, school_id=new_school.id))
         db.session.commit()
+        invalidate_reference(new_school.id)
         flash(f'Sekolah "{school_name}" berhasil dibuat!', 'success')
         return redirect(url_for('main.super_dashboard'))
     return render_template('super_admin/create_school.html')
@@ -116,35 +174,48 @@ def favicon():
 
 # --- MAIN ROUTES ---
 
+def violation_feed_query(school_id, search='', category='', date_range=''):
+    """Query feed pelanggaran di beranda beserta filternya (juga dipakai pemeriksa query plan)."""
+    query = Violation.query.filter(Violation.school_id == school_id)
+    if search:
+        matching = student_search_ids(school_id, search)
+        if matching is not None: query = query.filter(Violation.student_id.in_(matching))
+    if category: query = query.filter(Violation.kategori_pelanggaran == category)
+    if date_range:
+        today = datetime.utcnow()
+        if date_range == 'today': query = query.filter(Violation.date_posted >= today.replace(hour=0, minute=0, second=0))
+        elif date_range == 'week': query = query.filter(Violation.date_posted >= today - timedelta(days=7))
+        elif date_range == 'month': query = query.filter(Violation.date_posted >= today - timedelta(days=30))
+    return query
+
 @main.route("/")
 @main.route("/home")
 @main.route("/index")
 @school_admin_required
+@query_budget(8)
 def home():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     date_range = request.args.get('date_range', '')
-    query = Violation.query.join(Student).filter(Student.school_id == current_user.school_id)
-    if search: query = query.filter(Student.name.contains(search))
-    if category: query = query.filter(Violation.kategori_pelanggaran == category)
-    if date_range:
-        today = datetime.utcnow()
-        if date_range == 'today': query = query.filter(Violation.date_posted >= today.replace(hour=0, minute=0, second=0))
-        elif date_range == 'week': query = query.filter(Violation.date_posted >= today - timedelta(days=7))
-        elif date_range == 'month': query = query.filter(Violation.date_posted >= today - timedelta(days=30))
-    pelanggaran_pagination = query.options(joinedload(Violation.photos)).order_by(Violation.date_posted.desc()).paginate(page=page, per_page=10, error_out=False)
-    total_students = Student.query.filter_by(school_id=current_user.school_id).count()
-    total_violations = Violation.query.join(Student).filter(Student.school_id == current_user.school_id).count()
-    total_classes = Classroom.query.filter_by(school_id=current_user.school_id).count()
-    categories = ViolationCategory.query.filter_by(school_id=current_user.school_id).all()
+    query = violation_feed_query(current_user.school_id, search, category, date_range)
+    stats = SchoolStats.for_school(current_user.school_id)
+    total_students, total_violations, total_classes = stats.students, stats.violations, stats.classrooms
+    # Tanpa filter, total diambil dari penghitung school_stats; dengan filter tidak dihitung sama sekali
+    total = total_violations if not (search or category or date_range) else None
+    query = query.options(selectinload(Violation.photos), selectinload(Violation.student).selectinload(Student.classroom))
+    pelanggaran_pagination = keyset_paginate(query, Violation.date_posted, Violation.id, cursor, per_page=10, total=total)
+    # Pilihan filter kategori dan form remisi massal dari cache referensi
+    reference = school_reference(current_user.school_id)
+    categories, classes = reference['categories'], reference['classes']
     return render_template('index.html', 
                            total_students=total_students, total_violations=total_violations, total_classes=total_classes,
                            pelanggaran_pagination=pelanggaran_pagination, search_query=search, category_filter=category,
-                           date_range_value=date_range, categories=categories)
+                           date_range_value=date_range, categories=categories, classes=classes)
 
 @main.route("/classes", methods=['GET', 'POST'])
 @school_admin_required
+@query_budget(4)
 def manage_classes():
     if request.method == 'POST':
         class_name = request.form.get('class_name')
@@ -154,12 +225,40 @@ def manage_classes():
                 new_class = Classroom(name=class_name, school_id=current_user.school_id)
                 db.session.add(new_class)
                 db.session.commit()
+                invalidate_reference(current_user.school_id)
                 flash(f'Kelas {class_name} berhasil dibuat!', 'success')
             else:
                 flash(f'Kelas {class_name} sudah ada.', 'warning')
         return redirect(url_for('main.manage_classes'))
-    classes = Classroom.query.filter_by(school_id=current_user.school_id).order_by(Classroom.name).all()
-    return render_template('manajemenkelas.html', classes=classes)
+    classes = school_reference(current_user.school_id)['classes']
+    # Jumlah siswa per kelas dalam satu query (bukan cls.students|length per kelas)
+    student_counts = dict(db.session.query(Student.classroom_id, func.count(Student.id)).filter(
+        Student.school_id == current_user.school_id
+    ).group_by(Student.classroom_id))
+    return render_template('manajemenkelas.html', classes=classes, student_counts=student_counts)
+
+@main.route("/classes/promote", methods=['POST'])
+@school_admin_required
+def promote_all_classes():
+    # Field target_<id kelas asal>: id kelas tujuan, 'lulus' (tanpa kelas), atau kosong (tetap)
+    mapping = {}
+    for key, value in request.form.items():
+        if not key.startswith('target_') or not value:
+            continue
+        try:
+            mapping[int(key[len('target_'):])] = None if value == 'lulus' else int(value)
+        except ValueError:
+            continue
+    try:
+        moved = promote_classes(current_user.school_id, mapping)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.manage_classes'))
+    db.session.commit()
+    invalidate_roster(current_user.school_id)
+    invalidate_statistics(current_user.school_id)  # top-5 statistik memuat nama kelas siswa
+    flash(f'Kenaikan kelas selesai: {moved} siswa dipindahkan.', 'success')
+    return redirect(url_for('main.manage_classes'))
 
 @main.route("/classes/delete/<int:class_id>", methods=['POST'])
 @school_admin_required
@@ -170,14 +269,16 @@ def delete_class(class_id):
     else:
         db.session.delete(classroom)
         db.session.commit()
+        invalidate_reference(current_user.school_id)
         flash('Kelas berhasil dihapus.', 'success')
     return redirect(url_for('main.manage_classes'))
 
 @main.route("/classes/<int:class_id>", methods=['GET', 'POST'])
 @school_admin_required
+@query_budget(5)
 def view_class(class_id):
     classroom = Classroom.query.filter_by(id=class_id, school_id=current_user.school_id).first_or_404()
-    all_classes = Classroom.query.filter(Classroom.id != class_id, Classroom.school_id == current_user.school_id).order_by(Classroom.name).all()
+    all_classes = [c for c in school_reference(current_user.school_id)['classes'] if c.id != class_id]
     if request.method == 'POST' and 'import_students' in request.form:
         raw_names = request.form.get('student_names')
         if raw_names:
@@ -191,35 +292,78 @@ def view_class(class_id):
                     db.session.add(student)
                     count += 1
             db.session.commit()
+            invalidate_roster(current_user.school_id)
             flash(f'Berhasil mengimpor {count} murid.', 'success')
             return redirect(url_for('main.view_class', class_id=class_id))
     if request.method == 'POST' and 'mutate_students' in request.form:
         target_class_id = request.form.get('target_class_id')
         selected_student_ids = request.form.getlist('selected_students')
         if target_class_id and selected_student_ids:
-            target_class = Classroom.query.filter_by(id=target_class_id, school_id=current_user.school_id).first()
-            if target_class:
-                for stud_id in selected_student_ids:
-                    student = Student.query.filter_by(id=stud_id, school_id=current_user.school_id).first()
-                    if student:
-                        student.classroom = target_class
+            # Satu UPDATE untuk semua siswa terpilih (dibatasi ke sekolah ini), bukan satu query per siswa
+            moved = transfer_students(current_user.school_id, selected_student_ids, request.form.get('target_class_id', type=int))
+            if moved is not None:
                 db.session.commit()
-                flash('Mutasi berhasil.', 'success')
+                invalidate_roster(current_user.school_id)
+                invalidate_statistics(current_user.school_id)
+                flash(f'Mutasi berhasil: {moved} siswa dipindahkan.', 'success')
             else:
                 flash('Kelas tujuan tidak valid.', 'danger')
         return redirect(url_for('main.view_class', class_id=class_id))
     return render_template('detailkelas.html', classroom=classroom, all_classes=all_classes)
 
+def roster_query(school_id, prefix='', class_id=None):
+    """Kolom id, nama, dan kelas siswa saja (tanpa objek ORM), untuk autocomplete dan daftar per kelas."""
+    query = db.session.query(Student.id, Student.name, Classroom.name).outerjoin(
+        Classroom, Student.classroom_id == Classroom.id
+    ).filter(Student.school_id == school_id)
+    if class_id:
+        query = query.filter(Student.classroom_id == class_id)
+    term = normalize_name(prefix)
+    if term:
+        # Rentang [term, term berikutnya) memakai indeks (school_id, name_search); LIKE 'x%' tidak di SQLite
+        upper = term[:-1] + chr(ord(term[-1]) + 1)
+        query = query.filter(Student.name_search >= term, Student.name_search < upper).order_by(Student.name_search, Student.id)
+    else:
+        query = query.order_by(Student.name, Student.id)
+    return query
+
+@main.route("/api/students")
+@school_admin_required
+@query_budget(2)
+def student_autocomplete():
+    """
+    Autocomplete siswa: ?q=<awalan nama> (minimal ROSTER_MIN_PREFIX huruf) di seluruh sekolah
+    dan/atau ?class_id=<id> untuk satu kelas.
+    Hasil di-cache per versi daftar siswa sekolah dan dikirim dengan ETag untuk GET bersyarat.
+    """
+    prefix = request.args.get('q', '').strip()[:50]
+    class_id = request.args.get('class_id', type=int)
+    term = normalize_name(prefix)
+    if not class_id and len(term) < current_app.config.get('ROSTER_MIN_PREFIX', 2):
+        return jsonify([])
+    # Jumlah yang di-cache tetap per jenis query; `limit` dari klien hanya memotong hasil,
+    # sehingga tidak menambah entri cache baru
+    fetch = 500 if class_id and not prefix else 20
+    limit = max(1, min(request.args.get('limit', fetch, type=int), fetch))
+    school_id = current_user.school_id
+    key = f"{class_id or ''}:{term}"
+    rows = cached_roster(school_id, key, lambda: [
+        {'id': sid, 'name': name, 'class': class_name}
+        for sid, name, class_name in roster_query(school_id, prefix, class_id).limit(fetch)
+    ])
+    response = jsonify(rows[:limit])
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    return response.make_conditional(request)
+
 @main.route("/api/students/<class_name>")
 @school_admin_required
 def get_students_by_class(class_name):
-    classroom = Classroom.query.filter_by(name=class_name, school_id=current_user.school_id).first()
-    if classroom:
-        students = [student.name for student in classroom.students]
-        students.sort()
-        return jsonify(students)
-    else:
-        return jsonify([])
+    # Endpoint lama (hanya nama); form pelanggaran sekarang memakai /api/students?class_id=
+    names = db.session.query(Student.name).join(Classroom, Student.classroom_id == Classroom.id).filter(
+        Classroom.school_id == current_user.school_id, Classroom.name == class_name
+    ).order_by(Student.name)
+    return jsonify([name for name, in names])
 
 @main.route("/student/delete/<int:student_id>", methods=['POST'])
 @school_admin_required
@@ -231,6 +375,7 @@ def delete_student(student_id):
     try:
         db.session.delete(student)
         db.session.commit()
+        invalidate_roster(current_user.school_id)
         flash(f'Siswa {student.name} berhasil dihapus.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -240,27 +385,33 @@ def delete_student(student_id):
 @main.route("/add_violation", methods=['GET', 'POST'])
 @school_admin_required
 def add_violation():
-    classes = Classroom.query.filter_by(school_id=current_user.school_id).order_by(Classroom.name).all()
-    rules = ViolationRule.query.filter_by(school_id=current_user.school_id).all()
-    categories = ViolationCategory.query.filter_by(school_id=current_user.school_id).all()
-    staff_members = User.query.filter_by(school_id=current_user.school_id).all()
+    # Pilihan form dari cache referensi; halaman ini tidak menyentuh DB untuk data lookup
+    reference = school_reference(current_user.school_id)
     if request.method == 'POST':
+        student_id = request.form.get('student_id', type=int)
         class_name = request.form.get('kelas')
         student_name = request.form.get('nama_murid')
         description = request.form.get('deskripsi')
         pasal = request.form.get('pasal')
-        kategori_id = request.form.get('kategori_id')
+        kategori_id = request.form.get('kategori_id', type=int)
         tanggal_str = request.form.get('tanggal_kejadian')
         jam_str = request.form.get('jam_kejadian')
         di_input_oleh = request.form.get('di_input_oleh')
-        selected_category = ViolationCategory.query.get(kategori_id)
+        selected_category = category_by_id(current_user.school_id, kategori_id)
         points = selected_category.points if selected_category else 0
         kategori_name = selected_category.name if selected_category else "Umum"
-        classroom = Classroom.query.filter_by(name=class_name, school_id=current_user.school_id).first()
         student = None
-        if classroom:
-            student = Student.query.filter_by(name=student_name, classroom_id=classroom.id, school_id=current_user.school_id).first()
-        if student:
+        if student_id:
+            student = Student.query.filter_by(id=student_id, school_id=current_user.school_id).first()
+        elif student_name:
+            # Form lama: siswa dicari lewat nama kelas + nama siswa
+            classroom = Classroom.query.filter_by(name=class_name, school_id=current_user.school_id).first()
+            if classroom:
+                student = Student.query.filter_by(name=student_name, classroom_id=classroom.id, school_id=current_user.school_id).first()
+        if kategori_id and selected_category is None:
+            # Kategori yang dipilih harus ada; jangan dicatat diam-diam sebagai "Umum" dengan 0 poin
+            flash('Kategori pelanggaran tidak ditemukan.', 'danger')
+        elif student:
             try:
                 date_obj = datetime.strptime(tanggal_str, '%d/%m/%Y')
                 if jam_str:
@@ -275,6 +426,7 @@ def add_violation():
                 points=points,
                 date_posted=date_posted,
                 student_id=student.id,
+                school_id=current_user.school_id,
                 pasal=pasal,
                 kategori_pelanggaran=kategori_name,
                 di_input_oleh=di_input_oleh
@@ -283,53 +435,95 @@ def add_violation():
             db.session.flush()
             files = request.files.getlist('bukti_file')
             valid_files = [f for f in files if f.filename != '']
+            upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+            if not os.path.exists(upload_folder): os.makedirs(upload_folder)
+            pending_photos = []
             for file in valid_files[:10]: 
-                upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-                if not os.path.exists(upload_folder): os.makedirs(upload_folder)
                 fname = secure_filename(file.filename)
                 timestamp = str(int(time.time()))
                 unique_suffix = secrets.token_hex(2)
                 name_without_ext = os.path.splitext(fname)[0]
                 filename = f"{timestamp}_{unique_suffix}_{name_without_ext}.jpg"
-                save_path = os.path.join(upload_folder, filename)
-                success = compress_image(file, save_path)
-                if success:
-                    photo = ViolationPhoto(filename=filename, violation_id=violation.id)
-                    db.session.add(photo)
+                # Simpan file mentah saja; kompresi dikerjakan worker gambar setelah commit
+                raw_path = save_raw_upload(file, filename)
+                photo = ViolationPhoto(filename=filename, violation_id=violation.id, status='pending')
+                db.session.add(photo)
+                pending_photos.append((photo, raw_path))
             db.session.commit()
+            invalidate_statistics(current_user.school_id)
+            for photo, raw_path in pending_photos:
+                submit_photo(photo.id, raw_path, upload_folder)
             flash('Pelanggaran berhasil dicatat!', 'success')
             return redirect(url_for('main.home'))
         else:
             flash(f'Siswa tidak ditemukan.', 'danger')
-    return render_template('add_violation.html', classes=classes, rules=rules, categories=categories, staff_members=staff_members)
+    return render_template('add_violation.html', classes=reference['classes'], rules=reference['rules'],
+                           categories=reference['categories'], staff_members=reference['members'])
+
+@main.route("/api/uploads", methods=['POST'])
+@school_admin_required
+def upload_photo():
+    """Upload satu foto bukti lebih dulu; token yang dikembalikan dipakai di /api/violations/batch."""
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'Tidak ada file yang diunggah.'}), 400
+    return jsonify({'token': store_upload(file, current_user.school_id)}), 201
+
+@main.route("/api/violations/batch", methods=['POST'])
+@school_admin_required
+@query_budget(12)
+def ingest_violations_batch():
+    """
+    Terima banyak pelanggaran dalam satu request JSON ({"violations": [...]}) dari klien yang bisa bekerja offline.
+    Aman dikirim ulang: item dengan client_key yang sudah tersimpan dilaporkan sebagai duplicate.
+    """
+    payload = request.get_json(silent=True)
+    items = payload.get('violations') if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify({'error': 'Body harus berupa {"violations": [...]}.'}), 400
+    try:
+        results, pending_photos = ingest_violations(current_user.school_id, items,
+                                                    current_app.config.get('INGEST_MAX_ITEMS', 200))
+        db.session.commit()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        # Batch yang sama sedang disimpan oleh request lain; kirim ulang akan dilaporkan sebagai duplicate
+        db.session.rollback()
+        return jsonify({'error': 'Konflik client_key atau token foto, silakan kirim ulang.'}), 409
+    created = sum(result['status'] == 'created' for result in results)
+    if created:
+        invalidate_statistics(current_user.school_id)
+    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+    for photo_id, raw_path in pending_photos:
+        submit_photo(photo_id, raw_path, upload_folder)
+    return jsonify({'created': created, 'results': results})
 
 @main.route("/student/<int:student_id>")
 @school_admin_required
+@query_budget(5)
 def student_history(student_id):
-    student = Student.query.filter_by(id=student_id, school_id=current_user.school_id).first_or_404()
-    total_points = sum(v.points for v in student.violations if not v.is_remitted)
-    return render_template('student_history.html', student=student, total_points=total_points)
+    # Foto dimuat sekaligus untuk semua pelanggaran (bukan satu query per kartu)
+    student = Student.query.options(
+        selectinload(Student.violations).selectinload(Violation.photos)
+    ).filter_by(id=student_id, school_id=current_user.school_id).first_or_404()
+    return render_template('student_history.html', student=student, total_points=student.poin)
 
 @main.route("/violation/delete/<int:violation_id>", methods=['POST'])
 @school_admin_required
 def delete_violation(violation_id):
-    violation = Violation.query.join(Student).filter(
-        Violation.id == violation_id,
-        Student.school_id == current_user.school_id
-    ).first_or_404()
+    violation = Violation.query.filter_by(id=violation_id, school_id=current_user.school_id).first_or_404()
     student_id = violation.student_id
     db.session.delete(violation)
     db.session.commit()
+    invalidate_statistics(current_user.school_id)
     flash('Data pelanggaran telah dihapus permanen.', 'success')
     return redirect(url_for('main.student_history', student_id=student_id))
 
 @main.route("/violation/remit/<int:violation_id>", methods=['POST'])
 @school_admin_required
 def remit_violation(violation_id):
-    violation = Violation.query.join(Student).filter(
-        Violation.id == violation_id,
-        Student.school_id == current_user.school_id
-    ).first_or_404()
+    violation = Violation.query.filter_by(id=violation_id, school_id=current_user.school_id).first_or_404()
     reason = request.form.get('remission_reason')
     if not reason:
         flash('Keterangan remisi wajib diisi.', 'warning')
@@ -338,44 +532,98 @@ def remit_violation(violation_id):
     violation.remission_reason = reason
     violation.remission_date = datetime.utcnow()
     db.session.commit()
+    invalidate_statistics(current_user.school_id)
     flash('Remisi berhasil.', 'success')
     return redirect(url_for('main.student_history', student_id=violation.student_id))
 
-@main.route("/statistics")
+def _form_date(name):
+    value = request.form.get(name)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+@main.route("/violations/remit_bulk", methods=['POST'])
 @school_admin_required
-def statistics():
-    base_query = Violation.query.join(Student).filter(Student.school_id == current_user.school_id)
-    category_stats = db.session.query(
-        Violation.kategori_pelanggaran, func.count(Violation.id)
-    ).join(Student).filter(Student.school_id == current_user.school_id).group_by(Violation.kategori_pelanggaran).all()
-    pie_labels = [stat[0] for stat in category_stats]
-    pie_data = [stat[1] for stat in category_stats]
+def remit_violations_bulk():
+    """Remisi massal berdasarkan kategori, rentang tanggal, kelas, dan/atau daftar id pelanggaran."""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    reason = (request.form.get('remission_reason') or '').strip()[:255]
+    if not reason:
+        if wants_json:
+            return jsonify({'error': 'Keterangan remisi wajib diisi.'}), 400
+        flash('Keterangan remisi wajib diisi.', 'warning')
+        return redirect(request.referrer or url_for('main.home'))
+    ids = [int(v) for v in request.form.getlist('violation_ids') if v.isdigit()]
+    try:
+        result = bulk_remit(current_user.school_id, reason,
+                            category=request.form.get('category') or None,
+                            start=_form_date('start_date'), end=_form_date('end_date'),
+                            class_id=request.form.get('class_id', type=int), ids=ids)
+    except ValueError as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'warning')
+        return redirect(request.referrer or url_for('main.home'))
+    db.session.commit()
+    invalidate_statistics(current_user.school_id)
+    if wants_json:
+        return jsonify(result)
+    flash(f"Remisi massal berhasil: {result['violations']} pelanggaran dari {result['students']} siswa "
+          f"({result['points']} poin).", 'success')
+    return redirect(request.referrer or url_for('main.home'))
+
+# Query halaman statistik dipisah agar bisa diperiksa query plan-nya (flask check-plans)
+def category_stats_query(school_id):
+    return db.session.query(
+        ViolationDailyRollup.category, func.sum(ViolationDailyRollup.count)
+    ).filter(ViolationDailyRollup.school_id == school_id).group_by(ViolationDailyRollup.category).having(
+        func.sum(ViolationDailyRollup.count) > 0
+    )
+
+def top_students_query(school_id, start, end):
+    return db.session.query(
+        Student,
+        func.count(Violation.id).label('count'),
+        func.sum(Violation.points).label('total_points')
+    ).join(Violation).filter(
+        Violation.school_id == school_id,
+        Violation.date_posted >= start,
+        Violation.date_posted < end
+    ).group_by(Student.id).order_by(func.sum(Violation.points).desc()).limit(5)
+
+def daily_stats_query(school_id, start_day):
+    return db.session.query(
+        ViolationDailyRollup.day.label('date'),
+        func.sum(ViolationDailyRollup.count).label('count')
+    ).filter(
+        ViolationDailyRollup.school_id == school_id,
+        ViolationDailyRollup.day >= start_day
+    ).group_by(ViolationDailyRollup.day)
+
+def _compute_statistics(school_id, trend_range):
+    """Data halaman statistik dalam bentuk dict/list biasa agar bisa disimpan di cache."""
+    # Kategori dan tren dibaca dari rekap harian, bukan dari tabel violations mentah
+    category_stats = category_stats_query(school_id).all()
+    pie_labels = [stat[0] or None for stat in category_stats]
+    pie_data = [int(stat[1]) for stat in category_stats]
     if not pie_data:
         pie_labels = ["Belum ada data"]
         pie_data = [0]
     today = datetime.utcnow().replace(hour=0, minute=0, second=0)
     tomorrow = today + timedelta(days=1)
-    top_today = db.session.query(
-        Student,
-        func.count(Violation.id).label('count'),
-        func.sum(Violation.points).label('total_points')
-    ).join(Violation).filter(
-        Student.school_id == current_user.school_id,
-        Violation.date_posted >= today,
-        Violation.date_posted < tomorrow
-    ).group_by(Student.id).order_by(func.sum(Violation.points).desc()).limit(5).all()
-    trend_range = request.args.get('trend_range', '7d')
+    top_today = top_students_query(school_id, today, tomorrow).all()
+    top_today = [{
+        'Student': {'id': item.Student.id, 'name': item.Student.name,
+                    'classroom': {'name': item.Student.classroom.name} if item.Student.classroom else None},
+        'count': item.count,
+        'total_points': int(item.total_points or 0),
+    } for item in top_today]
     end_date = datetime.utcnow()
     days_map = {'30d': 30, '90d': 90, '180d': 180}
     start_date = end_date - timedelta(days=days_map.get(trend_range, 7))
-    daily_stats = db.session.query(
-        func.date(Violation.date_posted).label('date'),
-        func.count(Violation.id).label('count')
-    ).join(Student).filter(
-        Student.school_id == current_user.school_id,
-        Violation.date_posted >= start_date
-    ).group_by(func.date(Violation.date_posted)).all()
-    stats_dict = {str(stat.date): stat.count for stat in daily_stats}
+    daily_stats = daily_stats_query(school_id, start_date.date()).all()
+    stats_dict = {str(stat.date): int(stat.count) for stat in daily_stats}
     trend_labels = []
     trend_data = []
     current = start_date
@@ -385,29 +633,43 @@ def statistics():
         trend_labels.append(l_str)
         trend_data.append(stats_dict.get(d_str, 0))
         current += timedelta(days=1)
-    return render_template('statistics.html',
-        pie_data=pie_data, pie_labels=pie_labels,
-        top_today=top_today, trend_labels=trend_labels, trend_data=trend_data,
-        current_range=trend_range, total_violations_today=sum(item.count for item in top_today) if top_today else 0
-    )
+    return {
+        'pie_data': pie_data, 'pie_labels': pie_labels,
+        'top_today': top_today, 'trend_labels': trend_labels, 'trend_data': trend_data,
+        'total_violations_today': sum(item['count'] for item in top_today),
+    }
+
+@main.route("/statistics")
+@school_admin_required
+@query_budget(6)
+def statistics():
+    trend_range = request.args.get('trend_range', '7d')
+    cache_range = trend_range if trend_range in ('30d', '90d', '180d') else '7d'
+    school_id = current_user.school_id
+    data = cached_statistics(school_id, cache_range, datetime.utcnow().date(),
+                             lambda: _compute_statistics(school_id, cache_range))
+    return render_template('statistics.html', current_range=trend_range, **data)
 
 # --- SETTINGS ROUTES ---
 
 @main.route("/settings")
 @school_admin_required
+@query_budget(5)
 def settings():
     school = current_user.school
-    members = User.query.filter_by(school_id=school.id).all()
-    rules = ViolationRule.query.filter_by(school_id=school.id).all()
-    categories = ViolationCategory.query.filter_by(school_id=school.id).all()
-    return render_template('settings.html', school=school, members=members, rules=rules, categories=categories)
+    reference = school_reference(school.id)
+    jobs = Job.query.filter(Job.school_id == school.id, Job.kind.in_(['backup', 'restore', 'import'])).order_by(Job.id.desc()).limit(5).all()
+    return render_template('settings.html', school=school, members=reference['members'], rules=reference['rules'],
+                           categories=reference['categories'],
+                           jobs=[_job_json(j) for j in jobs], active_tab=request.args.get('tab', 'sekolah'))
 
 @main.route("/settings/update_school", methods=['POST'])
 @school_admin_required
 def settings_update_school():
     name = request.form.get('name')
     address = request.form.get('address')
-    school = current_user.school
+    # current_user.school hanya snapshot baca-saja dari cache identitas
+    school = db.session.get(School, current_user.school_id)
     if name: school.name = name
     if address: school.address = address
     if 'logo' in request.files:
@@ -421,6 +683,7 @@ def settings_update_school():
             file.save(os.path.join(upload_folder, filename))
             school.logo = filename
     db.session.commit()
+    invalidate_school(school.id)
     flash('Profil sekolah berhasil diperbarui.', 'success')
     return redirect(url_for('main.settings'))
 
@@ -437,6 +700,7 @@ def settings_add_member():
     new_user.set_password(password)
     db.session.add(new_user)
     db.session.commit()
+    invalidate_reference(current_user.school_id)
     flash('Anggota berhasil ditambahkan.', 'success')
     return redirect(url_for('main.settings'))
 
@@ -457,6 +721,8 @@ def settings_edit_member():
             user.set_password(password)
             flash(f'Password untuk {user.username} berhasil direset.', 'success')
         db.session.commit()
+        invalidate_reference(current_user.school_id)
+        invalidate_user(user.id)
     return redirect(url_for('main.settings'))
 
 @main.route("/settings/delete_member/<int:user_id>", methods=['POST'])
@@ -469,6 +735,8 @@ def settings_delete_member(user_id):
     if user:
         db.session.delete(user)
         db.session.commit()
+        invalidate_reference(current_user.school_id)
+        invalidate_user(user_id)
         flash('Anggota berhasil dihapus.', 'success')
     return redirect(url_for('main.settings'))
 
@@ -486,6 +754,7 @@ def settings_rules():
         rule = ViolationRule.query.filter_by(id=rule_id, school_id=current_user.school_id).first()
         if rule: db.session.delete(rule)
     db.session.commit()
+    invalidate_reference(current_user.school_id)
     return redirect(url_for('main.settings'))
 
 @main.route("/settings/categories", methods=['POST'])
@@ -502,6 +771,7 @@ def settings_categories():
         cat = ViolationCategory.query.filter_by(id=cat_id, school_id=current_user.school_id).first()
         if cat: db.session.delete(cat)
     db.session.commit()
+    invalidate_reference(current_user.school_id)
     return redirect(url_for('main.settings'))
 
 # --- PRINT ROUTES ---
@@ -509,10 +779,7 @@ def settings_categories():
 @main.route("/violation/print/<int:violation_id>")
 @school_admin_required
 def print_violation(violation_id):
-    violation = Violation.query.join(Student).filter(
-        Violation.id == violation_id,
-        Student.school_id == current_user.school_id
-    ).first_or_404()
+    violation = Violation.query.filter_by(id=violation_id, school_id=current_user.school_id).first_or_404()
     
     return render_template('print_violation.html', 
                          violation=violation, 
@@ -525,8 +792,8 @@ def print_class_report(class_id):
     classroom = Classroom.query.filter_by(id=class_id, school_id=current_user.school_id).first_or_404()
     
     violations = Violation.query.join(Student).filter(
-        Student.classroom_id == class_id,
-        Student.school_id == current_user.school_id
+        Violation.school_id == current_user.school_id,
+        Student.classroom_id == class_id
     ).order_by(Violation.date_posted.desc()).all()
     
     return render_template('print_class_report.html', 
@@ -534,104 +801,37 @@ def print_class_report(class_id):
                          violations=violations, 
                          school=current_user.school)
 
+@main.route("/class/print/<int:class_id>/job", methods=['POST'])
+@school_admin_required
+def print_class_report_job(class_id):
+    classroom = Classroom.query.filter_by(id=class_id, school_id=current_user.school_id).first_or_404()
+    job = enqueue('class_report', current_user.school_id, current_user.id, class_report_task, classroom.id)
+    return jsonify(_job_json(job)), 202
+
 # --- BACKUP & RESTORE ROUTE (ZIP Format) ---
 
 @main.route("/settings/backup")
 @school_admin_required
 def backup_data():
     school = current_user.school
-    
-    # 1. Kumpulkan Data (JSON)
-    # a. Data Siswa & Pelanggaran
-    students_data = []
-    students = Student.query.filter_by(school_id=school.id).all()
-    
-    for s in students:
-        violations_data = []
-        for v in s.violations:
-            photos_data = []
-            for p in v.photos:
-                photos_data.append(p.filename)
-                
-            violations_data.append({
-                "date": v.date_posted.isoformat(),
-                "description": v.description,
-                "points": v.points,
-                "pasal": v.pasal,
-                "kategori": v.kategori_pelanggaran,
-                "reporter": v.di_input_oleh,
-                "is_remitted": v.is_remitted,
-                "remission_reason": v.remission_reason,
-                "photos": photos_data
-            })
-            
-        students_data.append({
-            "name": s.name,
-            "nis": s.nis,
-            "classroom": s.classroom.name if s.classroom else None,
-            "violations": violations_data
-        })
-
-    # b. Data Settings (Anggota, Pasal, Kategori)
-    members_data = [{"username": u.username, "full_name": u.full_name} for u in school.users if u.role != 'super_admin']
-    rules_data = [{"code": r.code, "description": r.description} for r in school.rules]
-    categories_data = [{"name": c.name, "points": c.points} for c in school.categories]
-    classrooms_data = [{"name": c.name} for c in school.classrooms]
-
-    backup_json = {
-        "school": {
-            "name": school.name,
-            "address": school.address,
-            "logo": school.logo
-        },
-        "backup_date": datetime.now().isoformat(),
-        "settings": {
-            "members": members_data,
-            "rules": rules_data,
-            "categories": categories_data,
-            "classrooms": classrooms_data
-        },
-        "students": students_data
-    }
-    
-    # 2. Buat ZIP File
-    memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # a. Tulis data.json
-        zf.writestr('data.json', json.dumps(backup_json, indent=4))
-        
-        # b. Tulis Foto-foto Bukti
-        upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-        
-        # Helper to write file if exists
-        def add_file_to_zip(filename):
-            if not filename: return
-            file_path = os.path.join(upload_folder, filename)
-            if os.path.exists(file_path):
-                zf.write(file_path, arcname=filename) 
-        
-        # Foto Pelanggaran
-        for s in students_data:
-            for v in s['violations']:
-                for p_name in v['photos']:
-                    add_file_to_zip(p_name)
-        
-        # Logo Sekolah
-        add_file_to_zip(school.logo)
-
-    memory_file.seek(0)
-    
-    # Format Nama File: Backup_NamaSekolah_Tanggal_Waktu_DataPelanggaran.zip
-    date_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    clean_school_name = "".join(c for c in school.name if c.isalnum() or c in (' ', '_')).replace(' ', '_')
-    filename = f"Backup_{clean_school_name}_{date_str}_DataPelanggaran.zip"
-    
-    return send_file(
-        memory_file,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=filename
-    )
+    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+    batch_size = current_app.config.get('BACKUP_BATCH_SIZE', 500)
+
+    if request.args.get('mode') == 'stream':
+        # ZIP di-stream per potongan: data diambil per batch, byte pertama langsung terkirim
+        filename = backup_filename(school.name)
+        stream = observe_stream(iter_backup_zip(school.id, upload_folder, batch_size), JOB_SECONDS, kind='backup_stream')
+        return Response(
+            stream_with_context(stream),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+
+    job = enqueue('backup', school.id, current_user.id, backup_task, upload_folder, batch_size)
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_json(job)), 202
+    flash('Backup sedang diproses. File dapat diunduh setelah selesai.', 'info')
+    return redirect(url_for('main.settings', tab='backup'))
 
 @main.route("/settings/restore", methods=['POST'])
 @school_admin_required
@@ -646,130 +846,73 @@ def restore_data():
         flash('Tidak ada file yang dipilih.', 'danger')
         return redirect(url_for('main.settings'))
 
-    if file and file.filename.endswith('.zip'):
-        try:
-            upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-            if not os.path.exists(upload_folder): os.makedirs(upload_folder)
+    if not file.filename.endswith('.zip'):
+        flash('Format file harus .zip', 'danger')
+        return redirect(url_for('main.settings'))
 
-            with zipfile.ZipFile(file) as zf:
-                # 1. Baca data.json
-                if 'data.json' not in zf.namelist():
-                    flash('Format backup tidak valid (data.json hilang).', 'danger')
-                    return redirect(url_for('main.settings'))
-                
-                json_data = zf.read('data.json')
-                data = json.loads(json_data)
-                
-                school = current_user.school
-                
-                # 2. Restore Settings
-                if 'school' in data:
-                    school.name = data['school'].get('name', school.name)
-                    school.address = data['school'].get('address', school.address)
-                    logo_name = data['school'].get('logo')
-                    if logo_name:
-                        school.logo = logo_name
-                        # Extract logo file if in zip
-                        if logo_name in zf.namelist():
-                            with open(os.path.join(upload_folder, logo_name), 'wb') as f:
-                                f.write(zf.read(logo_name))
-
-                # Restore Rules
-                for r_data in data.get('settings', {}).get('rules', []):
-                    if not ViolationRule.query.filter_by(code=r_data['code'], school_id=school.id).first():
-                        db.session.add(ViolationRule(code=r_data['code'], description=r_data['description'], school_id=school.id))
-                
-                # Restore Categories
-                for c_data in data.get('settings', {}).get('categories', []):
-                    if not ViolationCategory.query.filter_by(name=c_data['name'], school_id=school.id).first():
-                        db.session.add(ViolationCategory(name=c_data['name'], points=c_data['points'], school_id=school.id))
-                
-                # Restore Classrooms
-                for c_data in data.get('settings', {}).get('classrooms', []):
-                    if not Classroom.query.filter_by(name=c_data['name'], school_id=school.id).first():
-                        db.session.add(Classroom(name=c_data['name'], school_id=school.id))
-                
-                # Restore Members (Users) - Password will need reset or default
-                for m_data in data.get('settings', {}).get('members', []):
-                    if not User.query.filter_by(username=m_data['username']).first():
-                        new_user = User(username=m_data['username'], full_name=m_data['full_name'], role='school_admin', school_id=school.id)
-                        new_user.set_password('guru123') # Default password for restored users
-                        db.session.add(new_user)
-
-                db.session.flush()
-
-                # 3. Restore Siswa & Pelanggaran
-                count_students = 0
-                count_violations = 0
-                
-                for s_data in data.get('students', []):
-                    # Cari Classroom ID
-                    classroom = None
-                    if s_data.get('classroom'):
-                        classroom = Classroom.query.filter_by(name=s_data['classroom'], school_id=school.id).first()
-                    
-                    # Cari atau Buat Siswa
-                    student = Student.query.filter_by(nis=s_data['nis'], school_id=school.id).first()
-                    if not student:
-                        student = Student(
-                            name=s_data['name'],
-                            nis=s_data['nis'],
-                            school_id=school.id,
-                            classroom_id=classroom.id if classroom else None
-                        )
-                        db.session.add(student)
-                        db.session.flush()
-                        count_students += 1
-                    
-                    # Restore Violations
-                    for v_data in s_data.get('violations', []):
-                        try: v_date = datetime.fromisoformat(v_data['date'])
-                        except ValueError: v_date = datetime.utcnow()
-
-                        # Cek duplikat
-                        existing = Violation.query.filter_by(
-                            student_id=student.id,
-                            date_posted=v_date,
-                            description=v_data['description']
-                        ).first()
-                        
-                        if not existing:
-                            violation = Violation(
-                                student_id=student.id,
-                                date_posted=v_date,
-                                description=v_data['description'],
-                                points=v_data['points'],
-                                pasal=v_data['pasal'],
-                                kategori_pelanggaran=v_data['kategori'],
-                                di_input_oleh=v_data['reporter'],
-                                is_remitted=v_data.get('is_remitted', False),
-                                remission_reason=v_data.get('remission_reason')
-                            )
-                            db.session.add(violation)
-                            db.session.flush()
-                            count_violations += 1
-                            
-                            # Restore Photos
-                            for p_name in v_data.get('photos', []):
-                                # Extract file
-                                if p_name in zf.namelist():
-                                    with open(os.path.join(upload_folder, p_name), 'wb') as f:
-                                        f.write(zf.read(p_name))
-                                
-                                # DB Record
-                                if not ViolationPhoto.query.filter_by(violation_id=violation.id, filename=p_name).first():
-                                    db.session.add(ViolationPhoto(filename=p_name, violation_id=violation.id))
+    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
+    if not os.path.exists(upload_folder): os.makedirs(upload_folder)
+
+    # Simpan ZIP dulu, proses restore berjalan di job latar belakang
+    zip_path = os.path.join(job_folder(), f"restore_upload_{secrets.token_hex(8)}.zip")
+    file.save(zip_path)
+    job = enqueue('restore', current_user.school_id, current_user.id, restore_task,
+                  zip_path, upload_folder, current_app.config.get('RESTORE_CHUNK_SIZE', 1000))
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_json(job)), 202
+    flash('Restore sedang diproses di latar belakang.', 'info')
+    return redirect(url_for('main.settings', tab='backup'))
+
+@main.route("/settings/import_students", methods=['POST'])
+@school_admin_required
+def import_students_data():
+    file = request.files.get('roster_file')
+    if file is None or file.filename == '':
+        flash('Tidak ada file yang dipilih.', 'danger')
+        return redirect(url_for('main.settings', tab='backup'))
+
+    ext = os.path.splitext(file.filename)[1].lower()
+    if ext not in ('.csv', '.xlsx'):
+        flash('Format file harus .csv atau .xlsx', 'danger')
+        return redirect(url_for('main.settings', tab='backup'))
+
+    # File dibaca bertahap oleh job (dua kali: validasi lalu tulis), jadi disimpan ke disk dulu
+    file_path = os.path.join(job_folder(), f"import_upload_{secrets.token_hex(8)}{ext}")
+    file.save(file_path)
+    dry_run = bool(request.form.get('dry_run'))
+    job = enqueue('import', current_user.school_id, current_user.id, import_task,
+                  file_path, dry_run, current_app.config.get('IMPORT_CHUNK_SIZE', 1000))
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(_job_json(job)), 202
+    flash('Validasi file sedang diproses.' if dry_run else 'Impor siswa sedang diproses di latar belakang.', 'info')
+    return redirect(url_for('main.settings', tab='backup'))
+
+# --- JOB ROUTES ---
+
+def _job_json(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job_progress(job),
+        "message": job.message,
+        "download_url": url_for('main.download_job', job_id=job.id) if job.status == 'done' and job.artifact else None
+    }
 
-            db.session.commit()
-            flash(f'Restore Berhasil! {count_students} siswa dan {count_violations} pelanggaran dipulihkan.', 'success')
-            
-        except zipfile.BadZipFile:
-            flash('File ZIP rusak atau tidak valid.', 'danger')
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Terjadi kesalahan: {str(e)}', 'danger')
-            
-    else:
-        flash('Format file harus .zip', 'danger')
-        
-    return redirect(url_for('main.settings'))
\ No newline at end of file
+@main.route("/jobs/<int:job_id>")
+@school_admin_required
+def job_status(job_id):
+    job = Job.query.filter_by(id=job_id, school_id=current_user.school_id).first_or_404()
+    return jsonify(_job_json(job))
+
+@main.route("/jobs/<int:job_id>/download")
+@school_admin_required
+def download_job(job_id):
+    job = Job.query.filter_by(id=job_id, school_id=current_user.school_id).first_or_404()
+    if job.status != 'done' or not job.artifact:
+        abort(404)
+    path = os.path.join(job_folder(), job.artifact)
+    if not os.path.exists(path):
+        abort(404)
+    as_attachment = job.mimetype != 'text/html'
+    return send_file(path, mimetype=job.mimetype, as_attachment=as_attachment, download_name=job.download_name)
@@ -0,0 +1,224 @@
+import os
+import shutil
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text, select, update, delete, func
+
+from my_app.extensions import db
+from my_app.models import Student, Violation, Classroom, ViolationPhoto, PhotoBlob, ViolationDailyRollup
+from my_app.storage import file_sha256, store_blob, temp_folder, upload_path
+from my_app.search import reindex_student_names
+from my_app.stats import check_student_points, reconcile_school_stats, rebuild_daily_rollup
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+# Kolom baru pada tabel yang sudah ada sebelumnya: (tabel, kolom, definisi DDL).
+# violations.school_id nullable dulu agar bisa diisi bertahap, lalu dibuat wajib di MySQL.
+NEW_COLUMNS = [
+    ('violations', 'school_id', 'INTEGER NULL'),
+    ('violations', 'client_key', 'VARCHAR(64) NULL'),
+    # Nama ternormalisasi untuk pencarian, diisi reindex_student_names
+    ('students', 'name_search', 'VARCHAR(100) NULL'),
+    ('violation_photos', 'status', "VARCHAR(20) NOT NULL DEFAULT 'ready'"),
+    # Turunan ukuran gambar; foto lama tetap NULL sampai `flask process-photos --derivatives`
+    ('violation_photos', 'width', 'INTEGER NULL'),
+    ('violation_photos', 'thumb_filename', 'VARCHAR(255) NULL'),
+    ('violation_photos', 'thumb_width', 'INTEGER NULL'),
+    ('violation_photos', 'medium_filename', 'VARCHAR(255) NULL'),
+    ('violation_photos', 'medium_width', 'INTEGER NULL'),
+    # Foreign key ke photo_blobs ditambahkan terpisah (MySQL), isinya diisi backfill_photo_blobs
+    ('violation_photos', 'blob_hash', 'VARCHAR(64) NULL'),
+    # Token upload yang sudah dipakai batch ingest (indeks unik dibuat bersama indeks lain)
+    ('violation_photos', 'raw_filename', 'VARCHAR(255) NULL'),
+    ('jobs', 'worker', 'VARCHAR(100) NULL'),
+]
+
+# Kolom yang dibuat wajib setelah backfill (hanya MySQL; SQLite tidak bisa mengubah definisi kolom)
+NOT_NULL_COLUMNS = [
+    ('violations', 'school_id', 'INTEGER NOT NULL'),
+    # Dulu default 100 dan boleh NULL, sekarang jumlah poin pelanggaran aktif
+    ('students', 'poin', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+# Foreign key untuk kolom di atas (hanya MySQL; SQLite tidak bisa menambah constraint ke tabel lama)
+NEW_FOREIGN_KEYS = [
+    ('violations', 'fk_violations_school_id', 'school_id', 'schools (id)'),
+    ('violation_photos', 'fk_violation_photos_blob_hash', 'blob_hash', 'photo_blobs (hash)'),
+]
+
+
+def _add_missing_columns(connection):
+    """Tambah kolom NEW_COLUMNS yang belum ada. Mengembalikan daftar 'tabel.kolom' yang ditambahkan."""
+    inspector = inspect(connection)
+    existing = {}
+    added = []
+    for table, column, ddl in NEW_COLUMNS:
+        if table not in existing:
+            existing[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column in existing[table]:
+            continue
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+        existing[table].add(column)
+        added.append(f'{table}.{column}')
+    return added
+
+
+def backfill_violation_school(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Isi violations.school_id dari students per rentang id agar tidak mengunci tabel terlalu lama.
+    Pelanggaran yang siswanya sudah tidak ada dilewati (lihat orphaned_violations).
+    """
+    max_id = db.session.scalar(select(func.max(Violation.id))) or 0
+    filled = 0
+    for start in range(0, max_id + 1, batch_size):
+        school_of_student = select(Student.school_id).where(Student.id == Violation.student_id).scalar_subquery()
+        result = db.session.execute(
+            update(Violation).where(Violation.id >= start, Violation.id < start + batch_size, Violation.school_id.is_(None),
+                                    Violation.student_id.in_(select(Student.id)))
+            .values(school_id=school_of_student).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        filled += result.rowcount
+    return filled
+
+
+def orphaned_violations():
+    """Id pelanggaran yang siswanya sudah tidak ada, sehingga school_id-nya tidak bisa diisi backfill."""
+    return db.session.scalars(select(Violation.id).where(Violation.school_id.is_(None)).order_by(Violation.id)).all()
+
+
+def delete_orphaned_violations(ids, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Hapus pelanggaran tanpa siswa beserta fotonya. Foto dihapus lewat ORM agar refcount blob ikut turun;
+    pelanggarannya tidak tercatat di penghitung sekolah, poin siswa, maupun rekap harian, jadi cukup lewat Core.
+    """
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        for photo in ViolationPhoto.query.filter(ViolationPhoto.violation_id.in_(chunk)):
+            db.session.delete(photo)
+        db.session.flush()
+        db.session.execute(delete(Violation).where(Violation.id.in_(chunk)).execution_options(synchronize_session=False))
+        db.session.commit()
+    return len(ids)
+
+
+def backfill_student_points():
+    """Isi Student.poin (dulu default 100, boleh NULL) dengan jumlah poin pelanggaran aktif."""
+    db.session.execute(update(Student).where(Student.poin.is_(None)).values(poin=0),
+                       execution_options={'synchronize_session': False})
+    db.session.commit()
+    return len(check_student_points(fix=True))
+
+
+def backfill_photo_blobs(upload_folder, batch_size=500):
+    """
+    Pindahkan foto lama (tanpa blob_hash) ke penyimpanan per-hash: isi file di-hash, baris PhotoBlob dibuat
+    atau dipakai ulang, lalu foto diarahkan ke file blob. File lama disalin, bukan dipindah, dan tersisa
+    sebagai file yatim untuk `flask cleanup-uploads`. Mengembalikan (jumlah foto diisi, jumlah file hilang).
+    """
+    last_id, filled, missing = 0, 0, 0
+    while True:
+        photos = ViolationPhoto.query.filter(
+            ViolationPhoto.id > last_id, ViolationPhoto.blob_hash.is_(None), ViolationPhoto.status == 'ready'
+        ).order_by(ViolationPhoto.id).limit(batch_size).all()
+        if not photos:
+            break
+        for photo in photos:
+            path = upload_path(upload_folder, photo.filename)
+            if not os.path.isfile(path):
+                missing += 1
+                continue
+            hash_hex = file_sha256(path)
+            blob = db.session.get(PhotoBlob, hash_hex)
+            if blob is None:
+                work_dir = temp_folder(upload_folder)
+                try:
+                    copy = os.path.join(work_dir, 'full.jpg')
+                    shutil.copy2(path, copy)
+                    blob = store_blob(upload_folder, copy, hash_hex=hash_hex)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            # Turunan lama (jika ada) tetap dipakai; refcount blob dinaikkan oleh event after_update
+            photo.blob_hash = blob.hash
+            photo.filename = blob.filename
+            photo.width = photo.width or blob.width
+            filled += 1
+        last_id = photos[-1].id
+        db.session.commit()
+    return filled, missing
+
+
+def _add_missing_foreign_keys(connection):
+    if connection.dialect.name != 'mysql':
+        return []
+    added = []
+    for table, name, column, target in NEW_FOREIGN_KEYS:
+        if name not in {fk['name'] for fk in inspect(connection).get_foreign_keys(table)}:
+            connection.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {target}'))
+            added.append(name)
+    return added
+
+
+def _create_missing_indexes(connection):
+    existing = {table: {ix['name'] for ix in inspect(connection).get_indexes(table)}
+                for table in ('violations', 'students', 'classrooms', 'violation_photos')}
+    created = []
+    for model in (Violation, Student, Classroom, ViolationPhoto):
+        for index in model.__table__.indexes:
+            if index.name not in existing[model.__tablename__]:
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+@click.command('upgrade-schema')
+@click.option('--delete-orphans', is_flag=True, help='Hapus pelanggaran yang siswanya sudah tidak ada.')
+@with_appcontext
+def upgrade_schema_command(delete_orphans):
+    """
+    Perbarui database lama ke skema model saat ini. Aman dijalankan berulang kali:
+    tabel baru dibuat, kolom baru (NEW_COLUMNS) ditambahkan lalu diisi (violations.school_id, nama siswa,
+    poin aktif siswa, penghitung dashboard, rekap harian), kolom dibuat wajib dan diberi foreign key (MySQL),
+    indeks yang belum ada dibuat, dan foto lama dipindah ke penyimpanan per-hash.
+
+    Pelanggaran yang siswanya sudah dihapus tidak bisa diisi school_id. Di MySQL perintah berhenti sebelum
+    kolom itu dibuat wajib sampai baris tersebut diperbaiki atau dihapus (--delete-orphans).
+    """
+    # Tabel baru (photo_blobs, school_stats, jobs, ...) harus ada sebelum foreign key ke sana dibuat
+    db.create_all()
+    with db.engine.begin() as connection:
+        for column in _add_missing_columns(connection):
+            click.echo(f"Kolom {column} ditambahkan.")
+    click.echo(f"{backfill_violation_school()} pelanggaran diisi school_id.")
+    orphans = orphaned_violations()
+    if orphans:
+        sample = ', '.join(str(violation_id) for violation_id in orphans[:20]) + (', ...' if len(orphans) > 20 else '')
+        if delete_orphans:
+            click.echo(f"{delete_orphaned_violations(orphans)} pelanggaran tanpa siswa dihapus (id: {sample}).")
+        elif db.engine.dialect.name == 'mysql':
+            raise click.ClickException(
+                f"{len(orphans)} pelanggaran tidak punya siswa sehingga school_id tidak bisa diisi (id: {sample}). "
+                f"Perbaiki student_id-nya atau jalankan ulang dengan --delete-orphans."
+            )
+        else:
+            click.echo(f"Peringatan: {len(orphans)} pelanggaran tidak punya siswa dan tidak tampil di sekolah mana pun "
+                       f"(id: {sample}). Jalankan ulang dengan --delete-orphans untuk menghapusnya.")
+    click.echo(f"{reindex_student_names(only_missing=True)} nama siswa diindeks untuk pencarian.")
+    click.echo(f"{backfill_student_points()} siswa diperbarui poin aktifnya.")
+    with db.engine.begin() as connection:
+        if connection.dialect.name == 'mysql':
+            # Setelah backfill kolom bisa dibuat wajib dan diberi foreign key
+            for table, column, ddl in NOT_NULL_COLUMNS:
+                connection.execute(text(f'ALTER TABLE {table} MODIFY {column} {ddl}'))
+        for name in _add_missing_foreign_keys(connection):
+            click.echo(f"Foreign key {name} ditambahkan.")
+        created = _create_missing_indexes(connection)
+    click.echo(f"Indeks dibuat: {', '.join(created) if created else '-'}")
+    click.echo(f"{len(reconcile_school_stats())} penghitung sekolah diperbarui.")
+    if db.session.query(ViolationDailyRollup.school_id).first() is None:
+        click.echo(f"Rekap harian dibangun: {rebuild_daily_rollup()} baris.")
+    filled, missing = backfill_photo_blobs(os.path.join(current_app.root_path, 'static', 'uploads'))
+    click.echo(f"{filled} foto lama dipindah ke penyimpanan per-hash ({missing} file tidak ditemukan).")
@@ -0,0 +1,61 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, update, bindparam, inspect
+
+from my_app.extensions import db
+from my_app.models import Student, StudentNameGram
+from my_app.utils import normalize_name
+
+
+def student_search_ids(school_id, text):
+    """
+    Subquery id siswa di sekolah ini yang namanya memuat `text` (tanpa beda huruf besar/kecil dan aksen).
+    Kandidat diambil dari indeks gram, lalu dicocokkan ulang dengan name_search yang jumlahnya kecil.
+    Mengembalikan None jika teks pencarian kosong setelah dinormalisasi.
+    """
+    term = normalize_name(text)
+    if not term:
+        return None
+    grams = {word[i:i + 3] for word in term.split() if len(word) >= 3 for i in range(len(word) - 2)}
+    candidates = select(StudentNameGram.student_id).where(StudentNameGram.school_id == school_id)
+    if grams:
+        # Siswa harus memiliki semua potongan 3 huruf dari kata kunci
+        candidates = candidates.where(StudentNameGram.gram.in_(grams)).group_by(StudentNameGram.student_id).having(
+            func.count(StudentNameGram.gram) == len(grams)
+        )
+    else:
+        # Kata kunci 1-2 huruf: cukup awalan gram (ekor kata ikut diindeks)
+        candidates = candidates.where(StudentNameGram.gram.like(term.split()[0] + '%')).distinct()
+    return select(Student.id).where(Student.id.in_(candidates), Student.name_search.contains(term, autoescape=True))
+
+
+def reindex_student_names(batch_size=1000, only_missing=False):
+    """Isi ulang name_search dan indeks gram untuk semua siswa (atau yang name_search-nya kosong), per batch id."""
+    last_id = 0
+    total = 0
+    while True:
+        query = select(Student.id, Student.school_id, Student.name).where(Student.id > last_id)
+        if only_missing:
+            query = query.where(Student.name_search.is_(None))
+        rows = db.session.execute(query.order_by(Student.id).limit(batch_size)).all()
+        if not rows:
+            break
+        students = [(sid, school_id, normalize_name(name)) for sid, school_id, name in rows]
+        db.session.execute(
+            update(Student.__table__).where(Student.__table__.c.id == bindparam('sid')).values(name_search=bindparam('ns')),
+            [{'sid': sid, 'ns': ns} for sid, _, ns in students]
+        )
+        StudentNameGram.index(db.session.connection(), students)
+        db.session.commit()
+        last_id = rows[-1][0]
+        total += len(rows)
+    return total
+
+
+@click.command('reindex-names')
+@with_appcontext
+def reindex_names_command():
+    """Bangun ulang indeks pencarian nama siswa (jalankan sekali untuk data lama)."""
+    if 'name_search' not in {c['name'] for c in inspect(db.engine).get_columns('students')}:
+        raise click.ClickException("Kolom students.name_search belum ada. Jalankan `flask upgrade-schema` lebih dulu.")
+    click.echo(f"{reindex_student_names()} nama siswa diindeks ulang.")
@@ -0,0 +1,132 @@
+import os
+import random
+import shutil
+from datetime import datetime, timedelta
+
+import click
+from PIL import Image
+from flask import current_app
+from flask.cli import with_appcontext
+
+from my_app.extensions import db
+from my_app.models import School, User, Classroom, Student, Violation, ViolationPhoto, ViolationCategory, ViolationRule
+from my_app.storage import store_blob, temp_folder
+
+FIRST_NAMES = ['Ahmad', 'Budi', 'Citra', 'Dewi', 'Eko', 'Fajar', 'Gita', 'Hendra', 'Indah', 'Joko', 'Kartika', 'Lestari',
+               'Muhammad', 'Nur', 'Putri', 'Rizky', 'Sari', 'Taufik', 'Wahyu', 'Yusuf', 'Aisyah', 'Bayu', 'Dimas', 'Fitri']
+LAST_NAMES = ['Pratama', 'Saputra', 'Wijaya', 'Hidayat', 'Santoso', 'Kusuma', 'Nugroho', 'Lubis', 'Siregar', 'Ramadhan',
+              'Permata', 'Setiawan', 'Utami', 'Halim', 'Maulana', 'Rahmawati']
+DESCRIPTIONS = ['Terlambat masuk kelas', 'Tidak memakai atribut lengkap', 'Membolos pada jam pelajaran',
+                'Rambut tidak rapi', 'Membawa ponsel saat ujian', 'Berkelahi dengan teman', 'Merokok di lingkungan sekolah']
+# Sebagian besar pelanggaran ringan, sedikit yang berat
+CATEGORIES = [('Ringan', 5, 70), ('Sedang', 15, 25), ('Berat', 30, 5)]
+RULES = [('Pasal 1', 'Ketertiban Umum'), ('Pasal 2', 'Kerapihan Seragam'), ('Pasal 3', 'Kehadiran')]
+GRADES = ['X', 'XI', 'XII']
+
+
+def _photo_pool(rng, upload_folder, size):
+    """Beberapa gambar JPEG acak yang disimpan sebagai blob; foto pelanggaran memakainya bergantian."""
+    blobs = []
+    work_dir = temp_folder(upload_folder)
+    try:
+        for index in range(size):
+            path = os.path.join(work_dir, f"{index}.jpg")
+            image = Image.effect_noise((320, 240), rng.randint(20, 80)).convert('RGB')
+            image.save(path, format='JPEG', quality=60)
+            blobs.append(store_blob(upload_folder, path))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return blobs
+
+
+def _violation_date(rng, now, days):
+    # Hari sekolah (Senin-Jumat) jauh lebih sering daripada akhir pekan, jam 07.00-15.00
+    while True:
+        day = now - timedelta(days=rng.randrange(days))
+        if day.weekday() < 5 or rng.random() < 0.1:
+            return day.replace(hour=rng.randint(7, 14), minute=rng.randrange(60), second=0, microsecond=0)
+
+
+def seed_data(schools=1, classes=6, students=30, violations=3.0, photo_ratio=0.2, days=365,
+              password='benchmark', upload_folder=None, seed=None, echo=None):
+    """
+    Buat data sintetis: `schools` sekolah, masing-masing `classes` kelas dengan rata-rata `students` siswa.
+    Jumlah pelanggaran per siswa mengikuti distribusi eksponensial dengan rata-rata `violations`
+    (kebanyakan siswa sedikit, segelintir siswa sangat banyak). `photo_ratio` bagian pelanggaran diberi foto.
+    Semua baris ditulis lewat ORM sehingga penghitung, poin, rekap harian, dan indeks nama ikut terisi.
+    Mengembalikan daftar (school_id, username_admin).
+    """
+    rng = random.Random(seed)
+    upload_folder = upload_folder or os.path.join(current_app.root_path, 'static', 'uploads')
+    os.makedirs(upload_folder, exist_ok=True)
+    now = datetime.utcnow()
+    blobs = _photo_pool(rng, upload_folder, 8) if photo_ratio > 0 else []
+    db.session.commit()
+
+    offset = School.query.filter(School.name.like('Sekolah Benchmark %')).count()
+    created = []
+    for s in range(schools):
+        school = School(name=f"Sekolah Benchmark {offset + s + 1}", address='Jl. Pendidikan No. 1')
+        db.session.add(school)
+        db.session.flush()
+        admin = User(username=f"bench_admin_{school.id}", role='school_admin', school_id=school.id,
+                     full_name='Admin Benchmark')
+        admin.set_password(password)
+        db.session.add(admin)
+        categories = [ViolationCategory(name=name, points=points, school_id=school.id) for name, points, _ in CATEGORIES]
+        db.session.add_all(categories)
+        db.session.add_all([ViolationRule(code=code, description=desc, school_id=school.id) for code, desc in RULES])
+        weights = [weight for _, _, weight in CATEGORIES]
+
+        nis = 0
+        for c in range(classes):
+            classroom = Classroom(name=f"{GRADES[c % len(GRADES)]}-{c // len(GRADES) + 1}", school_id=school.id)
+            db.session.add(classroom)
+            db.session.flush()
+            class_students = []
+            for _ in range(max(1, round(rng.gauss(students, students * 0.15)))):
+                nis += 1
+                class_students.append(Student(
+                    name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", nis=f"{school.id:03d}{nis:05d}",
+                    classroom_id=classroom.id, rombel=classroom.name, school_id=school.id,
+                ))
+            db.session.add_all(class_students)
+            db.session.flush()
+
+            for student in class_students:
+                for _ in range(int(rng.expovariate(1 / violations)) if violations > 0 else 0):
+                    category = rng.choices(CATEGORIES, weights)[0]
+                    violation = Violation(
+                        description=rng.choice(DESCRIPTIONS), points=category[1], date_posted=_violation_date(rng, now, days),
+                        student_id=student.id, school_id=school.id, pasal=rng.choice(RULES)[0],
+                        kategori_pelanggaran=category[0], di_input_oleh='Admin Benchmark',
+                        is_remitted=rng.random() < 0.05,
+                    )
+                    if blobs and rng.random() < photo_ratio:
+                        for blob in rng.sample(blobs, rng.randint(1, 2)):
+                            photo = ViolationPhoto(status='ready')
+                            blob.apply_to(photo)
+                            violation.photos.append(photo)
+                    db.session.add(violation)
+            db.session.commit()
+        created.append((school.id, admin.username))
+        if echo:
+            echo(f"  {school.name}: admin '{admin.username}'")
+    return created
+
+
+@click.command('seed')
+@click.option('--schools', default=1, show_default=True, help='Jumlah sekolah.')
+@click.option('--classes', default=6, show_default=True, help='Kelas per sekolah.')
+@click.option('--students', default=30, show_default=True, help='Rata-rata siswa per kelas.')
+@click.option('--violations', default=3.0, show_default=True, help='Rata-rata pelanggaran per siswa.')
+@click.option('--photo-ratio', default=0.2, show_default=True, help='Bagian pelanggaran yang punya foto bukti.')
+@click.option('--days', default=365, show_default=True, help='Rentang tanggal pelanggaran (hari ke belakang).')
+@click.option('--password', default='benchmark', show_default=True, help='Password admin sekolah yang dibuat.')
+@click.option('--seed', 'random_seed', type=int, default=None, help='Seed acak agar data bisa diulang.')
+@with_appcontext
+def seed_command(schools, classes, students, violations, photo_ratio, days, password, random_seed):
+    """Isi database dengan data sintetis untuk uji beban dan benchmark."""
+    created = seed_data(schools, classes, students, violations, photo_ratio, days, password,
+                        seed=random_seed, echo=click.echo)
+    click.echo(f"{len(created)} sekolah dibuat.")
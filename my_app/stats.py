@@ -0,0 +1,114 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, update, case, insert, delete
+
+from my_app.extensions import db
+from my_app.models import School, Student, Violation, Classroom, SchoolStats, ViolationDailyRollup
+
+
+def reconcile_school_stats():
+    """
+    Hitung ulang school_stats untuk semua sekolah dengan tiga query GROUP BY.
+    Mengembalikan daftar (school_id, nilai_lama, nilai_baru) untuk sekolah yang selisih.
+    """
+    actual = {school_id: dict.fromkeys(SchoolStats.COUNTERS, 0) for school_id, in db.session.query(School.id)}
+    grouped = {
+        'students': db.session.query(Student.school_id, func.count(Student.id)).group_by(Student.school_id),
+        'violations': db.session.query(Violation.school_id, func.count(Violation.id)).group_by(Violation.school_id),
+        'classrooms': db.session.query(Classroom.school_id, func.count(Classroom.id)).group_by(Classroom.school_id),
+    }
+    for counter, query in grouped.items():
+        for school_id, total in query:
+            if school_id in actual:
+                actual[school_id][counter] = total
+
+    existing = {stats.school_id: stats for stats in SchoolStats.query}
+    changed = []
+    for school_id, counts in actual.items():
+        stats = existing.get(school_id)
+        if stats is None:
+            stats = SchoolStats(school_id=school_id)
+            db.session.add(stats)
+        old = {counter: getattr(stats, counter) for counter in SchoolStats.COUNTERS}
+        if old != counts:
+            changed.append((school_id, old, counts))
+            for counter, total in counts.items():
+                setattr(stats, counter, total)
+    db.session.commit()
+    return changed
+
+
+def _active_points():
+    """Subquery korelasi: total poin pelanggaran aktif untuk Student saat ini."""
+    return select(func.coalesce(func.sum(Violation.points), 0)).where(
+        Violation.student_id == Student.id, Violation.is_remitted.isnot(True)
+    ).scalar_subquery()
+
+
+def check_student_points(fix=False, school_id=None):
+    """
+    Bandingkan Student.poin dengan jumlah poin pelanggaran aktif.
+    Mengembalikan daftar (student_id, poin_tersimpan, poin_aktual); dengan fix=True nilainya diperbaiki.
+    """
+    actual = func.coalesce(func.sum(case((Violation.is_remitted.isnot(True), Violation.points), else_=0)), 0)
+    query = db.session.query(Student.id, Student.poin, actual).outerjoin(Violation, Violation.student_id == Student.id)
+    if school_id:
+        query = query.filter(Student.school_id == school_id)
+    mismatched = [(sid, stored, total) for sid, stored, total in query.group_by(Student.id, Student.poin).having(Student.poin != actual)]
+    if fix and mismatched:
+        ids = [sid for sid, _, _ in mismatched]
+        for start in range(0, len(ids), 1000):
+            db.session.execute(update(Student).where(Student.id.in_(ids[start:start + 1000])).values(poin=_active_points()),
+                               execution_options={'synchronize_session': False})
+        db.session.commit()
+    return mismatched
+
+
+def rebuild_daily_rollup(school_id=None):
+    """Bangun ulang violation_daily_rollup (semua sekolah atau satu sekolah) dengan satu INSERT ... SELECT."""
+    day = func.date(Violation.date_posted)
+    category = func.coalesce(Violation.kategori_pelanggaran, '')
+    source = select(
+        Violation.school_id, day, category, func.count(Violation.id), func.coalesce(func.sum(Violation.points), 0)
+    ).where(Violation.school_id.isnot(None)).group_by(Violation.school_id, day, category)
+    clear = delete(ViolationDailyRollup)
+    if school_id:
+        source = source.where(Violation.school_id == school_id)
+        clear = clear.where(ViolationDailyRollup.school_id == school_id)
+    db.session.execute(clear)
+    result = db.session.execute(insert(ViolationDailyRollup).from_select(
+        ['school_id', 'day', 'category', 'count', 'points'], source
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Samakan penghitung dashboard (school_stats) dengan isi tabel sebenarnya."""
+    changed = reconcile_school_stats()
+    for school_id, old, new in changed:
+        click.echo(f"  Sekolah {school_id}: {old} -> {new}")
+    click.echo(f"{len(changed)} sekolah diperbaiki.")
+
+
+@click.command('check-points')
+@click.option('--fix', is_flag=True, help='Perbaiki poin siswa yang tidak sesuai.')
+@with_appcontext
+def check_points_command(fix):
+    """Periksa konsistensi poin aktif siswa (Student.poin) terhadap tabel pelanggaran."""
+    mismatched = check_student_points(fix=fix)
+    for sid, stored, total in mismatched[:50]:
+        click.echo(f"  Siswa {sid}: tersimpan {stored}, seharusnya {total}")
+    status = 'diperbaiki' if fix else 'tidak sesuai'
+    click.echo(f"{len(mismatched)} siswa {status}.")
+
+
+@click.command('rebuild-rollup')
+@click.option('--school', 'school_id', type=int, default=None, help='Hanya bangun ulang untuk satu sekolah.')
+@with_appcontext
+def rebuild_rollup_command(school_id):
+    """Bangun ulang rekap harian pelanggaran untuk halaman statistik."""
+    rows = rebuild_daily_rollup(school_id)
+    click.echo(f"Rekap harian dibangun ulang: {rows} baris.")
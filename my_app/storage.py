@@ -0,0 +1,95 @@
+import os
+import shutil
+import hashlib
+import secrets
+
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+
+from my_app.extensions import db
+from my_app.models import PhotoBlob
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(buf)
+    return digest.hexdigest()
+
+
+def upload_path(upload_folder, filename):
+    """Path absolut untuk nama file relatif (boleh berisi '/' seperti blobs/ab/cd/...)."""
+    return os.path.join(upload_folder, *filename.split('/'))
+
+
+def temp_folder(upload_folder):
+    """Folder kerja sementara di filesystem yang sama, agar pemindahan ke blob cukup os.replace."""
+    folder = os.path.join(upload_folder, 'blobs', 'tmp', secrets.token_hex(8))
+    os.makedirs(folder)
+    return folder
+
+
+def _move(src, upload_folder, rel_dest):
+    dest = upload_path(upload_folder, rel_dest)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(src, dest)
+    return dest
+
+
+def store_blob(upload_folder, full_path, derivatives=None, hash_hex=None):
+    """
+    Simpan file full (beserta turunan dari generate_derivatives, jika ada) berdasarkan hash isinya.
+    Jika isi yang sama sudah tersimpan, file baru dibuang dan blob lama dipakai.
+    Mengembalikan PhotoBlob yang sudah di-flush. Refcount bertambah saat blob dipasang ke ViolationPhoto.
+    """
+    hash_hex = hash_hex or file_sha256(full_path)
+    folder = os.path.dirname(full_path)
+    blob = db.session.get(PhotoBlob, hash_hex)
+    if blob is None:
+        blob = PhotoBlob(hash=hash_hex, size=os.path.getsize(full_path), refcount=0)
+        if derivatives:
+            blob.width = derivatives['full'][1]
+            for size_name in ('thumb', 'medium'):
+                if size_name in derivatives:
+                    name, width = derivatives[size_name][:2]
+                    rel = PhotoBlob.path_for(hash_hex, f"_{size_name}", os.path.splitext(name)[1].lstrip('.'))
+                    _move(os.path.join(folder, name), upload_folder, rel)
+                    setattr(blob, f"{size_name}_filename", rel)
+                    setattr(blob, f"{size_name}_width", width)
+        else:
+            try:
+                with Image.open(full_path) as img:
+                    blob.width = img.width
+            except OSError:
+                blob.width = None
+        _move(full_path, upload_folder, blob.filename)
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Proses lain menyimpan isi yang sama bersamaan; file di disk identik, cukup pakai barisnya
+            blob = db.session.get(PhotoBlob, hash_hex)
+    return blob
+
+
+def store_blob_from_stream(upload_folder, stream):
+    """
+    Simpan isi stream (misal entri ZIP) sebagai blob. Hash dihitung lebih dulu di memori
+    sehingga isi yang sudah tersimpan tidak ditulis ulang ke disk (restore berulang tidak menyalin lagi).
+    """
+    data = stream.read()
+    hash_hex = hashlib.sha256(data).hexdigest()
+    blob = db.session.get(PhotoBlob, hash_hex)
+    if blob is not None:
+        return blob
+    tmp_dir = temp_folder(upload_folder)
+    try:
+        tmp_path = os.path.join(tmp_dir, 'full.jpg')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        return store_blob(upload_folder, tmp_path, hash_hex=hash_hex)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -1,11 +1,13 @@
 import os
+import re
+import unicodedata
 from PIL import Image
 
 def compress_image(file_storage, save_path, quality=60, max_size=(1024, 1024)):
     """
     Mengkompres gambar, resize jika terlalu besar, dan konversi ke JPEG.
     
-    :param file_storage: Object file dari request.files
+    :param file_storage: Object file dari request.files, atau path file mentah
     :param save_path: Path lengkap lokasi penyimpanan
     :param quality: Kualitas output JPEG (1-100), default 60 (sudah cukup bagus utk web)
     :param max_size: Tuple (width, height) maksimal. Gambar akan di-resize proporsional.
@@ -30,4 +32,76 @@ def compress_image(file_storage, save_path, quality=60, max_size=(1024, 1024)):
         return True
     except Exception as e:
         print(f"Gagal mengkompres gambar: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def generate_derivatives(source, upload_folder, filename, sizes=None, webp=False, quality=60):
+    """
+    Membuat beberapa ukuran gambar sekaligus dari satu kali decode: thumbnail, medium, dan full.
+
+    File full (jika ada di `sizes`) disimpan sebagai `filename` (JPEG, sama seperti compress_image), sedangkan
+    thumbnail dan medium disimpan sebagai `<nama>_thumb` dan `<nama>_medium`, dalam format WebP jika `webp=True`.
+
+    :param source: Object file dari request.files, atau path file mentah
+    :param upload_folder: Folder tujuan semua turunan gambar
+    :param filename: Nama file full (.jpg)
+    :param sizes: Dict sisi terpanjang per ukuran, default {'thumb': 200, 'medium': 512, 'full': 1024}
+    :return: Dict {ukuran: (nama_file, lebar, tinggi)} atau None jika gagal
+    """
+    sizes = sizes or {'thumb': 200, 'medium': 512, 'full': 1024}
+    stem = os.path.splitext(filename)[0]
+    ext, fmt = ('webp', 'WEBP') if webp else ('jpg', 'JPEG')
+    try:
+        with Image.open(source) as original:
+            # Untuk JPEG, minta decoder langsung mengecilkan saat decode (jauh lebih cepat utk foto 12MP)
+            largest = max(sizes.values())
+            original.draft('RGB', (largest, largest))
+            image = original.convert("RGB")
+
+        result = {}
+        # Dari yang terbesar ke terkecil, sehingga setiap resize memakai hasil sebelumnya
+        for size_name in sorted(sizes, key=sizes.get, reverse=True):
+            max_side = sizes[size_name]
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            if size_name == 'full':
+                name = filename
+                image.save(os.path.join(upload_folder, name), format='JPEG', quality=quality, optimize=True)
+            else:
+                name = f"{stem}_{size_name}.{ext}"
+                image.save(os.path.join(upload_folder, name), format=fmt, quality=quality)
+            result[size_name] = (name, image.width, image.height)
+        return result
+    except Exception as e:
+        print(f"Gagal membuat turunan gambar: {e}")
+        return None
+
+def normalize_name(text):
+    """
+    Bentuk pencarian nama: huruf kecil, tanpa aksen/diakritik, tanda baca jadi spasi.
+    Contoh: "Nur'Aini  Zahrá" -> "nur aini zahra"
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+def name_grams(normalized):
+    """
+    Potongan 3 huruf dari setiap kata untuk indeks pencarian. Ekor kata (2 dan 1 huruf terakhir)
+    ikut disimpan sehingga kata kunci pendek tetap bisa dicari sebagai awalan potongan.
+    """
+    grams = set()
+    for word in normalized.split():
+        for i in range(len(word)):
+            grams.add(word[i:i + 3])
+    return grams
+
+def pid_alive(pid):
+    """True jika proses dengan pid ini masih ada di host ini (milik user lain pun dihitung hidup)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -1,6 +1,7 @@
 import pytest
 from my_app.app import app as flask_app
 from my_app.extensions import db
+from my_app import cache
 from my_app.models import User
 
 @pytest.fixture
@@ -13,6 +14,9 @@ def app():
         "SECRET_KEY": "test_secret_key"
     })
 
+    # Cache lokal hidup sepanjang proses; id sekolah berulang di tiap database in-memory baru
+    cache._backend = None
+    cache._local.clear()
     with flask_app.app_context():
         db.create_all()
         yield flask_app
@@ -37,4 +41,30 @@ def auth_client(client):
         'password': 'password123'
     }, follow_redirects=True)
     
-    return client
\ No newline at end of file
+    return client
+
+@pytest.fixture
+def school(app):
+    """Sekolah contoh beserta satu kelas."""
+    from my_app.models import School, Classroom
+    s = School(name="Sekolah Uji")
+    db.session.add(s)
+    db.session.flush()
+    db.session.add(Classroom(name="X-1", school_id=s.id))
+    db.session.commit()
+    return s
+
+@pytest.fixture
+def school_client(client, school):
+    """Client yang sudah login sebagai admin sekolah."""
+    user = User(username="admin_sekolah", role="school_admin", school_id=school.id)
+    user.set_password("password123")
+    db.session.add(user)
+    db.session.commit()
+
+    client.post('/login', data={
+        'username': 'admin_sekolah',
+        'password': 'password123'
+    }, follow_redirects=True)
+
+    return client
@@ -0,0 +1,68 @@
+from my_app.models import Student, Violation, Classroom, CacheVersion
+from my_app.extensions import db
+from my_app import cache
+from my_app.cache import invalidate_roster
+
+def _students(school):
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    db.session.add_all([
+        Student(name="Budi Santoso", nis="1", school_id=school.id, classroom_id=classroom.id),
+        Student(name="Bunga Citra", nis="2", school_id=school.id, classroom_id=classroom.id),
+        Student(name="Andi Budiman", nis="3", school_id=school.id),
+    ])
+    db.session.commit()
+    invalidate_roster(school.id)  # id sekolah bisa sama dengan test sebelumnya (database in-memory baru)
+    return classroom
+
+def test_prefix_search_returns_ids_and_names(school_client, school):
+    _students(school)
+    data = school_client.get('/api/students?q=bu').get_json()
+    assert [row['name'] for row in data] == ["Budi Santoso", "Bunga Citra"]
+    assert data[0]['id'] == Student.query.filter_by(nis="1").first().id
+    assert data[0]['class'] == "X-1"
+    assert school_client.get('/api/students?q=BUDI').get_json()[0]['name'] == "Budi Santoso"
+    assert school_client.get('/api/students').get_json() == []
+
+def test_class_roster_etag_and_invalidation(school_client, school):
+    classroom = _students(school)
+    url = f'/api/students?class_id={classroom.id}'
+    first = school_client.get(url)
+    assert [row['name'] for row in first.get_json()] == ["Budi Santoso", "Bunga Citra"]
+    etag = first.headers['ETag']
+    assert 'private' in first.headers['Cache-Control']
+    assert school_client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # Impor siswa lewat halaman kelas membuat cache dan ETag lama basi
+    school_client.post(f'/classes/{classroom.id}', data={'import_students': '1', 'student_names': 'Cahya'})
+    again = school_client.get(url, headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert "Cahya" in [row['name'] for row in again.get_json()]
+
+def test_add_violation_accepts_student_id(school_client, school):
+    _students(school)
+    student = Student.query.filter_by(nis="3").first()
+    school_client.post('/add_violation', data={
+        'student_id': student.id, 'deskripsi': 'Terlambat', 'tanggal_kejadian': '01/02/2024', 'jam_kejadian': '07:30',
+    })
+    assert Violation.query.filter_by(student_id=student.id).count() == 1
+
+def test_autocomplete_cache_keys_are_bounded(school_client, school):
+    """Satu huruf tidak di-query, `limit` tidak membuat entri baru, dan entri roster punya LRU sendiri."""
+    _students(school)
+    assert school_client.get('/api/students?q=b').get_json() == []
+    assert len(school_client.get('/api/students?q=bu&limit=1').get_json()) == 1
+    assert len(school_client.get('/api/students?q=bu&limit=7').get_json()) == 2
+    roster = cache.get_backend(namespace='roster')
+    assert roster is not cache.get_backend(namespace='stats')
+    assert len(roster._data) == 1
+
+def test_roster_invalidation_from_another_worker(school_client, school):
+    """Versi roster disimpan di database, jadi invalidasi dari worker lain membuat entri lokal usang."""
+    classroom = _students(school)
+    url = f'/api/students?class_id={classroom.id}'
+    assert len(school_client.get(url).get_json()) == 2
+    with db.engine.begin() as conn:
+        # Worker lain menambah siswa lalu menaikkan versi; LRU lokal proses ini tidak disentuh
+        conn.execute(Student.__table__.insert().values(name="Bayu", nis="4", school_id=school.id, classroom_id=classroom.id))
+        CacheVersion.bump(conn, f"roster:v:{school.id}")
+    assert len(school_client.get(url).get_json()) == 3
@@ -0,0 +1,102 @@
+import io
+import os
+import json
+import socket
+import zipfile
+from datetime import datetime
+
+from my_app.models import Student, Violation, Classroom, Job
+from my_app.jobs import wait_for, fail_orphaned_jobs
+from my_app.extensions import db
+
+def _seed_violations(school, n_students=3, n_violations=2):
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    for i in range(n_students):
+        s = Student(name=f"Siswa {i}", nis=f"NIS{i}", classroom_id=classroom.id, school_id=school.id)
+        db.session.add(s)
+        db.session.flush()
+        for j in range(n_violations):
+            db.session.add(Violation(description=f"Pelanggaran {j}", points=5, student_id=s.id,
+                                     date_posted=datetime(2024, 1, j + 1), kategori_pelanggaran="Ringan"))
+    db.session.commit()
+
+def test_backup_streams_valid_zip(school_client, school, app):
+    """Backup di-stream dan tetap menghasilkan ZIP + data.json yang valid."""
+    app.config['BACKUP_BATCH_SIZE'] = 2
+    _seed_violations(school)
+
+    response = school_client.get('/settings/backup?mode=stream')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert 'attachment' in response.headers['Content-Disposition']
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+        data = json.loads(zf.read('data.json'))
+
+    assert data['school']['name'] == "Sekolah Uji"
+    assert [s['nis'] for s in data['students']] == ["NIS0", "NIS1", "NIS2"]
+    assert all(len(s['violations']) == 2 for s in data['students'])
+    assert data['students'][0]['classroom'] == "X-1"
+
+def test_restore_merges_without_duplicates(school_client, school, app):
+    """Restore hanya menambahkan data yang belum ada (semantik merge)."""
+    _seed_violations(school)
+    backup = school_client.get('/settings/backup?mode=stream').data
+
+    Violation.query.filter_by(description="Pelanggaran 1").delete()
+    db.session.commit()
+    assert Violation.query.count() == 3
+
+    response = school_client.post('/settings/restore', data={
+        'backup_file': (io.BytesIO(backup), 'backup.zip')
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert response.status_code == 200
+    wait_for(Job.query.order_by(Job.id.desc()).first().id, timeout=10)
+    db.session.expire_all()
+
+    assert Student.query.count() == 3
+    assert Violation.query.count() == 6
+
+    # Restore kedua tidak boleh menggandakan data
+    response = school_client.post('/settings/restore', data={
+        'backup_file': (io.BytesIO(backup), 'backup.zip')
+    }, content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    wait_for(response.json['id'], timeout=10)
+    db.session.expire_all()
+    assert Violation.query.count() == 6
+    assert "0 pelanggaran" in school_client.get(f"/jobs/{response.json['id']}").json['message']
+
+def test_backup_job_progress_and_download(school_client, school, app, tmp_path):
+    """Backup berjalan sebagai job; status bisa di-polling lalu hasilnya diunduh."""
+    app.config['JOB_FOLDER'] = str(tmp_path)
+    _seed_violations(school)
+
+    response = school_client.get('/settings/backup', headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    job_id = response.json['id']
+    wait_for(job_id, timeout=10)
+
+    status = school_client.get(f'/jobs/{job_id}').json
+    assert status['status'] == 'done'
+    assert status['progress'] == 100
+
+    download = school_client.get(status['download_url'])
+    assert download.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(download.data)) as zf:
+        assert len(json.loads(zf.read('data.json'))['students']) == 3
+
+def test_orphaned_jobs_marked_failed(app, school):
+    """Job milik proses yang sudah berhenti ditandai gagal agar tidak di-polling selamanya."""
+    host = socket.gethostname()
+    dead = Job(kind='backup', school_id=school.id, status='running', worker=f"{host}:999999999:abcd")
+    restarted = Job(kind='backup', school_id=school.id, status='queued', worker=f"{host}:{os.getpid()}:lama")
+    legacy = Job(kind='restore', school_id=school.id, status='running')
+    other_host = Job(kind='backup', school_id=school.id, status='running', worker="host-lain:1:abcd")
+    db.session.add_all([dead, restarted, legacy, other_host])
+    db.session.commit()
+
+    assert fail_orphaned_jobs() == 3
+    assert {dead.status, restarted.status, legacy.status} == {'failed'}
+    assert dead.finished_at is not None and 'restart' in dead.message
+    assert other_host.status == 'running'
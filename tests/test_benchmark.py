@@ -0,0 +1,32 @@
+from my_app.models import School, Student, Violation, ViolationPhoto, SchoolStats
+from my_app.seed import seed_data
+from my_app.stats import reconcile_school_stats, check_student_points
+from my_app.benchmark import run_benchmarks, compare_results
+
+def test_seed_creates_consistent_data(app, tmp_path):
+    created = seed_data(schools=2, classes=3, students=5, violations=2.0, photo_ratio=0.5,
+                        upload_folder=str(tmp_path), seed=7)
+    assert len(created) == 2
+    school_id = created[0][0]
+    assert Student.query.filter_by(school_id=school_id).count() > 0
+    assert Violation.query.count() > 0
+    assert ViolationPhoto.query.count() > 0
+    # Data ditulis lewat ORM, jadi penghitung turunan langsung sesuai
+    assert SchoolStats.for_school(school_id).students == Student.query.filter_by(school_id=school_id).count()
+    assert reconcile_school_stats() == []
+    assert check_student_points() == []
+
+def test_benchmark_runs_every_scenario(app, tmp_path):
+    seed_data(schools=1, classes=2, students=4, violations=2.0, photo_ratio=0, upload_folder=str(tmp_path), seed=1)
+    results = run_benchmarks(app, repeat=1)
+    assert {'home', 'statistics', 'student_history', 'backup_stream', 'backup_zip', 'restore_zip'} <= set(results)
+    assert all(r['median_ms'] >= 0 and r['queries'] > 0 for r in results.values())
+    # Restore benchmark di-rollback
+    assert School.query.filter(School.name.like('Benchmark Restore %')).count() == 0
+
+def test_compare_results_flags_regressions():
+    baseline = {'home': {'median_ms': 10.0, 'queries': 6}, 'classes': {'median_ms': 2.0, 'queries': 2}}
+    results = {'home': {'median_ms': 30.0, 'queries': 6}, 'classes': {'median_ms': 4.0, 'queries': 3}}
+    regressions = dict(compare_results(results, baseline, threshold=0.25))
+    assert 'median' in regressions['home']
+    assert regressions['classes'] == 'query 2 -> 3'  # +2ms masih di bawah batas noise
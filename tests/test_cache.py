@@ -0,0 +1,46 @@
+import time
+from datetime import date
+
+from my_app.cache import LocalCache, cached_statistics, invalidate_statistics, cache_stats
+from my_app.models import Student, Violation
+from my_app.extensions import db
+
+def test_local_cache_lru_and_ttl():
+    cache = LocalCache(maxsize=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+    assert cache.get('b') is None  # paling lama tidak dipakai, dibuang
+    assert cache.get('a') == 1
+    cache.set('d', 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get('d') is None
+
+def test_statistics_cache_hits_and_invalidation(school_client, school):
+    """Halaman statistik dihitung sekali per versi sekolah; hapus pelanggaran membuat cache basi."""
+    calls = []
+    def compute():
+        calls.append(1)
+        return {'value': len(calls)}
+
+    invalidate_statistics(school.id)  # id sekolah bisa sama dengan test sebelumnya (database in-memory baru)
+    before = cache_stats()
+    assert cached_statistics(school.id, '7d', date(2024, 1, 1), compute) == {'value': 1}
+    assert cached_statistics(school.id, '7d', date(2024, 1, 1), compute) == {'value': 1}
+    invalidate_statistics(school.id)
+    assert cached_statistics(school.id, '7d', date(2024, 1, 1), compute) == {'value': 2}
+    after = cache_stats()
+    assert after['hits'] - before['hits'] == 1
+    assert after['misses'] - before['misses'] == 2
+
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    db.session.add(Violation(description="Terlambat", points=5, student_id=student.id, kategori_pelanggaran="Ringan"))
+    db.session.commit()
+    pie_json = b'<script id="pie-data-json" type="application/json">'
+    assert pie_json + b'[1]' in school_client.get('/statistics').data
+    violation = Violation.query.one()
+    school_client.post(f'/violation/delete/{violation.id}')
+    assert pie_json + b'[0]' in school_client.get('/statistics').data
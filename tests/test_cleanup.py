@@ -0,0 +1,106 @@
+import os
+import time
+
+from my_app.models import Student, Classroom, Violation, ViolationPhoto, PhotoBlob
+from my_app.extensions import db
+from my_app.cleanup import collect_uploads
+
+def _touch(folder, rel, size=10, age=7200):
+    path = os.path.join(folder, *rel.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+def test_cleanup_quarantines_orphans_and_reports_usage(school, tmp_path):
+    """File yatim (foto terhapus, logo lama, blob refcount 0) dikarantina; file terpakai dihitung per sekolah."""
+    uploads, quarantine = str(tmp_path / 'uploads'), str(tmp_path / 'quarantine')
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    student = Student(name="Budi", nis="1001", classroom_id=classroom.id, school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    violation = Violation(description="Terlambat", points=5, student_id=student.id)
+    db.session.add(violation)
+    db.session.flush()
+
+    used, unused = 'a' * 64, 'b' * 64
+    db.session.add_all([PhotoBlob(hash=used, size=100), PhotoBlob(hash=unused, size=100)])
+    db.session.flush()
+    photo = ViolationPhoto(violation_id=violation.id)
+    db.session.get(PhotoBlob, used).apply_to(photo)
+    db.session.add_all([photo, ViolationPhoto(violation_id=violation.id, filename='lama.jpg')])
+    school.logo = 'logo_baru.png'
+    db.session.commit()
+
+    kept = [PhotoBlob.path_for(used), PhotoBlob.path_for(used, '_thumb'), 'lama.jpg', 'logo_baru.png']
+    orphans = [PhotoBlob.path_for(unused), 'logo_lama.png', 'terhapus.jpg']
+    for rel in kept + orphans:
+        _touch(uploads, rel, size=100)
+    _touch(uploads, 'baru_diupload.jpg', age=0)
+
+    report = collect_uploads(uploads, 'report', quarantine_root=quarantine, batch_size=2)
+    assert report['orphans'] == {'files': 3, 'bytes': 300}
+    assert report['schools'][school.id]['files'] == 4
+    assert os.path.exists(os.path.join(uploads, 'logo_lama.png'))
+
+    result = collect_uploads(uploads, 'quarantine', quarantine_root=quarantine, batch_size=2)
+    assert result['orphans']['files'] == 3
+    for rel in orphans:
+        assert not os.path.exists(os.path.join(uploads, *rel.split('/')))
+        assert os.path.exists(os.path.join(result['quarantine_folder'], *rel.split('/')))
+    for rel in kept + ['baru_diupload.jpg']:
+        assert os.path.exists(os.path.join(uploads, *rel.split('/')))
+    assert [b.hash for b in PhotoBlob.query.all()] == [used]
+
+def test_cleanup_removes_stale_raw_uploads(school, tmp_path):
+    """File mentah lama yang tidak dirujuk foto pending dibersihkan; yang masih pending dibiarkan."""
+    uploads, raw = str(tmp_path / 'uploads'), str(tmp_path / 'raw')
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    violation = Violation(description="Terlambat", points=5, student_id=student.id)
+    db.session.add(violation)
+    db.session.flush()
+    db.session.add(ViolationPhoto(violation_id=violation.id, filename='pending.jpg', status='pending'))
+    db.session.commit()
+
+    _touch(raw, 'pending.jpg', age=10 * 86400)
+    _touch(raw, 'tidak_dipakai.jpg', age=10 * 86400)
+    _touch(raw, 'baru.jpg', age=60)
+
+    result = collect_uploads(uploads, 'delete', raw_folder=raw, raw_min_age=7 * 86400)
+    assert result['raw_orphans'] == {'files': 1, 'bytes': 10}
+    assert sorted(os.listdir(raw)) == ['baru.jpg', 'pending.jpg']
+
+def test_cleanup_keeps_blobs_referenced_by_photos(school, tmp_path):
+    """Blob yang masih dirujuk ViolationPhoto tidak dihapus walau baris PhotoBlob hilang atau refcount meleset."""
+    uploads = str(tmp_path / 'uploads')
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    violation = Violation(description="Terlambat", points=5, student_id=student.id)
+    db.session.add(violation)
+    db.session.flush()
+
+    no_row, drifted = 'c' * 64, 'd' * 64
+    db.session.add(PhotoBlob(hash=drifted, size=10))
+    db.session.flush()
+    db.session.add_all([
+        ViolationPhoto(violation_id=violation.id, filename=PhotoBlob.path_for(no_row), thumb_filename=PhotoBlob.path_for(no_row, '_thumb')),
+        ViolationPhoto(violation_id=violation.id, filename=PhotoBlob.path_for(drifted), blob_hash=drifted),
+    ])
+    db.session.commit()
+    db.session.query(PhotoBlob).update({'refcount': 0})
+    db.session.commit()
+
+    kept = [PhotoBlob.path_for(no_row), PhotoBlob.path_for(no_row, '_thumb'), PhotoBlob.path_for(drifted)]
+    for rel in kept:
+        _touch(uploads, rel)
+    result = collect_uploads(uploads, 'delete')
+    assert result['orphans']['files'] == 0
+    assert result['schools'][school.id]['files'] == 3
+    for rel in kept:
+        assert os.path.exists(os.path.join(uploads, *rel.split('/')))
+    assert db.session.get(PhotoBlob, drifted) is not None
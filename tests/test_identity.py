@@ -0,0 +1,63 @@
+from datetime import date
+
+from flask import g
+
+from my_app.extensions import db
+from my_app.models import User, CacheVersion
+from my_app.identity import load_identity
+from my_app.profiler import count_queries
+from my_app.cache import cached_roster, cached_statistics
+
+def _fresh_request(client, url):
+    # App context fixture dipakai bersama; buang user yang sudah dimuat agar user_loader berjalan lagi
+    g.pop('_login_user', None)
+    return client.get(url)
+
+def test_steady_state_requests_skip_auth_queries(school_client, school):
+    _fresh_request(school_client, '/settings')
+    with count_queries() as profile:
+        page = _fresh_request(school_client, '/add_violation').get_data(as_text=True)
+    assert "Sekolah Uji" in page
+    assert not [sql for _, sql in profile.statements if 'FROM users' in sql or 'FROM schools' in sql]
+
+def test_school_profile_update_refreshes_snapshot(school_client, school):
+    _fresh_request(school_client, '/')
+    school_client.post('/settings/update_school', data={'name': 'SMA Baru', 'address': 'Jl. Merdeka'})
+    page = _fresh_request(school_client, '/settings').get_data(as_text=True)
+    assert "SMA Baru" in page and "Jl. Merdeka" in page
+
+def test_member_changes_invalidate_identity(school_client, school):
+    member = User(username="guru", role="school_admin", school_id=school.id)
+    member.set_password("x")
+    db.session.add(member)
+    db.session.commit()
+    assert load_identity(member.id).username == "guru"
+
+    school_client.post('/settings/edit_member', data={'user_id': member.id, 'username': 'guru_bk'})
+    identity = load_identity(member.id)
+    assert (identity.username, identity.school.name, identity.is_authenticated) == ("guru_bk", "Sekolah Uji", True)
+
+    school_client.post(f'/settings/delete_member/{member.id}')
+    assert load_identity(member.id) is None
+
+def test_identity_snapshots_survive_roster_and_stats_churn(app, school_client, school):
+    _fresh_request(school_client, '/settings')
+    for i in range(app.config['ROSTER_CACHE_MAXSIZE'] + app.config['STATS_CACHE_MAXSIZE'] + 10):
+        cached_roster(school.id, f'x{i}', lambda: [])
+        cached_statistics(school.id, i, date(2024, 1, 1), lambda: {})
+    with count_queries() as profile:
+        _fresh_request(school_client, '/add_violation')
+    assert not [sql for _, sql in profile.statements if 'FROM users' in sql or 'FROM schools' in sql]
+
+def test_role_change_from_another_worker_applies_immediately(school_client, school):
+    member = User(username="guru", role="school_admin", school_id=school.id)
+    member.set_password("x")
+    db.session.add(member)
+    db.session.commit()
+    assert load_identity(member.id).role == "school_admin"
+
+    with db.engine.begin() as conn:
+        # Worker lain menurunkan peran lalu menaikkan versi; LRU lokal proses ini tidak disentuh
+        conn.execute(User.__table__.update().where(User.__table__.c.id == member.id).values(role="viewer"))
+        CacheVersion.bump(conn, f"user:v:{member.id}")
+    assert load_identity(member.id).role == "viewer"
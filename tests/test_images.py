@@ -0,0 +1,103 @@
+import io
+import os
+
+from PIL import Image
+
+from my_app.models import Student, Classroom, ViolationPhoto
+from my_app.extensions import db
+from my_app.images import wait_for_images, image_queue_stats
+
+def test_add_violation_compresses_photo_off_request(school_client, school, app, tmp_path):
+    """Foto disimpan mentah saat POST, lalu dikompres oleh worker gambar menjadi thumb/medium/full."""
+    app.config['RAW_UPLOAD_FOLDER'] = str(tmp_path)
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    db.session.add(Student(name="Budi", nis="1001", classroom_id=classroom.id, school_id=school.id))
+    db.session.commit()
+
+    buf = io.BytesIO()
+    Image.new('RGB', (2000, 1500), 'red').save(buf, format='PNG')
+    buf.seek(0)
+
+    response = school_client.post('/add_violation', data={
+        'kelas': 'X-1', 'nama_murid': 'Budi', 'deskripsi': 'Terlambat',
+        'tanggal_kejadian': '01/02/2024', 'bukti_file': (buf, 'bukti.png')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    wait_for_images(timeout=10)
+    db.session.expire_all()
+    photo = ViolationPhoto.query.one()
+    assert photo.status == 'ready'
+
+    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
+    saved = [os.path.join(upload_folder, name) for name in (photo.filename, photo.medium_filename, photo.thumb_filename)]
+    try:
+        with Image.open(saved[0]) as img:
+            assert img.format == 'JPEG'
+            assert max(img.size) <= 1024
+        assert (photo.width, photo.medium_width, photo.thumb_width) == (1024, 512, 200)
+        assert [name for name, _ in photo.srcset_items] == [photo.thumb_filename, photo.medium_filename, photo.filename]
+        assert os.listdir(tmp_path) == []
+        assert image_queue_stats()['queue_depth'] == 0
+    finally:
+        for path in saved:
+            os.remove(path)
+
+def test_duplicate_photos_share_one_blob(school_client, school, app, tmp_path):
+    """Foto yang sama untuk beberapa siswa hanya disimpan sekali; refcount mengikuti jumlah pemakai."""
+    from my_app.models import PhotoBlob, Violation
+
+    app.config['RAW_UPLOAD_FOLDER'] = str(tmp_path)
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    for i, name in enumerate(["Andi", "Citra"]):
+        db.session.add(Student(name=name, nis=f"20{i}", classroom_id=classroom.id, school_id=school.id))
+    db.session.commit()
+
+    buf = io.BytesIO()
+    Image.new('RGB', (800, 600), 'blue').save(buf, format='JPEG')
+    for name in ["Andi", "Citra"]:
+        school_client.post('/add_violation', data={
+            'kelas': 'X-1', 'nama_murid': name, 'deskripsi': 'Berkelahi',
+            'tanggal_kejadian': '01/02/2024', 'bukti_file': (io.BytesIO(buf.getvalue()), 'kejadian.jpg')
+        }, content_type='multipart/form-data')
+        wait_for_images(timeout=10)
+    db.session.expire_all()
+
+    blob = PhotoBlob.query.one()
+    photos = ViolationPhoto.query.all()
+    assert blob.refcount == 2
+    assert {p.filename for p in photos} == {blob.filename}
+    assert blob.filename.startswith(f"blobs/{blob.hash[:2]}/{blob.hash[2:4]}/")
+
+    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
+    try:
+        violation = Violation.query.first()
+        school_client.post(f'/violation/delete/{violation.id}')
+        db.session.expire_all()
+        assert PhotoBlob.query.one().refcount == 1
+    finally:
+        for name in (blob.filename, blob.thumb_filename, blob.medium_filename):
+            os.remove(os.path.join(upload_folder, name))
+
+def test_failed_compression_removes_raw_file(school_client, school, app, tmp_path):
+    """File yang bukan gambar ditandai failed dan file mentahnya tidak tertinggal."""
+    app.config['RAW_UPLOAD_FOLDER'] = str(tmp_path)
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    db.session.add(Student(name="Budi", nis="1001", classroom_id=classroom.id, school_id=school.id))
+    db.session.commit()
+
+    school_client.post('/add_violation', data={
+        'kelas': 'X-1', 'nama_murid': 'Budi', 'deskripsi': 'Terlambat',
+        'tanggal_kejadian': '01/02/2024', 'bukti_file': (io.BytesIO(b'bukan gambar'), 'bukti.jpg')
+    }, content_type='multipart/form-data')
+    wait_for_images(timeout=10)
+    db.session.expire_all()
+    assert ViolationPhoto.query.one().status == 'failed'
+    assert os.listdir(tmp_path) == []
+
+    # Halaman riwayat tidak menautkan file mentah yang sudah dihapus
+    photo = ViolationPhoto.query.one()
+    student = Student.query.filter_by(nis="1001").one()
+    page = school_client.get(f'/student/{student.id}').get_data(as_text=True)
+    assert 'photo-placeholder.svg' in page
+    assert 'uploads/' + photo.filename not in page
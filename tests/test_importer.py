@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+from my_app.extensions import db
+from my_app.models import Job, Student, Classroom, SchoolStats, StudentNameGram
+from my_app.importer import import_students
+from my_app.search import student_search_ids
+from my_app.jobs import wait_for
+
+ROSTER = "NIS;Nama;Kelas\n1;Budi Santoso;X-1\n2;Citra Lestari;XI-2\n\n3;Dewi;XI-2\n"
+
+def _write(tmp_path, content, name='siswa.csv'):
+    path = tmp_path / name
+    path.write_text(content, encoding='utf-8')
+    return str(path)
+
+def test_csv_import_creates_classes_and_upserts(app, school, tmp_path):
+    db.session.add(Student(name="Budi", nis="1", school_id=school.id))
+    db.session.commit()
+
+    summary = import_students(school.id, _write(tmp_path, ROSTER), chunk_size=2)
+    db.session.commit()
+    assert (summary['created'], summary['updated'], summary['classrooms_created']) == (2, 1, 1)
+    budi = Student.query.filter_by(nis="1").one()
+    assert budi.name == "Budi Santoso" and budi.classroom.name == "X-1"
+    assert len(Classroom.query.filter_by(school_id=school.id, name="XI-2").one().students) == 2
+
+    # Penghitung dan indeks nama ikut terjaga walau ditulis lewat bulk insert
+    stats = db.session.get(SchoolStats, school.id)
+    assert (stats.students, stats.classrooms) == (3, 2)
+    assert StudentNameGram.query.filter_by(student_id=budi.id).count() > 0
+    assert set(db.session.scalars(student_search_ids(school.id, "lestari"))) == {Student.query.filter_by(nis="2").one().id}
+
+    # Impor ulang file yang sama tidak mengubah apa pun
+    again = import_students(school.id, _write(tmp_path, ROSTER))
+    assert (again['created'], again['updated'], again['unchanged']) == (0, 0, 3)
+
+def test_dry_run_and_errors_write_nothing(app, school, tmp_path):
+    summary = import_students(school.id, _write(tmp_path, ROSTER), dry_run=True)
+    assert (summary['created'], summary['classrooms_created'], summary['applied']) == (3, 1, False)
+
+    errors = tmp_path / 'errors.csv'
+    bad = "nis,nama\n1,Budi\n,Tanpa NIS\n1,Budi Lagi\n"
+    summary = import_students(school.id, _write(tmp_path, bad), error_path=str(errors))
+    assert summary['errors'] == 2 and not summary['applied']
+    report = errors.read_text(encoding='utf-8')
+    assert 'NIS kosong' in report and 'NIS ganda' in report
+    db.session.commit()
+    assert Student.query.count() == 0
+
+def test_import_rejects_bad_header(app, school, tmp_path):
+    with pytest.raises(ValueError):
+        import_students(school.id, _write(tmp_path, "nama,kelas\nBudi,X-1\n"))
+
+def test_xlsx_import(app, school, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    workbook.active.append(['NIS', 'Nama', 'Kelas'])
+    workbook.active.append([12345, 'Eka', 'X-1'])
+    workbook.save(tmp_path / 'siswa.xlsx')
+    summary = import_students(school.id, str(tmp_path / 'siswa.xlsx'))
+    db.session.commit()
+    assert summary['created'] == 1
+    assert Student.query.filter_by(nis="12345").one().classroom.name == "X-1"
+
+def test_import_job_reports_errors(school_client, school, app, tmp_path):
+    app.config['JOB_FOLDER'] = str(tmp_path)
+    response = school_client.post('/settings/import_students', data={
+        'roster_file': (io.BytesIO(b"nis,nama\n1,Budi\n1,Budi\n"), 'siswa.csv')
+    }, content_type='multipart/form-data', headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    wait_for(response.json['id'], timeout=10)
+
+    status = school_client.get(f"/jobs/{response.json['id']}").json
+    assert status['status'] == 'done' and 'Validasi gagal' in status['message']
+    assert b'NIS ganda' in school_client.get(status['download_url']).data
+    assert db.session.get(Job, response.json['id']).kind == 'import'
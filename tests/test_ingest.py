@@ -0,0 +1,127 @@
+import io
+import os
+
+from PIL import Image
+
+from my_app.extensions import db
+from my_app.models import Student, Violation, ViolationCategory, ViolationPhoto, SchoolStats
+from my_app.images import wait_for_images
+from my_app.stats import reconcile_school_stats, check_student_points
+
+def _setup(school):
+    db.session.add_all([
+        Student(name="Budi", nis="1001", school_id=school.id),
+        Student(name="Citra", nis="1002", school_id=school.id),
+        ViolationCategory(name="Ringan", points=5, school_id=school.id),
+    ])
+    db.session.commit()
+    return Student.query.filter_by(nis="1001").one()
+
+def _remove_photo_files(app, photo):
+    # Worker gambar menulis ke folder uploads aplikasi yang sebenarnya
+    upload_folder = os.path.join(app.root_path, 'static', 'uploads')
+    for name in {photo.filename, photo.thumb_filename, photo.medium_filename} - {None}:
+        path = os.path.join(upload_folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def test_batch_ingest_is_idempotent(school_client, school):
+    budi = _setup(school)
+    batch = {'violations': [
+        {'client_key': 'hp1-1', 'student_id': budi.id, 'description': 'Terlambat', 'kategori': 'Ringan',
+         'date_posted': '2024-03-01T07:15:00'},
+        {'client_key': 'hp1-2', 'nis': '1002', 'description': 'Tidak memakai dasi', 'kategori': 'Ringan'},
+        {'client_key': 'hp1-3', 'nis': '9999', 'description': 'Siswa salah'},
+        {'client_key': 'hp1-1', 'nis': '1002', 'description': 'Kunci ganda'},
+    ]}
+    data = school_client.post('/api/violations/batch', json=batch).get_json()
+    assert data['created'] == 2
+    assert [r['status'] for r in data['results']] == ['created', 'created', 'error', 'error']
+    assert db.session.get(Violation, data['results'][0]['id']).date_posted.hour == 7
+
+    # Kirim ulang setelah koneksi putus: tidak ada data ganda, id lama dikembalikan
+    again = school_client.post('/api/violations/batch', json=batch).get_json()
+    assert again['created'] == 0
+    assert [r['status'] for r in again['results'][:2]] == ['duplicate', 'duplicate']
+    assert again['results'][0]['id'] == data['results'][0]['id']
+
+    # Penghitung, poin, dan rekap harian tetap sesuai walau ditulis lewat bulk insert
+    db.session.expire_all()
+    assert Violation.query.count() == 2
+    assert db.session.get(SchoolStats, school.id).violations == 2
+    assert db.session.get(Student, budi.id).poin == 5
+    assert reconcile_school_stats() == [] and check_student_points() == []
+
+def test_batch_ingest_attaches_uploaded_photos(school_client, school, app, tmp_path):
+    app.config['RAW_UPLOAD_FOLDER'] = str(tmp_path)
+    budi = _setup(school)
+    buf = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(buf, format='PNG')
+    buf.seek(0)
+    upload = school_client.post('/api/uploads', data={'file': (buf, 'bukti.png')}, content_type='multipart/form-data')
+    assert upload.status_code == 201
+    token = upload.get_json()['token']
+
+    data = school_client.post('/api/violations/batch', json={'violations': [
+        {'client_key': 'a', 'student_id': budi.id, 'description': 'Merokok', 'photos': [token]},
+        {'client_key': 'b', 'student_id': budi.id, 'description': 'Token dipakai lagi', 'photos': [token]},
+        {'client_key': 'c', 'student_id': budi.id, 'description': 'Token palsu', 'photos': ['palsu']},
+    ]}).get_json()
+    assert [r['status'] for r in data['results']] == ['created', 'error', 'error']
+    wait_for_images(timeout=10)
+    db.session.expire_all()
+    photo = ViolationPhoto.query.one()
+    try:
+        assert photo.status == 'ready'
+    finally:
+        _remove_photo_files(app, photo)
+
+def test_batch_ingest_rejects_bad_payload(school_client, school):
+    assert school_client.post('/api/violations/batch', json={'items': []}).status_code == 400
+    too_many = {'violations': [{'client_key': str(i)} for i in range(201)]}
+    assert school_client.post('/api/violations/batch', json=too_many).status_code == 400
+
+def test_batch_ingest_rejects_reused_upload_token(school_client, school, app, tmp_path):
+    app.config['RAW_UPLOAD_FOLDER'] = str(tmp_path)
+    budi = _setup(school)
+    buf = io.BytesIO()
+    Image.new('RGB', (300, 200), 'blue').save(buf, format='PNG')
+    buf.seek(0)
+    token = school_client.post('/api/uploads', data={'file': (buf, 'bukti.png')},
+                               content_type='multipart/form-data').get_json()['token']
+    first = school_client.post('/api/violations/batch', json={'violations': [
+        {'client_key': 'a', 'student_id': budi.id, 'description': 'Merokok', 'photos': [token]},
+    ]}).get_json()
+    assert first['created'] == 1
+    wait_for_images(timeout=10)
+    db.session.expire_all()
+    photo = ViolationPhoto.query.one()
+    try:
+        # File mentah masih ada (mis. kompresi belum jalan), tetapi token sudah tercatat dipakai
+        (tmp_path / photo.raw_filename).write_bytes(b'mentah')
+        again = school_client.post('/api/violations/batch', json={'violations': [
+            {'client_key': 'b', 'student_id': budi.id, 'description': 'Token lama', 'photos': [token]},
+        ]}).get_json()
+        assert again['results'][0]['status'] == 'error'
+        assert ViolationPhoto.query.count() == 1
+    finally:
+        _remove_photo_files(app, photo)
+
+def test_batch_ingest_validates_item_fields(school_client, school):
+    budi = _setup(school)
+    data = school_client.post('/api/violations/batch', json={'violations': [
+        {'client_key': 'k1', 'student_id': budi.id, 'description': 'Kategori daftar', 'kategori': ['Ringan']},
+        {'client_key': 'k2', 'student_id': budi.id, 'description': 'Kategori objek', 'kategori': {'a': 1}},
+        {'client_key': 'k3', 'student_id': budi.id, 'description': 'Pasal panjang', 'pasal': 'x' * 256},
+        {'client_key': 'k4', 'student_id': budi.id, 'description': 'Pencatat panjang', 'di_input_oleh': 'x' * 101},
+        {'client_key': 'k5', 'student_id': budi.id, 'description': 'Terlalu banyak foto', 'photos': ['t'] * 11},
+        {'client_key': 'k6', 'student_id': budi.id, 'description': 'Kategori hilang', 'kategori_id': 999},
+        {'client_key': 'k7', 'student_id': budi.id, 'description': 'Zona waktu', 'kategori': 'Ringan',
+         'date_posted': '2024-03-01T14:15:00+07:00'},
+    ]})
+    assert data.status_code == 200
+    results = data.get_json()['results']
+    assert [r['status'] for r in results] == ['error'] * 6 + ['created']
+    assert 'Maksimal 10 foto' in results[4]['error']
+    assert 'Kategori' in results[5]['error']
+    assert db.session.get(Violation, results[6]['id']).date_posted.hour == 7
@@ -0,0 +1,73 @@
+import os
+import json
+import time
+
+from my_app.metrics import Counter, Histogram, snapshot, write_snapshot, aggregate, render_text, JOB_SECONDS
+
+def test_metrics_endpoint_exposes_request_histogram(school_client):
+    school_client.get('/classes')
+    response = school_client.get('/metrics')
+    assert response.status_code == 200
+    body = response.data.decode()
+    assert '# TYPE tanse_http_request_duration_seconds histogram' in body
+    assert 'tanse_http_request_duration_seconds_bucket{endpoint="main.manage_classes",le="+Inf"}' in body
+    assert 'tanse_http_requests_total{endpoint="main.manage_classes",method="GET",status="200"}' in body
+    assert 'tanse_db_pool_checkouts_total' in body
+
+def test_metrics_token(app, client):
+    app.config['METRICS_TOKEN'] = 'rahasia'
+    try:
+        assert client.get('/metrics').status_code == 403
+        assert client.get('/metrics', headers={'Authorization': 'Bearer rahasia'}).status_code == 200
+    finally:
+        app.config['METRICS_TOKEN'] = None
+
+def test_aggregate_sums_workers_and_drops_dead_gauges(tmp_path):
+    counter = Counter('tanse_test_total', 'Counter uji.', ('kind',))
+    hist = Histogram('tanse_test_seconds', 'Histogram uji.', buckets=(0.1, 1.0))
+    counter.inc(2, kind='a')
+    hist.observe(0.05)
+    hist.observe(5)
+    write_snapshot(str(tmp_path))
+
+    # Snapshot worker lain yang sudah berhenti: counter tetap dijumlahkan, gauge dibuang
+    other = snapshot()
+    other['tanse_test_total']['samples'] = [[['a'], 3]]
+    other['tanse_test_seconds']['samples'] = [[[], [1, 0, 0, 0.02]]]
+    other['tanse_db_pool_size']['samples'] = [[[], 99]]
+    with open(os.path.join(tmp_path, '999999999.json'), 'w') as f:
+        json.dump(other, f)
+
+    merged = aggregate(str(tmp_path))
+    assert merged['tanse_test_total']['samples'][('a',)] == 5
+    text = render_text(merged)
+    assert 'tanse_test_seconds_bucket{le="0.1"} 2' in text
+    assert 'tanse_test_seconds_bucket{le="+Inf"} 3' in text
+    assert 'tanse_test_seconds_count 3' in text
+    assert 'tanse_db_pool_size 99' not in text
+
+def test_metrics_without_token_only_serves_localhost(client):
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.0.0.5'}).status_code == 403
+    # Lewat reverse proxy di mesin yang sama: alamatnya localhost tetapi tetap ditolak
+    assert client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 403
+
+def test_aggregate_prunes_stale_dead_workers(tmp_path):
+    Counter('tanse_prune_total', 'Counter uji.').inc(1)
+    write_snapshot(str(tmp_path))
+    dead = os.path.join(tmp_path, '999999998.json')
+    with open(dead, 'w') as f:
+        json.dump(snapshot(), f)
+    old = time.time() - 3600
+    os.utime(dead, (old, old))
+
+    assert aggregate(str(tmp_path), dead_worker_ttl=4000)['tanse_prune_total']['samples'][()] == 2
+    assert aggregate(str(tmp_path), dead_worker_ttl=60)['tanse_prune_total']['samples'][()] == 1
+    assert not os.path.exists(dead)
+
+def test_stream_backup_records_duration(school_client):
+    before = JOB_SECONDS.values.get(('backup_stream', 'done'), [0])[-1]
+    response = school_client.get('/settings/backup?mode=stream')
+    assert response.status_code == 200 and response.data[:2] == b'PK'
+    sample = JOB_SECONDS.values[('backup_stream', 'done')]
+    assert sum(sample[:-1]) >= 1 and sample[-1] >= before
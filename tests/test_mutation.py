@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from my_app.extensions import db
+from my_app.models import School, Student, Classroom, Violation
+from my_app.profiler import count_queries
+
+def _classes(school, *names):
+    classes = [Classroom(name=name, school_id=school.id) for name in names]
+    db.session.add_all(classes)
+    db.session.commit()
+    return classes
+
+def test_transfer_is_single_tenant_checked_update(school_client, school):
+    source = Classroom.query.filter_by(school_id=school.id).first()
+    target, = _classes(school, "X-2")
+    other_school = School(name="Sekolah Lain")
+    db.session.add(other_school)
+    db.session.flush()
+    outsider = Student(name="Luar", nis="9", school_id=other_school.id)
+    students = [Student(name=f"Siswa {i}", nis=str(i), school_id=school.id, classroom_id=source.id) for i in range(5)]
+    db.session.add_all(students + [outsider])
+    db.session.commit()
+
+    ids = [s.id for s in students] + [outsider.id]
+    with count_queries() as profile:
+        response = school_client.post(f'/classes/{source.id}', data={
+            'mutate_students': '1', 'target_class_id': target.id, 'selected_students': ids,
+        }, follow_redirects=True)
+    assert 'Mutasi berhasil: 5 siswa dipindahkan.' in response.get_data(as_text=True)
+    assert sum(sql.startswith('UPDATE students') for _, sql in profile.statements) == 1
+    db.session.expire_all()
+    assert Student.query.filter_by(classroom_id=target.id).count() == 5
+    assert db.session.get(Student, outsider.id).classroom_id is None
+
+def test_promote_all_classes(school_client, school):
+    x = Classroom.query.filter_by(school_id=school.id).first()
+    xi, xii = _classes(school, "XI-1", "XII-1")
+    db.session.add_all([
+        Student(name="A", nis="1", school_id=school.id, classroom_id=x.id),
+        Student(name="B", nis="2", school_id=school.id, classroom_id=xi.id),
+        Student(name="C", nis="3", school_id=school.id, classroom_id=xii.id),
+    ])
+    db.session.commit()
+
+    response = school_client.post('/classes/promote', data={
+        f'target_{x.id}': xi.id, f'target_{xi.id}': xii.id, f'target_{xii.id}': 'lulus',
+    }, follow_redirects=True)
+    assert '3 siswa dipindahkan' in response.get_data(as_text=True)
+    db.session.expire_all()
+    # X -> XI dan XI -> XII dalam satu UPDATE tidak saling menimpa
+    assert {s.nis: s.classroom_id for s in Student.query} == {"1": xi.id, "2": xii.id, "3": None}
+
+    other = School(name="Sekolah Lain")
+    db.session.add(other)
+    db.session.commit()
+    foreign, = _classes(other, "X-9")
+    response = school_client.post('/classes/promote', data={f'target_{xi.id}': foreign.id}, follow_redirects=True)
+    assert 'tidak valid' in response.get_data(as_text=True)
+    assert Student.query.filter_by(classroom_id=foreign.id).count() == 0
+
+def test_promote_refreshes_cached_statistics(school_client, school):
+    x = Classroom.query.filter_by(school_id=school.id).first()
+    xi, = _classes(school, "XI-7")
+    student = Student(name="Dewi", nis="10", school_id=school.id, classroom_id=x.id)
+    db.session.add(student)
+    db.session.commit()
+    db.session.add(Violation(description="Terlambat", points=5, student_id=student.id, date_posted=datetime.utcnow()))
+    db.session.commit()
+    assert "XI-7" not in school_client.get('/statistics').get_data(as_text=True)
+
+    school_client.post('/classes/promote', data={f'target_{x.id}': xi.id})
+    assert "XI-7" in school_client.get('/statistics').get_data(as_text=True)
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+from my_app.models import Student, Violation
+from my_app.extensions import db
+from my_app.pagination import keyset_paginate
+
+def _seed(school, n=25):
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    base = datetime(2024, 1, 1)
+    # Beberapa pelanggaran berbagi tanggal yang sama agar id ikut menentukan urutan
+    db.session.add_all([Violation(description=f"V{i}", points=1, student_id=student.id, date_posted=base + timedelta(days=i // 3))
+                        for i in range(n)])
+    db.session.commit()
+    return [v.id for v in Violation.query.order_by(Violation.date_posted.desc(), Violation.id.desc())]
+
+def test_keyset_pages_walk_forward_and_back(school):
+    expected = _seed(school)
+    query = Violation.query
+    pages, cursor = [], None
+    while True:
+        page = keyset_paginate(query, Violation.date_posted, Violation.id, cursor, per_page=10)
+        pages.append(page)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert [[v.id for v in p.items] for p in pages] == [expected[:10], expected[10:20], expected[20:]]
+    assert not pages[0].has_prev and pages[-1].has_prev
+
+    back = keyset_paginate(query, Violation.date_posted, Violation.id, pages[-1].prev_cursor, per_page=10)
+    assert [v.id for v in back.items] == expected[10:20]
+    assert back.has_prev and back.has_next
+
+    first = keyset_paginate(query, Violation.date_posted, Violation.id, 'bukan-token', per_page=10)
+    assert [v.id for v in first.items] == expected[:10]
+
+def test_home_feed_uses_cursor_links(school_client, school):
+    _seed(school)
+    page = school_client.get('/').data.decode()
+    assert 'cursor=' in page and 'page=' not in page
@@ -0,0 +1,67 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from my_app.models import Student, Violation
+from my_app.extensions import db
+from my_app.profiler import init_profiler, query_budget, count_queries, check_query_budget
+
+def _seed(school, n=5):
+    for i in range(n):
+        student = Student(name=f"Siswa {i}", nis=f"20{i}", school_id=school.id, classroom_id=school.classrooms[0].id)
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(Violation(description="Terlambat", points=5, student_id=student.id))
+    db.session.commit()
+
+def test_pages_stay_within_query_budget(school_client, school):
+    _seed(school)
+    classroom_id = school.classrooms[0].id
+    student_id = Student.query.first().id
+    for url in ('/', '/classes', f'/classes/{classroom_id}', f'/student/{student_id}', '/statistics', '/settings'):
+        assert check_query_budget(school_client, url).status_code == 200
+
+def test_check_query_budget_reports_statements(school_client, school):
+    _seed(school)
+    with pytest.raises(AssertionError, match="batas 1"):
+        check_query_budget(school_client, '/', budget=1)
+
+def test_profiler_headers():
+    engine = create_engine("sqlite:///:memory:")
+    app = Flask(__name__)
+    app.config.update(PROFILER_ENABLED=True, PROFILER_LOG=False)
+
+    @app.route("/dua")
+    @query_budget(1)
+    def dua():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        return "ok"
+
+    init_profiler(app)
+    with count_queries() as profile:
+        response = app.test_client().get("/dua")
+    assert profile.count == 2
+    assert response.headers['X-Query-Count'] == '2'
+    assert response.headers['X-Query-Budget'] == '1'
+    assert 'X-DB-Time-ms' in response.headers and 'X-Render-Time-ms' in response.headers
+
+def test_listeners_only_while_counting_and_failed_statements_cleaned_up():
+    """Listener engine hanya terpasang selama count_queries; statement gagal tidak meninggalkan waktu mulai."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from my_app.profiler import _before_cursor_execute
+
+    engine = create_engine("sqlite:///:memory:")
+    # init_profiler dengan PROFILER_ENABLED (test lain) memasang listener secara permanen
+    installed = event.contains(Engine, 'before_cursor_execute', _before_cursor_execute)
+    with engine.connect() as conn:
+        with count_queries() as profile:
+            assert event.contains(Engine, 'before_cursor_execute', _before_cursor_execute)
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM tabel_tidak_ada"))
+            conn.execute(text("SELECT 1"))
+        assert conn.info.get('query_start') == []
+    assert profile.count == 1
+    assert event.contains(Engine, 'before_cursor_execute', _before_cursor_execute) == installed
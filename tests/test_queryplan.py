@@ -0,0 +1,19 @@
+from sqlalchemy import text
+
+from my_app.extensions import db
+from my_app.seed import seed_data
+from my_app.queryplan import HOT_QUERIES, check_plans
+
+def test_hot_queries_use_indexes(app, tmp_path):
+    # Cukup besar agar planner (setelah ANALYZE) tidak memilih scan untuk tabel kecil
+    seed_data(schools=2, classes=4, students=25, violations=3.0, photo_ratio=0, upload_folder=str(tmp_path), seed=3)
+    report = check_plans()
+    assert len(report) == len(HOT_QUERIES)
+    assert [(name, problems) for name, _, problems in report if problems] == []
+
+def test_dropped_index_is_reported(app, tmp_path):
+    seed_data(schools=1, classes=2, students=10, violations=3.0, photo_ratio=0, upload_folder=str(tmp_path), seed=3)
+    db.session.execute(text('DROP INDEX ix_violations_school_date'))
+    report = {name: problems for name, _, problems in check_plans(names=['feed_first_page', 'restore_existing_violations'])}
+    assert 'temp_sort' in report['feed_first_page'] or 'scan:violations' in report['feed_first_page']
+    assert report['restore_existing_violations'] == ['scan:violations']
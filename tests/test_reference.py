@@ -0,0 +1,57 @@
+from my_app.extensions import db
+from my_app.models import Student, Violation, ViolationCategory
+from my_app.profiler import count_queries
+from my_app.cache import invalidate_reference
+
+def test_add_violation_form_uses_reference_cache(school_client, school):
+    db.session.add(ViolationCategory(name="Ringan", points=5, school_id=school.id))
+    db.session.commit()
+    invalidate_reference(school.id)  # ditambah langsung lewat ORM, bukan lewat rute pengaturan
+    school_client.get('/add_violation')
+    with count_queries() as profile:
+        page = school_client.get('/add_violation').get_data(as_text=True)
+    assert "Ringan" in page and "X-1" in page and "admin_sekolah" in page
+    # Hanya query memuat user yang login; kelas, pasal, kategori, dan anggota dari cache
+    assert profile.count <= 1, [sql for _, sql in profile.statements]
+
+def test_settings_changes_invalidate_reference(school_client, school):
+    assert "Sangat Berat" not in school_client.get('/settings').get_data(as_text=True)
+    school_client.post('/settings/categories', data={'action': 'add', 'name': 'Sangat Berat', 'points': 50})
+    assert "Sangat Berat" in school_client.get('/add_violation').get_data(as_text=True)
+
+    school_client.post('/classes', data={'class_name': 'XII-9'})
+    assert "XII-9" in school_client.get('/add_violation').get_data(as_text=True)
+
+    school_client.post('/settings/add_member', data={'username': 'guru_bk', 'password': 'x', 'full_name': 'Guru BK'})
+    assert "Guru BK" in school_client.get('/add_violation').get_data(as_text=True)
+
+def test_add_violation_ignores_other_school_category(school_client, school):
+    from my_app.models import School
+    other = School(name="Sekolah Lain")
+    db.session.add(other)
+    db.session.flush()
+    foreign = ViolationCategory(name="Asing", points=99, school_id=other.id)
+    student = Student(name="Budi", nis="1", school_id=school.id)
+    db.session.add_all([foreign, student])
+    db.session.commit()
+    response = school_client.post('/add_violation', data={
+        'student_id': student.id, 'deskripsi': 'Terlambat', 'kategori_id': foreign.id, 'tanggal_kejadian': '01/02/2024',
+    })
+    # Tidak dicatat sebagai "Umum" dengan 0 poin, tetapi ditolak
+    assert 'Kategori pelanggaran tidak ditemukan' in response.get_data(as_text=True)
+    assert Violation.query.count() == 0
+
+def test_add_violation_finds_category_missing_from_cache(school_client, school):
+    student = Student(name="Budi", nis="1", school_id=school.id)
+    db.session.add(student)
+    db.session.commit()
+    school_client.get('/add_violation')  # cache referensi terisi tanpa kategori
+    # Kategori dibuat oleh proses lain tanpa invalidasi yang terlihat di sini
+    category = ViolationCategory(name="Berat", points=50, school_id=school.id)
+    db.session.add(category)
+    db.session.commit()
+    school_client.post('/add_violation', data={
+        'student_id': student.id, 'deskripsi': 'Berkelahi', 'kategori_id': category.id, 'tanggal_kejadian': '01/02/2024',
+    })
+    violation = Violation.query.one()
+    assert (violation.points, violation.kategori_pelanggaran) == (50, "Berat")
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from my_app.extensions import db
+from my_app.models import Student, Violation, Classroom
+from my_app.stats import check_student_points
+
+def _seed(school):
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    a = Student(name="A", nis="1", school_id=school.id, classroom_id=classroom.id)
+    b = Student(name="B", nis="2", school_id=school.id)
+    db.session.add_all([a, b])
+    db.session.flush()
+    db.session.add_all([
+        Violation(description="Terlambat", points=5, student_id=a.id, kategori_pelanggaran="Ringan", date_posted=datetime(2024, 1, 10)),
+        Violation(description="Atribut", points=5, student_id=a.id, kategori_pelanggaran="Ringan", date_posted=datetime(2024, 2, 10)),
+        Violation(description="Berkelahi", points=50, student_id=a.id, kategori_pelanggaran="Berat", date_posted=datetime(2024, 1, 12)),
+        Violation(description="Terlambat", points=5, student_id=b.id, kategori_pelanggaran="Ringan", date_posted=datetime(2024, 1, 15)),
+    ])
+    db.session.commit()
+    return a, b
+
+def test_bulk_remission_by_category_and_date(school_client, school):
+    a, b = _seed(school)
+    response = school_client.post('/violations/remit_bulk', data={
+        'category': 'Ringan', 'start_date': '2024-01-01', 'end_date': '2024-01-31', 'remission_reason': 'Akhir semester',
+    }, headers={'Accept': 'application/json'})
+    assert response.get_json() == {'violations': 2, 'students': 2, 'points': 10}
+
+    db.session.expire_all()
+    assert db.session.get(Student, a.id).poin == 55 and db.session.get(Student, b.id).poin == 0
+    remitted = Violation.query.filter_by(is_remitted=True).all()
+    assert {v.remission_reason for v in remitted} == {'Akhir semester'} and all(v.remission_date for v in remitted)
+    assert check_student_points() == []
+
+    # Yang sudah diremisi tidak dihitung dua kali; filter kelas hanya mengenai siswa di kelas itu
+    response = school_client.post('/violations/remit_bulk', data={
+        'class_id': a.classroom_id, 'remission_reason': 'Kelas X-1',
+    }, headers={'Accept': 'application/json'})
+    assert response.get_json() == {'violations': 2, 'students': 1, 'points': 55}
+    db.session.expire_all()
+    assert db.session.get(Student, a.id).poin == 0
+    assert check_student_points() == []
+
+def test_bulk_remission_requires_filter_and_reason(school_client, school):
+    _seed(school)
+    headers = {'Accept': 'application/json'}
+    assert school_client.post('/violations/remit_bulk', data={'remission_reason': 'Semua'}, headers=headers).status_code == 400
+    assert school_client.post('/violations/remit_bulk', data={'category': 'Ringan'}, headers=headers).status_code == 400
+    ids = [v.id for v in Violation.query.filter_by(kategori_pelanggaran="Berat")]
+    response = school_client.post('/violations/remit_bulk', data={'violation_ids': ids, 'remission_reason': 'Banding'},
+                                  follow_redirects=True)
+    assert 'Remisi massal berhasil: 1 pelanggaran' in response.get_data(as_text=True)
+    assert Violation.query.filter_by(is_remitted=True).count() == 1
@@ -0,0 +1,158 @@
+from sqlalchemy import inspect, text
+
+from my_app.models import Student, Violation, ViolationPhoto, PhotoBlob, Classroom, SchoolStats, ViolationDailyRollup
+from my_app.extensions import db
+from my_app.schema import backfill_photo_blobs
+from my_app.search import student_search_ids
+
+def test_upgrade_schema_backfills_violation_school(app, school):
+    """Database lama tanpa violations.school_id diperbarui: kolom ditambah, diisi, dan indeks dibuat."""
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.commit()
+    with db.engine.begin() as conn:
+        # Bentuk tabel violations sebelum kolom school_id ada
+        conn.execute(text('DROP TABLE violations'))
+        conn.execute(text('CREATE TABLE violations (id INTEGER PRIMARY KEY, description VARCHAR(2000) NOT NULL, '
+                          'points INTEGER NOT NULL, date_posted DATETIME NOT NULL, student_id INTEGER NOT NULL, '
+                          'pasal VARCHAR(255), kategori_pelanggaran VARCHAR(50), di_input_oleh VARCHAR(100), '
+                          'is_remitted BOOLEAN, remission_reason VARCHAR(255), remission_date DATETIME)'))
+        conn.execute(text("INSERT INTO violations (description, points, date_posted, student_id) "
+                          "VALUES ('Terlambat', 5, '2024-01-01 07:00:00', :sid)"), {'sid': student.id})
+
+    result = app.test_cli_runner().invoke(args=['upgrade-schema'])
+    assert result.exit_code == 0, result.output
+    assert '1 pelanggaran diisi school_id' in result.output
+
+    index_names = {ix['name'] for ix in inspect(db.engine).get_indexes('violations')}
+    assert {'ix_violations_school_date', 'ix_violations_school_category', 'ix_violations_school_client_key'} <= index_names
+    db.session.expire_all()
+    assert Violation.query.one().school_id == school.id
+
+def test_backfill_photo_blobs_hashes_legacy_files(app, school, tmp_path):
+    """Foto lama tanpa blob_hash dipindah ke penyimpanan per-hash; isi yang sama memakai satu blob."""
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    violation = Violation(description="Terlambat", points=5, student_id=student.id)
+    db.session.add(violation)
+    db.session.flush()
+    for name in ('lama_1.jpg', 'lama_2.jpg'):
+        (tmp_path / name).write_bytes(b'isi foto yang sama')
+    db.session.add_all([ViolationPhoto(violation_id=violation.id, filename=name)
+                        for name in ('lama_1.jpg', 'lama_2.jpg', 'hilang.jpg')])
+    db.session.commit()
+
+    assert backfill_photo_blobs(str(tmp_path)) == (2, 1)
+    blob = PhotoBlob.query.one()
+    assert blob.refcount == 2
+    photos = ViolationPhoto.query.filter(ViolationPhoto.blob_hash.isnot(None)).all()
+    assert {p.filename for p in photos} == {blob.filename}
+    assert (tmp_path / blob.filename).read_bytes() == b'isi foto yang sama'
+    # Dijalankan ulang tidak mengubah apa pun
+    assert backfill_photo_blobs(str(tmp_path)) == (0, 1)
+
+def test_upgrade_schema_indexes_student_names(app, school):
+    """Siswa lama dengan name_search kosong diindeks oleh upgrade-schema sehingga bisa dicari."""
+    db.session.add(Student(name="Siti Aisyah", nis="1001", school_id=school.id))
+    db.session.commit()
+    with db.engine.begin() as conn:
+        conn.execute(text('UPDATE students SET name_search = NULL'))
+        conn.execute(text('DELETE FROM student_name_grams'))
+
+    result = app.test_cli_runner().invoke(args=['upgrade-schema'])
+    assert result.exit_code == 0, result.output
+    assert '1 nama siswa diindeks' in result.output
+    db.session.expire_all()
+    assert Student.query.one().name_search == 'siti aisyah'
+    assert len(db.session.scalars(student_search_ids(school.id, 'aisyah')).all()) == 1
+
+# Skema tabel sebelum seri perubahan ini (commit baseline)
+BASELINE_SCHEMA = [
+    'CREATE TABLE schools (id INTEGER PRIMARY KEY, name VARCHAR(150) NOT NULL UNIQUE, address VARCHAR(255), '
+    'logo VARCHAR(255), created_at DATETIME)',
+    'CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(150) NOT NULL UNIQUE, password VARCHAR(255) NOT NULL, '
+    'full_name VARCHAR(150), role VARCHAR(20) NOT NULL, school_id INTEGER REFERENCES schools (id))',
+    'CREATE TABLE classrooms (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL, school_id INTEGER NOT NULL REFERENCES schools (id))',
+    'CREATE TABLE students (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, nis VARCHAR(20) NOT NULL, '
+    'classroom_id INTEGER REFERENCES classrooms (id), rombel VARCHAR(50), poin INTEGER, '
+    'school_id INTEGER NOT NULL REFERENCES schools (id))',
+    'CREATE INDEX ix_students_classroom_id ON students (classroom_id)',
+    'CREATE INDEX ix_students_school_id ON students (school_id)',
+    'CREATE TABLE violation_rules (id INTEGER PRIMARY KEY, code VARCHAR(50) NOT NULL, description VARCHAR(500) NOT NULL, '
+    'school_id INTEGER NOT NULL REFERENCES schools (id))',
+    'CREATE TABLE violation_categories (id INTEGER PRIMARY KEY, name VARCHAR(50) NOT NULL, points INTEGER NOT NULL, '
+    'school_id INTEGER NOT NULL REFERENCES schools (id))',
+    'CREATE TABLE violations (id INTEGER PRIMARY KEY, description VARCHAR(2000) NOT NULL, points INTEGER NOT NULL, '
+    'date_posted DATETIME NOT NULL, student_id INTEGER NOT NULL REFERENCES students (id), pasal VARCHAR(255), '
+    'kategori_pelanggaran VARCHAR(50), di_input_oleh VARCHAR(100), is_remitted BOOLEAN, remission_reason VARCHAR(255), '
+    'remission_date DATETIME)',
+    'CREATE INDEX ix_violations_student_id ON violations (student_id)',
+    'CREATE INDEX ix_violations_kategori_pelanggaran ON violations (kategori_pelanggaran)',
+    'CREATE TABLE violation_photos (id INTEGER PRIMARY KEY, filename VARCHAR(255) NOT NULL, '
+    'violation_id INTEGER NOT NULL REFERENCES violations (id))',
+]
+
+def test_upgrade_schema_from_baseline(app):
+    """Database dengan skema baseline diperbarui seluruhnya, dan perintahnya aman dijalankan ulang."""
+    db.session.remove()
+    db.drop_all()
+    with db.engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (1, 'Sekolah Lama')"))
+        conn.execute(text("INSERT INTO classrooms (id, name, school_id) VALUES (1, 'X-1', 1)"))
+        conn.execute(text("INSERT INTO students (id, name, nis, classroom_id, poin, school_id) VALUES (1, 'Budi Santoso', '1001', 1, 100, 1)"))
+        conn.execute(text("INSERT INTO students (id, name, nis, poin, school_id) VALUES (2, 'Siti', '1002', NULL, 1)"))
+        conn.execute(text("INSERT INTO violations (id, description, points, date_posted, student_id, kategori_pelanggaran, is_remitted) "
+                          "VALUES (1, 'Terlambat', 5, '2024-01-01 07:00:00', 1, 'Ringan', 0), "
+                          "(2, 'Berkelahi', 50, '2024-01-02 09:00:00', 1, 'Berat', 1)"))
+        conn.execute(text("INSERT INTO violation_photos (id, filename, violation_id) VALUES (1, 'hilang.jpg', 1)"))
+
+    result = app.test_cli_runner().invoke(args=['upgrade-schema'])
+    assert result.exit_code == 0, result.output
+
+    inspector = inspect(db.engine)
+    columns = {table: {c['name'] for c in inspector.get_columns(table)} for table in ('students', 'violations', 'violation_photos')}
+    for model in (Student, Violation, ViolationPhoto):
+        assert set(model.__table__.columns.keys()) <= columns[model.__tablename__]
+    for model in (Student, Violation, ViolationPhoto, Classroom):
+        indexes = {ix['name'] for ix in inspector.get_indexes(model.__tablename__)}
+        assert {ix.name for ix in model.__table__.indexes} <= indexes
+
+    # Data lama terbaca lewat ORM dan nilai turunannya terisi
+    db.session.expire_all()
+    budi = db.session.get(Student, 1)
+    assert (budi.poin, db.session.get(Student, 2).poin) == (5, 0)
+    assert db.session.scalars(student_search_ids(1, 'santoso')).all() == [1]
+    assert {v.school_id for v in Violation.query} == {1}
+    assert ViolationPhoto.query.one().status == 'ready'
+    assert db.session.get(SchoolStats, 1).violations == 2
+    assert ViolationDailyRollup.query.count() == 2
+
+    again = app.test_cli_runner().invoke(args=['upgrade-schema'])
+    assert again.exit_code == 0, again.output
+    assert 'Kolom' not in again.output and 'Indeks dibuat: -' in again.output
+
+def test_upgrade_schema_reports_and_deletes_orphaned_violations(app):
+    """Pelanggaran yang siswanya sudah dihapus dilaporkan, dan hanya dihapus jika diminta."""
+    db.session.remove()
+    db.drop_all()
+    with db.engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text("INSERT INTO schools (id, name) VALUES (1, 'Sekolah Lama')"))
+        conn.execute(text("INSERT INTO violations (id, description, points, date_posted, student_id, is_remitted) "
+                          "VALUES (50, 'Siswa sudah dihapus', 5, '2024-01-01 07:00:00', 999, 0)"))
+        conn.execute(text("INSERT INTO violation_photos (filename, violation_id) VALUES ('lama.jpg', 50)"))
+
+    result = app.test_cli_runner().invoke(args=['upgrade-schema'])
+    assert result.exit_code == 0, result.output
+    assert 'Peringatan: 1 pelanggaran tidak punya siswa' in result.output and 'id: 50' in result.output
+    assert db.session.get(Violation, 50) is not None
+
+    result = app.test_cli_runner().invoke(args=['upgrade-schema', '--delete-orphans'])
+    assert result.exit_code == 0, result.output
+    assert '1 pelanggaran tanpa siswa dihapus' in result.output
+    db.session.expire_all()
+    assert db.session.get(Violation, 50) is None and ViolationPhoto.query.count() == 0
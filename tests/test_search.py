@@ -0,0 +1,42 @@
+from my_app.models import Student, Violation, StudentNameGram
+from my_app.extensions import db
+from my_app.search import student_search_ids, reindex_student_names
+
+def _names(school_id, text):
+    ids = student_search_ids(school_id, text)
+    return sorted(name for name, in db.session.query(Student.name).filter(Student.id.in_(ids)))
+
+def test_name_search_ignores_case_and_accents(school):
+    db.session.add_all([Student(name=name, nis=str(i), school_id=school.id)
+                        for i, name in enumerate(["Nur'Aini Zahrá", "Budi Santoso", "Ahmad Budiman", "Siti Aisyah"])])
+    db.session.commit()
+
+    assert _names(school.id, "budi") == ["Ahmad Budiman", "Budi Santoso"]
+    assert _names(school.id, "ZAHRA") == ["Nur'Aini Zahrá"]
+    assert _names(school.id, "nur aini") == ["Nur'Aini Zahrá"]
+    assert _names(school.id, "ah") == ["Ahmad Budiman", "Nur'Aini Zahrá", "Siti Aisyah"]
+    assert _names(school.id, "tos") == ["Budi Santoso"]
+    assert student_search_ids(school.id, "  ") is None
+
+    budi = Student.query.filter_by(name="Budi Santoso").one()
+    budi.name = "Bagus Santoso"
+    db.session.commit()
+    assert _names(school.id, "budi") == ["Ahmad Budiman"]
+
+    StudentNameGram.query.delete()
+    db.session.commit()
+    assert reindex_student_names() == 4
+    assert _names(school.id, "santo") == ["Bagus Santoso"]
+
+def test_home_search_uses_name_index(school_client, school):
+    student = Student(name="Dewi Lestari", nis="1", school_id=school.id)
+    other = Student(name="Eko Prasetyo", nis="2", school_id=school.id)
+    db.session.add_all([student, other])
+    db.session.flush()
+    db.session.add_all([Violation(description="Terlambat upacara", points=5, student_id=student.id),
+                        Violation(description="Tidak memakai dasi", points=5, student_id=other.id)])
+    db.session.commit()
+
+    page = school_client.get('/?search=LESTARI').data
+    assert b'Terlambat upacara' in page
+    assert b'Tidak memakai dasi' not in page
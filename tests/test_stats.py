@@ -0,0 +1,126 @@
+from my_app.models import Student, Classroom, Violation, SchoolStats
+from my_app.extensions import db
+from my_app.stats import reconcile_school_stats
+
+def _counters(school_id):
+    db.session.expire_all()
+    stats = db.session.get(SchoolStats, school_id)
+    return stats.students, stats.violations, stats.classrooms
+
+def test_school_stats_follow_inserts_and_deletes(school_client, school):
+    """Penghitung dashboard ikut berubah saat siswa, pelanggaran, dan kelas ditambah atau dihapus."""
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    students = [Student(name=f"Siswa {i}", nis=f"30{i}", classroom_id=classroom.id, school_id=school.id) for i in range(3)]
+    db.session.add_all(students)
+    db.session.add(Classroom(name="X-2", school_id=school.id))
+    db.session.commit()
+    db.session.add_all([Violation(description="Terlambat", points=5, student_id=s.id) for s in students[:2]])
+    db.session.commit()
+    assert _counters(school.id) == (3, 2, 2)
+
+    school_client.post(f'/violation/delete/{Violation.query.first().id}')
+    school_client.post(f'/student/delete/{students[2].id}')
+    assert _counters(school.id) == (2, 1, 2)
+
+    response = school_client.get('/')
+    assert response.status_code == 200
+
+def test_reconcile_stats_repairs_drift(school):
+    """reconcile-stats menghitung ulang penghitung yang melenceng (misalnya setelah impor SQL manual)."""
+    db.session.add(Student(name="Budi", nis="1001", school_id=school.id))
+    db.session.commit()
+    stats = db.session.get(SchoolStats, school.id)
+    stats.students = 99
+    db.session.commit()
+
+    changed = reconcile_school_stats()
+    assert [school_id for school_id, _, _ in changed] == [school.id]
+    assert _counters(school.id) == (1, 0, 1)
+
+def test_restore_keeps_stats_in_sync(school_client, school):
+    """Restore memakai Core insert; penghitung tetap sama dengan hasil hitung ulang."""
+    import io
+    from my_app.models import Job
+    from my_app.jobs import wait_for
+
+    classroom = Classroom.query.filter_by(school_id=school.id).first()
+    student = Student(name="Budi", nis="1001", classroom_id=classroom.id, school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    db.session.add_all([Violation(description=f"Pelanggaran {i}", points=5, student_id=student.id) for i in range(3)])
+    db.session.commit()
+    backup = school_client.get('/settings/backup?mode=stream').data
+
+    for violation in Violation.query.all():
+        db.session.delete(violation)
+    db.session.delete(student)
+    db.session.commit()
+    assert _counters(school.id) == (0, 0, 1)
+
+    school_client.post('/settings/restore', data={'backup_file': (io.BytesIO(backup), 'backup.zip')},
+                       content_type='multipart/form-data')
+    wait_for(Job.query.order_by(Job.id.desc()).first().id, timeout=10)
+    assert _counters(school.id) == (1, 3, 1)
+    assert reconcile_school_stats() == []
+    assert Student.query.one().poin == 15
+
+def test_student_points_follow_violation_changes(school_client, school):
+    """Student.poin ikut berubah saat pelanggaran ditambah, diremisi, dan dihapus."""
+    from my_app.stats import check_student_points
+
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.commit()
+    assert student.poin == 0
+
+    violations = [Violation(description=f"Pelanggaran {i}", points=p, student_id=student.id) for i, p in enumerate((5, 10, 20))]
+    db.session.add_all(violations)
+    db.session.commit()
+    assert student.poin == 35
+
+    school_client.post(f'/violation/remit/{violations[1].id}', data={'remission_reason': 'Berkelakuan baik'})
+    school_client.post(f'/violation/delete/{violations[2].id}')
+    db.session.expire_all()
+    assert db.session.get(Student, student.id).poin == 5
+    assert check_student_points() == []
+
+    student.poin = 100
+    db.session.commit()
+    assert check_student_points(fix=True) == [(student.id, 100, 5)]
+    db.session.expire_all()
+    assert db.session.get(Student, student.id).poin == 5
+
+def test_daily_rollup_matches_rebuild(school_client, school):
+    """Rekap harian yang dijaga event sama dengan hasil rebuild-rollup, dan halaman statistik membacanya."""
+    from datetime import datetime, timedelta
+    from my_app.models import ViolationDailyRollup
+    from my_app.stats import rebuild_daily_rollup
+
+    def snapshot():
+        db.session.expire_all()
+        return sorted((r.day, r.category, r.count, r.points) for r in ViolationDailyRollup.query.filter(ViolationDailyRollup.count > 0))
+
+    student = Student(name="Budi", nis="1001", school_id=school.id)
+    db.session.add(student)
+    db.session.flush()
+    today = datetime.utcnow().replace(hour=8, minute=0, second=0, microsecond=0)
+    violations = [
+        Violation(description="A", points=5, student_id=student.id, date_posted=today, kategori_pelanggaran="Ringan"),
+        Violation(description="B", points=10, student_id=student.id, date_posted=today, kategori_pelanggaran="Sedang"),
+        Violation(description="C", points=5, student_id=student.id, date_posted=today - timedelta(days=2), kategori_pelanggaran="Ringan"),
+        Violation(description="D", points=3, student_id=student.id, date_posted=today),
+    ]
+    db.session.add_all(violations)
+    db.session.commit()
+
+    violations[1].kategori_pelanggaran = "Ringan"
+    db.session.delete(violations[2])
+    db.session.commit()
+    incremental = snapshot()
+    assert incremental == [(today.date(), '', 1, 3), (today.date(), 'Ringan', 2, 15)]
+
+    rebuild_daily_rollup(school.id)
+    assert snapshot() == incremental
+
+    response = school_client.get('/statistics?trend_range=30d')
+    assert response.status_code == 200